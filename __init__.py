@@ -1,5 +1,4 @@
 # ollamarecruitpro/__init__.py
-import ollama
 import sqlite3
 from agents.jd_parser import JDParserAgent
 from agents.cv_parser import CVParserAgent
@@ -10,15 +9,80 @@ from agents.communicator import CommunicatorAgent
 from agents.dashboard import DashboardAgent
 from memory.database import Database
 from memory.vector_store import VectorStore
+from memory.embedding_store import EmbeddingStore
+from memory.candidate_index import CandidateIndex
+from memory.skill_graph import SkillGraph
+from memory.llm_cache import LLMCache
+from llm.client import LLMClient
+from llm.routing import ModelRouter
+from llm.limiter import ModelUnavailableError
+from memory.job_queue import JobQueue, JobCancelled
 import json
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import time
 
 class OllamaRecruitPro:
-    def __init__(self):
+    def __init__(self, max_workers=1, fused_scoring=False, llm_cache_path="llm_cache.db", job_workers=2,
+                 ollama_hosts=None, llm_timeout=120.0, llm_max_retries=2, lazy_analysis=False,
+                 structured_output=False, batch_size=1, routing_config="model_routes.json",
+                 db_path="ollamarecruitpro.db", embedding_store_path="embeddings", embedding_parallelism=4,
+                 skill_similarity_threshold=0.8, embedding_cache_entries=None,
+                 candidate_index_path="candidate_index.npz", candidate_index_quantize=None, skill_neighbors=10):
+        # Number of candidates scored concurrently by match_candidates
+        self.max_workers = max_workers
+        # Score and rank each candidate with one model call instead of two
+        self.fused_scoring = fused_scoring
+        # Store only scores and structured details; generate analysis text on demand
+        self.lazy_analysis = lazy_analysis
+        # Candidates packed into one prompt per model call (1 scores them individually)
+        self.batch_size = batch_size
+        
         # Initialize database
-        self.db = Database("ollamarecruitpro.db")
-        self.vector_store = VectorStore()
+        self.db = Database(db_path)
+        
+        # Shared model response cache (pass llm_cache_path=None to disable)
+        self.llm_cache = LLMCache(llm_cache_path) if llm_cache_path else None
+        
+        # Per-agent/task model, options and timeout; routing_config is an optional JSON file
+        self.router = ModelRouter.load(routing_config)
+        
+        # Single pooled Ollama client shared by every agent; ollama_hosts may
+        # list several backends (defaults to OLLAMA_HOSTS / OLLAMA_HOST)
+        self.llm = LLMClient(
+            hosts=ollama_hosts,
+            timeout=llm_timeout,
+            max_retries=llm_max_retries,
+            cache=self.llm_cache,
+            router=self.router,
+            # Matching and embedding pools both issue calls; start the adaptive limit at the larger
+            concurrency=max(max_workers, embedding_parallelism)
+        )
+        # Embeddings persist in a memory-mapped file (pass embedding_store_path=None to keep them in
+        # memory, where embedding_cache_entries bounds them as an LRU)
+        self.embedding_store = EmbeddingStore(embedding_store_path) if embedding_store_path else None
+        # Unknown texts are embedded in batches with up to embedding_parallelism requests in flight
+        self.vector_store = VectorStore(
+            self.llm,
+            store=self.embedding_store,
+            parallelism=embedding_parallelism,
+            max_entries=None if self.embedding_store else embedding_cache_entries
+        )
+        # Semantic index of candidate profiles, filled at ingestion (candidate_index_path=None keeps it in memory);
+        # candidate_index_quantize='int8' stores profiles at a quarter of the size, re-ranked from the embeddings
+        self.candidate_index = CandidateIndex(
+            self.vector_store, path=candidate_index_path, quantize=candidate_index_quantize
+        )
+        self.candidate_index.rerank_source = self._candidate_vectors
+        self._candidate_index_synced = False
+        # Candidates whose profile could not be embedded (model down); retried on the next search
+        self._unindexed_candidates = set()
+        self._unindexed_lock = threading.Lock()
+        # Top skill_neighbors similar skills per taxonomy skill, computed by background jobs
+        self.skill_graph = SkillGraph(self.db, self.vector_store, top_n=skill_neighbors)
         
-        # Modified models to use available ones
+        # Default models per agent; routes in routing_config take precedence
         self.models = {
             'general': "mistral",     # Keep this as is
             'reasoning': "llama2",    # Replace phi-2 with llama2
@@ -27,12 +91,25 @@ class OllamaRecruitPro:
         
         # Initialize agents
         self.jd_parser = JDParserAgent(self.models['general'], self.db)
-        self.cv_parser = CVParserAgent(self.models['general'], self.db)
-        self.skill_matcher = SkillMatcherAgent(self.models['reasoning'], self.vector_store)
-        self.rank_score = RankScoreAgent(self.models['reasoning'], self.db)
-        self.feedback_learner = FeedbackLearnerAgent(self.models['structured'], self.db)
-        self.communicator = CommunicatorAgent(self.models['general'], self.db)
+        self.cv_parser = CVParserAgent(self.models['general'], self.db, self.llm)
+        self.skill_matcher = SkillMatcherAgent(
+            self.models['reasoning'], self.vector_store, self.llm, structured_output=structured_output,
+            semantic_threshold=skill_similarity_threshold, skill_graph=self.skill_graph
+        )
+        self.rank_score = RankScoreAgent(self.models['reasoning'], self.db, self.llm)
+        self.feedback_learner = FeedbackLearnerAgent(self.models['structured'], self.db, self.llm)
+        self.communicator = CommunicatorAgent(self.models['general'], self.db, self.llm)
         self.dashboard = DashboardAgent(self.db)
+        
+        # Background matching jobs; workers start on the first call to self.jobs.start()
+        self.jobs = JobQueue(self.db, {
+            'match': self._run_match_job,
+            'compact_candidate_index': self._run_compaction_job,
+            'save_candidate_index': self._run_index_save_job,
+            'skill_neighbors': self._run_skill_neighbors_job
+        }, num_workers=job_workers)
+        # Latest maintenance job per type, so at most one is queued or running
+        self._maintenance_jobs = {}
     
     def process_job_description(self, jd_text):
         """Process a job description and store it in the database"""
@@ -76,6 +153,8 @@ class OllamaRecruitPro:
                 
             jd_id = self.db.insert_job_description(jd_data)
             print(f"Inserted job description with ID: {jd_id}")
+            
+            self._add_skills(jd_data.get('required_skills'), jd_data.get('preferred_skills'))
             return jd_id
         except Exception as e:
             print(f"Error processing job description: {str(e)}")
@@ -100,6 +179,17 @@ class OllamaRecruitPro:
                 # If all else fails, return 1 to prevent null references
                 return 1
     
+    def _add_skills(self, *skill_lists):
+        """Add JD or candidate skills to the taxonomy so the skill graph covers both sides of a match"""
+        try:
+            for skills in skill_lists:
+                for skill in skills if isinstance(skills, list) else []:
+                    if isinstance(skill, str) and skill:
+                        self.db.insert_skill_if_not_exists(skill)
+            self._schedule_skill_neighbors()
+        except Exception as e:
+            print(f"Could not add skills to the taxonomy: {str(e)}")
+    
     def process_cv(self, cv_text):
         """Process a CV and store it in the database"""
         try:
@@ -174,7 +264,7 @@ class OllamaRecruitPro:
             
             # Insert into database
             try:
-                candidate_id = self.db.insert_candidate(cv_data)
+                candidate_id = self.insert_candidate(cv_data)
                 return candidate_id
             except Exception as db_error:
                 print(f"Database error inserting candidate: {str(db_error)}")
@@ -187,13 +277,229 @@ class OllamaRecruitPro:
             traceback.print_exc()
             return None
     
-    def match_candidates(self, jd_id, candidate_ids=None):
-        """Match candidates to a job description"""
+    def insert_candidate(self, cv_data):
+        """Insert or update a parsed candidate; its profile is re-embedded only if it changed"""
+        candidate_id = self.db.insert_candidate(cv_data)
+        self._index_candidates([(candidate_id, cv_data)])
+        self._schedule_compaction()
+        self._schedule_index_save()
+        # Already there if the CV parser saw them
+        self._add_skills(cv_data.get('Skills'))
+        return candidate_id
+    
+    def delete_candidate(self, candidate_id):
+        """Delete a candidate and tombstone its profile in the candidate index"""
+        deleted = self.db.delete_candidate(candidate_id)
+        self.candidate_index.remove([candidate_id])
+        self._schedule_compaction()
+        self._schedule_index_save()
+        return deleted
+    
+    def check_candidate_index(self, repair=False):
+        """
+        Compare the candidate index with the candidates table. With repair,
+        missing and stale profiles are (re-)indexed and orphaned ones removed.
+        Returns counts plus up to 20 example ids per kind.
+        """
+        candidates = self.db.get_all_candidates()
+        report = self.candidate_index.freshness(candidates)
+        summary = {kind: len(report[kind]) for kind in ('missing', 'stale', 'orphaned')}
+        examples = {kind: report[kind][:20] for kind in ('missing', 'stale', 'orphaned')}
+        
+        if repair and not report['fresh']:
+            outdated = set(report['missing']) | set(report['stale'])
+            reindexed = self._index_candidates(
+                [(candidate['id'], candidate) for candidate in candidates if candidate['id'] in outdated]
+            )
+            removed = self.candidate_index.remove(report['orphaned'])
+            print(f"Candidate index repair: {reindexed} profiles re-indexed, {removed} removed")
+            self._schedule_compaction()
+            self._schedule_index_save()
+            summary.update(reindexed=reindexed, removed=removed)
+        
+        return dict(summary, candidates=report['candidates'], indexed=report['indexed'],
+                    tombstones=report['tombstones'], fresh=report['fresh'], examples=examples)
+    
+    def search_candidates(self, query=None, k=10, nprobe=None, jd_id=None):
+        """
+        Top-k candidates by semantic similarity of their profile to a free-text
+        query, or to the stored job description jd_id. Only the query
+        embedding may need a model call; candidate profiles are pre-indexed.
+        Returns a list of dicts with id, candidate_id, name, email, skills and score.
+        """
+        self._sync_candidate_index()
+        
+        if jd_id is not None:
+            jd_data = self.db.get_job_description(int(jd_id))
+            if not jd_data:
+                raise ValueError(f"No job description found for ID: {jd_id}")
+            query = CandidateIndex.job_text(jd_data)
+        else:
+            query = str(query or '').strip()
+        if not query:
+            return []
+        
+        vector = self.vector_store.get_embeddings([query])[0]
+        if not vector:
+            return []
+        hits = self.candidate_index.search(vector, k, nprobe)
+        summaries = self.db.get_candidate_summaries([candidate_id for candidate_id, _ in hits])
+        return [
+            dict(summaries[candidate_id], id=candidate_id, score=score)
+            for candidate_id, score in hits if candidate_id in summaries
+        ]
+    
+    def _index_candidates(self, items):
+        """
+        Add (candidate_id, candidate) profiles to the candidate index. If the
+        model is unavailable they are kept for _sync_candidate_index to retry.
+        """
+        try:
+            return self.candidate_index.add_many(items)
+        except ModelUnavailableError as e:
+            print(f"Could not index candidate profiles, will retry on the next search: {str(e)}")
+            with self._unindexed_lock:
+                self._unindexed_candidates.update(int(candidate_id) for candidate_id, _ in items if candidate_id)
+            return 0
+    
+    def _candidate_vectors(self, ids):
+        """
+        Stored full-precision profile embeddings for candidate ids, for
+        re-ranking. Never calls the model: profiles whose embedding is not
+        stored (in-memory store, LRU eviction) get zeros and keep their
+        quantized score.
+        """
+        profiles = self.db.get_candidate_profiles(ids)
+        texts = [CandidateIndex.profile_text(profiles.get(int(candidate_id), {})) for candidate_id in ids]
+        matrix, _ = self.vector_store.get_stored_matrix(texts)
+        dim = self.candidate_index.index.dim
+        if matrix.shape[1] != dim:
+            return np.zeros((len(ids), dim), dtype=np.float32)
+        return matrix
+    
+    def _schedule_compaction(self):
+        """Queue a background compaction once tombstones pass the index's threshold"""
+        if not self.candidate_index.needs_compaction():
+            return None
+        return self._submit_maintenance_job('compact_candidate_index')
+    
+    def _schedule_index_save(self):
+        """Queue a background save of the candidate index once its changes are save_interval old"""
+        if not self.candidate_index.needs_save():
+            return None
+        return self._submit_maintenance_job('save_candidate_index')
+    
+    def _schedule_skill_neighbors(self):
+        """Queue a background skill graph update when the taxonomy has new skills"""
+        if not self.db.has_pending_skill_neighbors():
+            return None
+        return self._submit_maintenance_job('skill_neighbors')
+    
+    def _submit_maintenance_job(self, job_type):
+        """Submit a parameterless job unless one of its type is already queued or running"""
+        job_id = self._maintenance_jobs.get(job_type)
+        if job_id is not None:
+            job = self.jobs.get(job_id)
+            if job and job['state'] in ('queued', 'running'):
+                return job_id
+        self.jobs.start()
+        self._maintenance_jobs[job_type] = self.jobs.submit(job_type, {})
+        return self._maintenance_jobs[job_type]
+    
+    def _run_compaction_job(self, params, report_progress, is_cancelled):
+        """Job handler for 'compact_candidate_index' jobs"""
+        removed = self.candidate_index.compact(progress=report_progress)
+        return {'removed': removed, 'indexed': len(self.candidate_index)}
+    
+    def _run_index_save_job(self, params, report_progress, is_cancelled):
+        """Job handler for 'save_candidate_index' jobs"""
+        self.candidate_index.save()
+        return {'indexed': len(self.candidate_index)}
+    
+    def _run_skill_neighbors_job(self, params, report_progress, is_cancelled):
+        """Job handler for 'skill_neighbors' jobs; stored chunks are kept if cancelled"""
+        computed = self.skill_graph.update(progress=report_progress, is_cancelled=is_cancelled)
+        if is_cancelled():
+            raise JobCancelled({'computed': computed})
+        return {'computed': computed}
+    
+    def _sync_candidate_index(self):
+        """
+        Index candidates added since the index was last saved (once per
+        process), then retry profiles whose embedding failed earlier
+        """
+        if not self._candidate_index_synced:
+            missing = self.db.get_all_candidates(min_id=self.candidate_index.max_id())
+            # Failures land in the retry set below, so the scan itself need not repeat
+            self._candidate_index_synced = True
+            if missing:
+                print(f"Indexing {len(missing)} candidate profiles missing from the candidate index")
+                self._index_candidates([(candidate['id'], candidate) for candidate in missing])
+        
+        with self._unindexed_lock:
+            retry, self._unindexed_candidates = self._unindexed_candidates, set()
+        if retry:
+            # Deleted candidates simply have no profile any more
+            profiles = self.db.get_candidate_profiles(retry)
+            print(f"Retrying {len(profiles)} candidate profiles that could not be indexed")
+            self._index_candidates(list(profiles.items()))
+        self._schedule_index_save()
+    
+    def match_candidates(self, jd_id, candidate_ids=None, max_workers=None, fused=None, bypass_cache=False,
+                         shortlist_k=None, prefilter_floor=None, lazy_analysis=None, batch_size=None):
+        """Match candidates to a job description
+        
+        max_workers overrides the instance default; values above 1 score
+        candidates concurrently in a bounded thread pool. fused overrides
+        fused_scoring; when set, analysis and ranking share one model call.
+        bypass_cache forces fresh model calls instead of cached responses.
+        shortlist_k and prefilter_floor enable the retrieve-then-rerank
+        cascade: only the top-K candidates by deterministic score, and only
+        those at or above the floor, are sent to the model.
+        lazy_analysis overrides the instance default; when set, only the score
+        and structured details are stored and the long-form analysis is
+        generated on first request by get_match_analysis.
+        batch_size overrides the instance default; values above 1 score that
+        many candidates per model call with a shared job description prompt
+        (batches always produce the final score directly, like fused mode).
+        """
+        results = []
+        for event in self.iter_match_candidates(
+            jd_id, candidate_ids,
+            max_workers=max_workers,
+            fused=fused,
+            bypass_cache=bypass_cache,
+            shortlist_k=shortlist_k,
+            prefilter_floor=prefilter_floor,
+            lazy_analysis=lazy_analysis,
+            batch_size=batch_size
+        ):
+            if event['type'] == 'match':
+                results.append((event['index'], event['match']))
+        
+        matches = self._order_matches(results)
+        print(f"Completed matching. Found {len(matches)} matches above threshold")
+        return matches
+    
+    def iter_match_candidates(self, jd_id, candidate_ids=None, max_workers=None, fused=None, bypass_cache=False,
+                              shortlist_k=None, prefilter_floor=None, lazy_analysis=None, batch_size=None,
+                              progress_interval=2.0):
+        """Match candidates to a job description, yielding events as results arrive
+        
+        Takes the same options as match_candidates. Yields dicts with a 'type' of:
+        - 'start': total number of candidates to score
+        - 'match': a candidate that cleared the threshold ('index' is its position in the input)
+        - 'progress': done/total, elapsed seconds and ETA, after every result and
+          at least every progress_interval seconds while scoring is in flight
+        - 'done': final counts
+        Closing the generator early cancels candidates that have not started.
+        """
         print(f"Starting matching process for JD ID: {jd_id}")
         jd_data = self.db.get_job_description(jd_id)
         if not jd_data:
             print(f"No job description found for ID: {jd_id}")
-            return []
+            yield {'type': 'done', 'done': 0, 'total': 0, 'matched': 0, 'elapsed': 0.0}
+            return
             
         print(f"Found job description: {jd_data.get('title', 'Unknown Title')}")
         
@@ -213,71 +519,260 @@ class OllamaRecruitPro:
         
         print(f"Processing {len(candidates)} candidates")
         
-        matches = []
+        # Embed the skill taxonomy and this match's skills up front, in one batched pass
+        self._index_skills(jd_data, candidates)
+        
+        if shortlist_k is not None or prefilter_floor is not None:
+            candidates = self._shortlist(jd_data, candidates, shortlist_k, prefilter_floor)
+        
+        if max_workers is None:
+            max_workers = self.max_workers
+        if fused is None:
+            fused = self.fused_scoring
+        if lazy_analysis is None:
+            lazy_analysis = self.lazy_analysis
+        if batch_size is None:
+            batch_size = self.batch_size
+        threshold = 0.5  # 50% threshold for shortlisting
+        
+        total = len(candidates)
+        done = 0
+        matched = 0
+        start_time = time.time()
+        yield {'type': 'start', 'total': total, 'jd_title': jd_data.get('title', 'Job Position')}
+        
+        workers = max(1, max_workers or 1)
+        if workers > 1:
+            print(f"Scoring candidates with {workers} workers")
+        executor = ThreadPoolExecutor(max_workers=workers)
+        try:
+            # Each future scores a list of candidate indices and returns their matches in order
+            if batch_size and batch_size > 1 and not lazy_analysis:
+                print(f"Scoring candidates in batches of {batch_size}")
+                pending = {
+                    executor.submit(
+                        self._score_batch, jd_id, jd_data, candidates[start:start + batch_size], threshold, bypass_cache
+                    ): list(range(start, min(start + batch_size, total)))
+                    for start in range(0, total, batch_size)
+                }
+            else:
+                def score_one(candidate):
+                    return [self._score_candidate(jd_id, jd_data, candidate, threshold, fused, bypass_cache, lazy_analysis)]
+                
+                pending = {executor.submit(score_one, candidate): [index] for index, candidate in enumerate(candidates)}
+            while pending:
+                finished, _ = wait(pending, timeout=progress_interval, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    indices = pending.pop(future)
+                    for index, match in zip(indices, future.result()):
+                        done += 1
+                        if match is not None:
+                            matched += 1
+                            yield {'type': 'match', 'index': index, 'match': match}
+                
+                elapsed = time.time() - start_time
+                yield {
+                    'type': 'progress',
+                    'done': done,
+                    'total': total,
+                    'elapsed': elapsed,
+                    'eta': elapsed / done * (total - done) if done else None
+                }
+        finally:
+            # Don't start queued candidates if the consumer went away
+            executor.shutdown(wait=False, cancel_futures=True)
+        
+        yield {'type': 'done', 'done': done, 'total': total, 'matched': matched, 'elapsed': time.time() - start_time}
+    
+    def submit_match_job(self, jd_id, candidate_ids=None, **options):
+        """Queue match_candidates as a background job and return the job ID"""
+        self.jobs.start()
+        return self.jobs.submit('match', {'jd_id': jd_id, 'candidate_ids': candidate_ids or [], 'options': options})
+    
+    def _run_match_job(self, params, report_progress, is_cancelled):
+        """Job handler for 'match' jobs; returns the sorted matches"""
+        results = []
+        done, total = 0, 0
+        events = self.iter_match_candidates(params['jd_id'], params.get('candidate_ids'), **params.get('options', {}))
+        try:
+            for event in events:
+                if event['type'] == 'match':
+                    results.append((event['index'], event['match']))
+                elif event['type'] in ('start', 'progress', 'done'):
+                    done, total = event.get('done', 0), event['total']
+                    report_progress(done, total, force=event['type'] != 'progress')
+                
+                if is_cancelled():
+                    report_progress(done, total, force=True)
+                    raise JobCancelled({'matches': self._order_matches(results), 'partial': True})
+        finally:
+            # Stops queued candidates when the job is cancelled or fails
+            events.close()
+        
+        return {'matches': self._order_matches(results)}
+    
+    def _order_matches(self, results):
+        """Sort (index, match) pairs by score descending, ties in candidate order"""
+        matches = [match for _, match in sorted(results, key=lambda item: item[0])]
+        return sorted(matches, key=lambda x: x['score'], reverse=True)
+    
+    def _index_skills(self, jd_data, candidates):
+        """Precompute embeddings for the skills table plus the JD's and candidates' skills"""
+        skills = self.db.get_skill_names()
+        skills.extend(jd_data.get('required_skills', []))
+        skills.extend(jd_data.get('preferred_skills', []))
         for candidate in candidates:
-            friendly_id = candidate.get('Candidate_ID', 'Unknown ID')
-            print(f"Processing candidate {friendly_id} - {candidate.get('Name', 'Unknown')}")
-            
-            # Extract detailed candidate information from CV for better matching
-            candidate_skills = candidate.get('Skills', [])
-            candidate_experience = candidate.get('Experience', [])
-            candidate_education = candidate.get('Education', [])
-            candidate_certifications = candidate.get('Certifications', [])
-            
-            # Extract job requirements
-            required_skills = jd_data.get('Required Skills', [])
-            preferred_skills = jd_data.get('Preferred Skills', [])
-            required_experience = jd_data.get('required_experience', 0)
-            required_education = jd_data.get('required_education', '')
-            
-            # Generate comprehensive match analysis based on actual CV content
-            match_score, analysis = self.skill_matcher.match(jd_data, candidate)
-            print(f"Raw match score: {match_score}")
-            
-            # Calculate ranked score using explicit criteria and weights from CV content
-            ranked_score = self.rank_score.calculate(match_score, jd_data, candidate)
-            print(f"Ranked score: {ranked_score}")
-            
-            # Store complete candidate information for better output
-            candidate_info = {
-                'id': candidate.get('id'),
-                'candidate_id': friendly_id,
-                'name': candidate.get('Name', 'Unknown'),
-                'email': candidate.get('Email', 'Unknown'),
-                'phone': candidate.get('Phone', 'Unknown'),
-                'skills': candidate_skills,
-                'experience': candidate_experience,
-                'education': candidate_education,
-                'certifications': candidate_certifications,
-                'languages': candidate.get('Languages', []),
-                'summary': candidate.get('Summary', '')
-            }
+            skills.extend(candidate.get('Skills', []))
+        self._schedule_skill_neighbors()
+        return self.skill_matcher.index_skills(skills)
+    
+    def _shortlist(self, jd_data, candidates, shortlist_k=None, prefilter_floor=None):
+        """Stage one of the matching cascade: rank candidates without the model
+        
+        Uses the deterministic weighted score from SkillMatcherAgent and keeps
+        candidates scoring at least prefilter_floor, capped at shortlist_k.
+        """
+        scored = [(self.skill_matcher.prefilter_score(jd_data, candidate), candidate) for candidate in candidates]
+        
+        if prefilter_floor is not None:
+            scored = [item for item in scored if item[0] >= prefilter_floor]
+        
+        # Stable sort keeps candidate order for equal scores
+        scored.sort(key=lambda item: item[0], reverse=True)
+        if shortlist_k is not None:
+            scored = scored[:max(0, int(shortlist_k))]
+        
+        print(f"Shortlisted {len(scored)} of {len(candidates)} candidates for model scoring")
+        return [candidate for _, candidate in scored]
+    
+    def _score_batch(self, jd_id, jd_data, candidates, threshold, bypass_cache=False):
+        """Score several candidates with shared batch prompts.
+        
+        Returns a list aligned with candidates holding match details or None.
+        Safe to call from worker threads.
+        """
+        print(f"Processing batch of {len(candidates)} candidates")
+        try:
+            scored = self.skill_matcher.match_batch(jd_data, candidates, bypass_cache=bypass_cache)
+        except ModelUnavailableError as e:
+            print(f"Model unavailable for batch ({str(e)}), using deterministic scores")
+            return [self._score_candidate(jd_id, jd_data, candidate, threshold, lazy=True) for candidate in candidates]
+        
+        return [
+            self._score_candidate(jd_id, jd_data, candidate, threshold, scores=scores)
+            for candidate, scores in zip(candidates, scored)
+        ]
+    
+    def _score_candidate(self, jd_id, jd_data, candidate, threshold, fused=False, bypass_cache=False, lazy=False,
+                         scores=None):
+        """Score a single candidate against a job description.
+        
+        Returns the match details if the candidate clears the threshold, otherwise None.
+        scores, when given, is a precomputed (match_score, ranked_score, analysis).
+        Safe to call from worker threads.
+        """
+        friendly_id = candidate.get('Candidate_ID', 'Unknown ID')
+        print(f"Processing candidate {friendly_id} - {candidate.get('Name', 'Unknown')}")
+        
+        # Extract detailed candidate information from CV for better matching
+        candidate_skills = candidate.get('Skills', [])
+        candidate_experience = candidate.get('Experience', [])
+        candidate_education = candidate.get('Education', [])
+        candidate_certifications = candidate.get('Certifications', [])
+        
+        details = None
+        try:
+            if scores is not None:
+                # Already scored as part of a batch
+                match_score, ranked_score, analysis = scores
+                print(f"Raw match score: {match_score}")
+                print(f"Ranked score: {ranked_score}")
+            elif lazy:
+                # Score only; the long-form analysis is generated on demand
+                match_score, details = self.skill_matcher.score_details(jd_data, candidate)
+                analysis = None
+                print(f"Raw match score: {match_score}")
             
-            # Enhanced match information
-            match_details = {
-                'candidate_id': candidate.get('id'),  # Keep the database ID for internal use
-                'friendly_id': friendly_id,  # Add the friendly ID for display
-                'candidate_info': candidate_info,
-                'score': ranked_score,
-                'raw_score': match_score,
-                'analysis': analysis,
-                'jd_title': jd_data.get('title', 'Job Position'),
-                'jd_company': jd_data.get('company', 'Company'),
-                'match_date': 'Today'  # Would use actual timestamp in production
-            }
+                ranked_score = self.rank_score.calculate(match_score, jd_data, candidate, bypass_cache=bypass_cache)
+                print(f"Ranked score: {ranked_score}")
+            elif fused:
+                # Single round-trip: analysis and final adjusted score from one prompt
+                match_score, ranked_score, analysis = self.skill_matcher.match_and_rank(jd_data, candidate, bypass_cache=bypass_cache)
+                print(f"Raw match score: {match_score}")
+                print(f"Ranked score: {ranked_score}")
+            else:
+                # Generate comprehensive match analysis based on actual CV content
+                match_score, analysis = self.skill_matcher.match(jd_data, candidate, bypass_cache=bypass_cache)
+                print(f"Raw match score: {match_score}")
             
-            # Apply threshold filter (adjustable)
-            threshold = 0.5  # 50% threshold for shortlisting
-            if ranked_score >= threshold:
-                matches.append(match_details)
-                print(f"Added candidate {friendly_id} to matches with score {ranked_score}")
-                
-                # Store match in database with the comprehensive analysis
-                self.db.insert_match(jd_id, candidate['id'], ranked_score, analysis)
+                # Calculate ranked score using explicit criteria and weights from CV content
+                ranked_score = self.rank_score.calculate(match_score, jd_data, candidate, bypass_cache=bypass_cache)
+                print(f"Ranked score: {ranked_score}")
+        except ModelUnavailableError as e:
+            # Degrade to the deterministic score; analysis can be generated later on demand
+            print(f"Model unavailable for candidate {friendly_id} ({str(e)}), using deterministic score")
+            match_score, details = self.skill_matcher.score_details(jd_data, candidate)
+            ranked_score = match_score
+            analysis = None
         
-        print(f"Completed matching. Found {len(matches)} matches above threshold")
-        # Sort by score descending
-        return sorted(matches, key=lambda x: x['score'], reverse=True)
+        # Store complete candidate information for better output
+        candidate_info = {
+            'id': candidate.get('id'),
+            'candidate_id': friendly_id,
+            'name': candidate.get('Name', 'Unknown'),
+            'email': candidate.get('Email', 'Unknown'),
+            'phone': candidate.get('Phone', 'Unknown'),
+            'skills': candidate_skills,
+            'experience': candidate_experience,
+            'education': candidate_education,
+            'certifications': candidate_certifications,
+            'languages': candidate.get('Languages', []),
+            'summary': candidate.get('Summary', '')
+        }
+        
+        # Enhanced match information
+        match_details = {
+            'candidate_id': candidate.get('id'),  # Keep the database ID for internal use
+            'friendly_id': friendly_id,  # Add the friendly ID for display
+            'candidate_info': candidate_info,
+            'score': ranked_score,
+            'raw_score': match_score,
+            'analysis': analysis,
+            'jd_title': jd_data.get('title', 'Job Position'),
+            'jd_company': jd_data.get('company', 'Company'),
+            'match_date': 'Today'  # Would use actual timestamp in production
+        }
+        
+        # Apply threshold filter
+        if ranked_score < threshold:
+            return None
+        
+        print(f"Added candidate {friendly_id} to matches with score {ranked_score}")
+        
+        # Store match in database with the comprehensive analysis (or just the details when lazy)
+        match_details['match_id'] = self.db.insert_match(jd_id, candidate['id'], ranked_score, analysis, details)
+        match_details['details'] = details
+        return match_details
+    
+    def get_match_analysis(self, match_id, bypass_cache=False):
+        """Return the long-form analysis for a stored match, generating and saving it on first use"""
+        match = self.db.get_match(match_id)
+        if not match:
+            return None
+        
+        if match.get('justification') and not bypass_cache:
+            return match['justification']
+        
+        jd_data = self.db.get_job_description(match['jd_id'])
+        candidate = self.db.get_candidate(match['candidate_id'])
+        if not jd_data or not candidate:
+            print(f"Cannot generate analysis for match {match_id}: job description or candidate missing")
+            return None
+        
+        print(f"Generating analysis for match {match_id}")
+        _, analysis = self.skill_matcher.match(jd_data, candidate, bypass_cache=bypass_cache)
+        self.db.update_match_analysis(match_id, analysis)
+        return analysis
     
     def get_candidate_details(self, candidate_id):
         """Get detailed information about a candidate"""
@@ -343,3 +838,10 @@ class OllamaRecruitPro:
             return self.dashboard.generate_dashboard(jd_id, session_candidates)
         else:
             return self.dashboard.generate_dashboard(jd_id)
+    
+    def close(self, timeout=10.0):
+        """Stop background jobs, save unsaved candidate index changes and close model connections"""
+        self.jobs.stop(timeout)
+        if self.candidate_index.needs_save(force=True):
+            self.candidate_index.save()
+        self.llm.close()
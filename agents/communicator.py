@@ -1,11 +1,12 @@
 # agents/communicator.py
-import ollama
+from llm.client import LLMClient
 from datetime import datetime, timedelta
 
 class CommunicatorAgent:
-    def __init__(self, model_name, db):
+    def __init__(self, model_name, db, llm=None):
         self.model_name = model_name
         self.db = db
+        self.llm = llm or LLMClient()
     
     def generate_interview_request(self, jd_data, candidate_data, match_data):
         """
@@ -50,8 +51,10 @@ class CommunicatorAgent:
         """
         
         # Call Ollama model
-        response = ollama.chat(
+        response = self.llm.chat(
             model=self.model_name,
+            agent='communicator',
+            task='email',
             messages=[
                 {"role": "user", "content": prompt}
             ]
@@ -89,8 +92,10 @@ class CommunicatorAgent:
         """
         
         # Call Ollama model
-        response = ollama.chat(
+        response = self.llm.chat(
             model=self.model_name,
+            agent='communicator',
+            task='email',
             messages=[
                 {"role": "user", "content": prompt}
             ]
@@ -1,14 +1,15 @@
 # agents/cv_parser.py
-import ollama
+from llm.client import LLMClient
 import re
 import json
 from memory.database import Database
 import time
 
 class CVParserAgent:
-    def __init__(self, model_name, db):
+    def __init__(self, model_name, db, llm=None):
         self.model_name = model_name
         self.db = db
+        self.llm = llm or LLMClient()
     
     def parse(self, cv_text):
         """
@@ -27,6 +28,21 @@ class CVParserAgent:
                 direct_parsed = self._ensure_valid_data_format(direct_parsed)
                 return direct_parsed
             
+            if not self.llm.available():
+                # Model backend is down - don't wait on it, use pattern extraction straight away
+                print("Model unavailable, parsing CV with direct extraction")
+                parsed_data = self._extract_fields(cv_text)
+                # Prefer anything the structured direct parse did find
+                parsed_data.update({key: value for key, value in (direct_parsed or {}).items() if value})
+                parsed_data = self._ensure_valid_data_format(parsed_data)
+                
+                # Store skills in the taxonomy
+                for skill in parsed_data.get("Skills", []):
+                    if skill:  # Check for non-empty skills
+                        self.db.insert_skill_if_not_exists(skill)
+                
+                return parsed_data
+            
             # If direct parsing doesn't yield good results, fallback to LLM-based parsing
             # Define the prompt for Ollama
             prompt = f'''
@@ -50,8 +66,10 @@ class CVParserAgent:
             
             try:
                 # Call Ollama model
-                response = ollama.chat(
+                response = self.llm.chat(
                     model=self.model_name,
+                    agent='cv_parser',
+                    task='parse',
                     messages=[
                         {"role": "user", "content": prompt}
                     ]
@@ -63,18 +81,7 @@ class CVParserAgent:
             except Exception as e:
                 print(f"Error calling Ollama model: {str(e)}")
                 # Fall back to direct extraction
-                parsed_data = {
-                    "Name": self._extract_name(cv_text),
-                    "Email": self._extract_email(cv_text),
-                    "Phone": self._extract_phone(cv_text),
-                    "Candidate_ID": self._extract_candidate_id(cv_text),
-                    "Skills": self._extract_skills(cv_text),
-                    "Experience": self._extract_experience(cv_text),
-                    "Education": self._extract_education(cv_text),
-                    "Certifications": self._extract_certifications(cv_text),
-                    "Languages": self._extract_languages(cv_text),
-                    "Summary": self._extract_summary(cv_text)
-                }
+                parsed_data = self._extract_fields(cv_text)
                 
                 # Ensure data format is valid
                 parsed_data = self._ensure_valid_data_format(parsed_data)
@@ -95,18 +102,7 @@ class CVParserAgent:
                     parsed_data = json.loads(json_str)
                 else:
                     # If no JSON found, create a structure based on direct extraction
-                    parsed_data = {
-                        "Name": self._extract_name(cv_text),
-                        "Email": self._extract_email(cv_text),
-                        "Phone": self._extract_phone(cv_text),
-                        "Candidate_ID": self._extract_candidate_id(cv_text),
-                        "Skills": self._extract_skills(cv_text),
-                        "Experience": self._extract_experience(cv_text),
-                        "Education": self._extract_education(cv_text),
-                        "Certifications": self._extract_certifications(cv_text),
-                        "Languages": self._extract_languages(cv_text),
-                        "Summary": self._extract_summary(cv_text)
-                    }
+                    parsed_data = self._extract_fields(cv_text)
                     
                     # Ensure data format is valid
                     parsed_data = self._ensure_valid_data_format(parsed_data)
@@ -120,18 +116,7 @@ class CVParserAgent:
                 
             except json.JSONDecodeError:
                 # Fallback for non-JSON responses - use direct extraction
-                parsed_data = {
-                    "Name": self._extract_name(cv_text),
-                    "Email": self._extract_email(cv_text),
-                    "Phone": self._extract_phone(cv_text),
-                    "Candidate_ID": self._extract_candidate_id(cv_text),
-                    "Skills": self._extract_skills(cv_text),
-                    "Experience": self._extract_experience(cv_text),
-                    "Education": self._extract_education(cv_text),
-                    "Certifications": self._extract_certifications(cv_text),
-                    "Languages": self._extract_languages(cv_text),
-                    "Summary": self._extract_summary(cv_text)
-                }
+                parsed_data = self._extract_fields(cv_text)
                 
                 # Ensure data format is valid
                 parsed_data = self._ensure_valid_data_format(parsed_data)
@@ -161,6 +146,21 @@ class CVParserAgent:
                 "Summary": ""
             }
     
+    def _extract_fields(self, cv_text):
+        """Extract every CV field with the individual pattern extractors"""
+        return {
+            "Name": self._extract_name(cv_text),
+            "Email": self._extract_email(cv_text),
+            "Phone": self._extract_phone(cv_text),
+            "Candidate_ID": self._extract_candidate_id(cv_text),
+            "Skills": self._extract_skills(cv_text),
+            "Experience": self._extract_experience(cv_text),
+            "Education": self._extract_education(cv_text),
+            "Certifications": self._extract_certifications(cv_text),
+            "Languages": self._extract_languages(cv_text),
+            "Summary": self._extract_summary(cv_text)
+        }
+    
     def _direct_parse(self, cv_text):
         """Parse CV directly using regex patterns for known CV structure"""
         try:
@@ -1,11 +1,12 @@
 # agents/feedback_learner.py
-import ollama
+from llm.client import LLMClient
 import json
 
 class FeedbackLearnerAgent:
-    def __init__(self, model_name, db):
+    def __init__(self, model_name, db, llm=None):
         self.model_name = model_name
         self.db = db
+        self.llm = llm or LLMClient()
     
     def learn(self, match_id, feedback):
         """
@@ -54,8 +55,10 @@ class FeedbackLearnerAgent:
         """
         
         # Call Ollama model
-        response = ollama.chat(
+        response = self.llm.chat(
             model=self.model_name,
+            agent='feedback_learner',
+            task='feedback',
             messages=[
                 {"role": "user", "content": prompt}
             ]
@@ -1,13 +1,14 @@
 # agents/rank_score.py
-import ollama
+from llm.client import LLMClient
 import re
 
 class RankScoreAgent:
-    def __init__(self, model_name, db):
+    def __init__(self, model_name, db, llm=None):
         self.model_name = model_name
         self.db = db
+        self.llm = llm or LLMClient()
     
-    def calculate(self, base_match_score, jd_data, candidate_data):
+    def calculate(self, base_match_score, jd_data, candidate_data, bypass_cache=False):
         """
         Calculate a refined score based on additional factors beyond skills
         """
@@ -40,11 +41,14 @@ class RankScoreAgent:
         """
         
         # Call Ollama model
-        response = ollama.chat(
+        response = self.llm.chat(
             model=self.model_name,
+            agent='rank_score',
+            task='score',
             messages=[
                 {"role": "user", "content": prompt}
-            ]
+            ],
+            bypass_cache=bypass_cache
         )
         
         # Extract and process the response
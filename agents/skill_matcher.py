@@ -1,20 +1,277 @@
 # agents/skill_matcher.py
-import ollama
+from llm.client import LLMClient
+from llm.prompt_budget import PromptBudget, estimate_tokens
+from llm.limiter import ModelUnavailableError
+import json
 import re
+import textwrap
+import time
 from memory.vector_store import VectorStore
 
+# JSON schema for structured-output mode; Ollama constrains generation to it
+MATCH_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "match_score": {"type": "number", "minimum": 0, "maximum": 100},
+        "key_strengths": {"type": "array", "items": {"type": "string"}},
+        "skills_match": {"type": "string"},
+        "experience_match": {"type": "string"},
+        "education_match": {"type": "string"},
+        "gaps": {"type": "array", "items": {"type": "string"}},
+        "justification": {"type": "string"}
+    },
+    "required": [
+        "match_score", "key_strengths", "skills_match", "experience_match",
+        "education_match", "gaps", "justification"
+    ]
+}
+
+# JSON schema for batch scoring; one entry per candidate, keyed by its reference
+BATCH_RESULT_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "candidates": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "ref": {"type": "string"},
+                    "final_score": {"type": "number", "minimum": 0, "maximum": 1},
+                    "key_strengths": {"type": "array", "items": {"type": "string"}},
+                    "gaps": {"type": "array", "items": {"type": "string"}},
+                    "justification": {"type": "string"}
+                },
+                "required": ["ref", "final_score", "key_strengths", "gaps", "justification"]
+            }
+        }
+    },
+    "required": ["candidates"]
+}
+
+# Tighter per-candidate budgets so several profiles fit one context window
+BATCH_SECTION_BUDGETS = {
+    'candidate_skills': 80,
+    'candidate_experience': 160,
+    'candidate_education': 60,
+    'candidate_certifications': 40,
+    'candidate_languages': 20,
+    'candidate_summary': 60
+}
+
 class SkillMatcherAgent:
-    def __init__(self, model_name, vector_store):
+    # Required skills this far below the semantic threshold still earn partial credit
+    RELATED_SKILL_MARGIN = 0.15
+    # Share of a full match a related (near-threshold) required skill can earn
+    RELATED_SKILL_CREDIT = 0.5
+    
+    def __init__(self, model_name, vector_store, llm=None, prompt_budget=None, structured_output=False,
+                 semantic_threshold=0.8, max_cached_pairs=100000, skill_graph=None):
         self.model_name = model_name
         self.vector_store = vector_store
+        self.llm = llm or LLMClient()
+        # Caps verbose CV and JD sections so prompt size stays predictable
+        self.prompt_budget = prompt_budget or PromptBudget()
+        # Ask for schema-constrained JSON instead of parsing free text
+        self.structured_output = structured_output
+        self.batch_prompt_budget = PromptBudget(BATCH_SECTION_BUDGETS, max_item_tokens=60)
+        # Embedding cosine similarity at which differently named skills count as a match (None disables)
+        self.semantic_threshold = semantic_threshold
+        # Memoised similarities per (required skill, candidate skill), lowercased
+        self.max_cached_pairs = max_cached_pairs
+        self._similarity_cache = {}
+        # Precomputed skill neighbours (memory/skill_graph.py); pairs it covers need no embeddings
+        self.skill_graph = skill_graph
     
-    def match(self, jd_data, candidate_data):
+    def match(self, jd_data, candidate_data, bypass_cache=False):
         """
         Match candidate skills to job requirements
         """
+        assessment = self._assess(jd_data, candidate_data)
+        
+        # Parse the response to extract match score and justification
+        sections = self._request_sections(assessment, False, bypass_cache)
+        
+        return self._build_analysis(assessment, sections)
+    
+    def match_and_rank(self, jd_data, candidate_data, bypass_cache=False):
+        """
+        Match and rank a candidate with a single model call.
+        
+        The prompt asks for both the analysis sections and the final adjusted
+        score that RankScoreAgent.calculate would otherwise request separately.
+        Returns (match_score, final_score, analysis).
+        """
+        assessment = self._assess(jd_data, candidate_data)
+        sections = self._request_sections(assessment, True, bypass_cache)
+        
+        match_score, analysis = self._build_analysis(assessment, sections)
+        final_score = sections['final_score'] if sections.get('final_score') is not None else match_score
+        
+        return match_score, final_score, analysis
+    
+    def match_batch(self, jd_data, candidates, bypass_cache=False):
+        """
+        Match and rank several candidates against one job description.
+        
+        Compact candidate profiles are packed into a single prompt so the job
+        description is evaluated once per batch. A batch whose output fails to
+        parse is split in half and retried; a single candidate falls back to
+        match_and_rank. Returns (match_score, final_score, analysis) per candidate,
+        in input order.
+        """
+        assessments = [self._assess(jd_data, candidate) for candidate in candidates]
+        return self._match_assessed_batch(assessments, bypass_cache)
+    
+    def _match_assessed_batch(self, assessments, bypass_cache=False):
+        if not assessments:
+            return []
+        
+        if len(assessments) == 1:
+            a = assessments[0]
+            sections = self._request_sections(a, True, bypass_cache)
+            match_score, analysis = self._build_analysis(a, sections)
+            final_score = sections['final_score'] if sections.get('final_score') is not None else match_score
+            return [(match_score, final_score, analysis)]
+        
+        prompt = self._build_batch_prompt(assessments)
+        # Leave room for roughly 200 output tokens per candidate
+        num_ctx = max(2048, 1 << (estimate_tokens(prompt) + 200 * len(assessments)).bit_length())
+        result = self._chat(prompt, bypass_cache, format=BATCH_RESULT_SCHEMA, options={'num_ctx': num_ctx}, task='batch')
+        try:
+            entries = self._parse_batch(result, len(assessments))
+        except ValueError as e:
+            middle = len(assessments) // 2
+            print(f"Batch of {len(assessments)} candidates failed to parse ({str(e)}), splitting")
+            return (self._match_assessed_batch(assessments[:middle], bypass_cache) +
+                    self._match_assessed_batch(assessments[middle:], bypass_cache))
+        
+        results = []
+        for a, entry in zip(assessments, entries):
+            # Only the judgement calls come from the model; the factual sections are deterministic
+            sections = {
+                'key_strengths': entry['key_strengths'],
+                'skills_match': (
+                    f"{a['direct_skill_matches']}/{len(a['required_skills'])} required and "
+                    f"{a['preferred_matches']}/{len(a['preferred_skills'])} preferred skills matched."
+                ),
+                'experience_match': f"{a['experience_years']} years against {a['required_experience']} required.",
+                'education_match': f"{a['education_match']*100:.0f}% match to the required education.",
+                'gaps': entry['gaps'],
+                'justification': entry['justification']
+            }
+            match_score, analysis = self._build_analysis(a, sections)
+            results.append((match_score, entry['final_score'], analysis))
+        return results
+    
+    def _request_sections(self, assessment, include_final_score, bypass_cache=False):
+        """
+        Ask the model for its assessment and return the parsed response sections
+        """
+        prompt = self._build_prompt(
+            assessment, include_final_score=include_final_score, structured=self.structured_output
+        )
+        
+        if not self.structured_output:
+            result = self._chat(prompt, bypass_cache)
+            return self._extract_sections(result, include_final_score)
+        
+        schema = self._result_schema(include_final_score)
+        result = self._chat(prompt, bypass_cache, format=schema)
+        try:
+            return self._parse_structured(result, include_final_score)
+        except ValueError as e:
+            error = str(e)
+            print(f"Structured match output failed validation ({error}), retrying with repair prompt")
+        
+        # The repair prompt carries only the bad output and the schema, not the CV again
+        repaired = self._chat(self._build_repair_prompt(result, error, schema), bypass_cache, format=schema, task='repair')
+        try:
+            return self._parse_structured(repaired, include_final_score)
+        except ValueError as e:
+            print(f"Repaired match output still invalid ({str(e)}), falling back to text extraction")
+            return self._extract_sections(repaired, include_final_score)
+    
+    def _chat(self, prompt, bypass_cache=False, format=None, options=None, task='analysis'):
+        """
+        Send the prompt to the model and log its estimated and measured prompt size
+        """
+        start = time.time()
+        response = self.llm.chat(
+            model=self.model_name,
+            messages=[
+                {"role": "user", "content": prompt}
+            ],
+            options=options,
+            format=format,
+            agent='skill_matcher',
+            task=task,
+            bypass_cache=bypass_cache
+        )
+        
+        # Ollama reports the evaluated prompt length; cached responses keep the original count
+        measured = response.get("prompt_eval_count")
+        print(f"Matcher prompt: ~{estimate_tokens(prompt)} tokens estimated, "
+              f"{measured if measured is not None else 'n/a'} evaluated, {time.time() - start:.2f}s")
+        
+        return response["message"]["content"]
+    
+    def score_details(self, jd_data, candidate_data):
+        """
+        Deterministic score and structured match breakdown, without calling the model.
+        Returns (score, details) where details is JSON-serializable.
+        """
+        a = self._assess(jd_data, candidate_data)
+        enhanced_score = self._enhance_with_embeddings(
+            a['required_skills'], a['candidate_skills'], a['weighted_score']
+        )
+        
+        details = {
+            'skill_match_details': a['skill_match_details'],
+            'required_skills_matched': a['direct_skill_matches'],
+            'required_skills_total': len(a['required_skills']),
+            'preferred_skills_matched': a['preferred_matches'],
+            'preferred_skills_total': len(a['preferred_skills']),
+            'experience_years': a['experience_years'],
+            'required_experience': a['required_experience'],
+            'experience_match': a['experience_match'],
+            'education_match': a['education_match'],
+            'weighted_score': a['weighted_score']
+        }
+        return enhanced_score, details
+    
+    def index_skills(self, skills):
+        """
+        Embed skills ahead of matching in one batched pass so semantic matching
+        only reads precomputed vectors. Returns the number of newly embedded skills.
+        """
+        if self.semantic_threshold is None:
+            return 0
+        new_skills = [skill for skill in dict.fromkeys(skills) if isinstance(skill, str) and skill
+                      and skill not in self.vector_store]
+        if not new_skills:
+            return 0
+        try:
+            self.vector_store.get_embeddings(new_skills)
+        except ModelUnavailableError as e:
+            print(f"Skill embeddings unavailable, matching skills by name only: {str(e)}")
+            return 0
+        print(f"Embedded {len(new_skills)} skills for semantic matching")
+        return len(new_skills)
+    
+    def prefilter_score(self, jd_data, candidate_data):
+        """
+        Deterministic weighted score (0-1) computed without calling the model
+        """
+        return self._assess(jd_data, candidate_data)['weighted_score']
+    
+    def _assess(self, jd_data, candidate_data):
+        """
+        Compute the deterministic preliminary assessment used to build the prompt
+        """
         # Prepare prompts with context
-        required_skills = jd_data.get('Required Skills', [])
-        preferred_skills = jd_data.get('Preferred Skills', [])
+        # Stored job descriptions use snake_case keys
+        required_skills = jd_data.get('Required Skills', jd_data.get('required_skills', []))
+        preferred_skills = jd_data.get('Preferred Skills', jd_data.get('preferred_skills', []))
         job_responsibilities = jd_data.get('responsibilities', [])
         job_title = jd_data.get('title', 'Job Position')
         company_name = jd_data.get('company', 'Company')
@@ -39,20 +296,28 @@ class SkillMatcherAgent:
         direct_skill_matches = 0
         skill_match_details = []
         
-        # Check direct matches for required skills
+        # Check matches for required skills (by name, or semantically via embeddings)
         for skill in required_skills:
-            if any(self._skill_match(skill, candidate_skill) for candidate_skill in candidate_skills):
+            closest, similarity = self._closest_skill(skill, candidate_skills)
+            if similarity >= 1.0:
                 direct_skill_matches += 1
                 skill_match_details.append(f"✅ Required skill match: {skill}")
+            elif self._is_semantic_match(similarity):
+                direct_skill_matches += 1
+                skill_match_details.append(f"✅ Required skill match: {skill} (similar: {closest})")
             else:
                 skill_match_details.append(f"❌ Missing required skill: {skill}")
         
-        # Check direct matches for preferred skills
+        # Check matches for preferred skills
         preferred_matches = 0
         for skill in preferred_skills:
-            if any(self._skill_match(skill, candidate_skill) for candidate_skill in candidate_skills):
+            closest, similarity = self._closest_skill(skill, candidate_skills)
+            if similarity >= 1.0:
                 preferred_matches += 1
                 skill_match_details.append(f"✅ Preferred skill match: {skill}")
+            elif self._is_semantic_match(similarity):
+                preferred_matches += 1
+                skill_match_details.append(f"✅ Preferred skill match: {skill} (similar: {closest})")
             else:
                 skill_match_details.append(f"⚠️ Missing preferred skill: {skill}")
         
@@ -83,36 +348,72 @@ class SkillMatcherAgent:
             education_match * education_weight
         )
         
+        return {
+            'required_skills': required_skills,
+            'preferred_skills': preferred_skills,
+            'job_responsibilities': job_responsibilities,
+            'job_title': job_title,
+            'company_name': company_name,
+            'required_experience': required_experience,
+            'required_education': required_education,
+            'candidate_skills': candidate_skills,
+            'candidate_name': candidate_name,
+            'candidate_id': candidate_id,
+            'candidate_experience': candidate_experience,
+            'candidate_education': candidate_education,
+            'candidate_certifications': candidate_certifications,
+            'candidate_languages': candidate_languages,
+            'candidate_summary': candidate_summary,
+            'direct_skill_matches': direct_skill_matches,
+            'preferred_matches': preferred_matches,
+            'skill_match_details': skill_match_details,
+            'experience_years': experience_years,
+            'experience_match': experience_match,
+            'education_match': education_match,
+            'required_skills_score': required_skills_score,
+            'preferred_skills_score': preferred_skills_score,
+            'weighted_score': weighted_score
+        }
+    
+    def _build_prompt(self, assessment, include_final_score=False, structured=False):
+        """
+        Build the analysis prompt, optionally asking for the final adjusted score too
+        and for a JSON object instead of labelled text sections
+        """
+        a = assessment
+        # Verbose sections are clipped to their token budgets; skills being matched stay complete
+        c = {section: self.prompt_budget.compact(section, value) for section, value in a.items()}
+        
         # Format the score as a percentage
-        score_percentage = weighted_score * 100
+        score_percentage = a['weighted_score'] * 100
         
         prompt = f"""
-        Analyze how well candidate {candidate_name} (ID: {candidate_id}) matches the job requirements for the position of {job_title} at {company_name}.
+        Analyze how well candidate {a['candidate_name']} (ID: {a['candidate_id']}) matches the job requirements for the position of {a['job_title']} at {a['company_name']}.
         
         JOB DETAILS:
-        - Job Title: {job_title}
-        - Company: {company_name}
-        - Required Experience: {required_experience} years
-        - Required Education: {required_education}
-        - Required Skills: {required_skills}
-        - Preferred Skills: {preferred_skills}
-        - Job Responsibilities: {job_responsibilities}
+        - Job Title: {a['job_title']}
+        - Company: {a['company_name']}
+        - Required Experience: {a['required_experience']} years
+        - Required Education: {a['required_education']}
+        - Required Skills: {a['required_skills']}
+        - Preferred Skills: {a['preferred_skills']}
+        - Job Responsibilities: {c['job_responsibilities']}
         
         CANDIDATE DETAILS:
-        - Name: {candidate_name}
-        - ID: {candidate_id}
-        - Skills: {candidate_skills}
-        - Experience: {candidate_experience}
-        - Education: {candidate_education}
-        - Certifications: {candidate_certifications}
-        - Languages: {candidate_languages}
-        - Summary: {candidate_summary}
+        - Name: {a['candidate_name']}
+        - ID: {a['candidate_id']}
+        - Skills: {c['candidate_skills']}
+        - Experience: {c['candidate_experience']}
+        - Education: {c['candidate_education']}
+        - Certifications: {c['candidate_certifications']}
+        - Languages: {c['candidate_languages']}
+        - Summary: {c['candidate_summary']}
         
         PRELIMINARY ASSESSMENT:
-        - Required Skills Match: {direct_skill_matches}/{len(required_skills)} ({required_skills_score*100:.1f}%)
-        - Preferred Skills Match: {preferred_matches}/{len(preferred_skills)} ({preferred_skills_score*100:.1f}%)
-        - Experience Match: {experience_years} years vs required {required_experience} years ({experience_match*100:.1f}%)
-        - Education Match: {education_match*100:.1f}%
+        - Required Skills Match: {a['direct_skill_matches']}/{len(a['required_skills'])} ({a['required_skills_score']*100:.1f}%)
+        - Preferred Skills Match: {a['preferred_matches']}/{len(a['preferred_skills'])} ({a['preferred_skills_score']*100:.1f}%)
+        - Experience Match: {a['experience_years']} years vs required {a['required_experience']} years ({a['experience_match']*100:.1f}%)
+        - Education Match: {a['education_match']*100:.1f}%
         - Overall Match Score (Preliminary): {score_percentage:.1f}%
         
         ANALYSIS REQUIREMENTS:
@@ -126,7 +427,44 @@ class SkillMatcherAgent:
         8. Identify any gaps or areas where the candidate doesn't meet requirements.
         9. DO NOT invent or assume details not present in the provided information.
         10. Be specific about why this candidate is or isn't a good match using only the provided information.
+        """
+        
+        if include_final_score:
+            # Fold the RankScoreAgent adjustment into the same request
+            prompt += f"""
+        FINAL SCORE:
+        Starting from the preliminary score ({a['weighted_score']:.2f} on a scale of 0 to 1), adjust it by considering:
+        1. If the candidate exceeds the required experience, this is positive
+        2. If the candidate meets the education requirements, this is positive
+        3. If the candidate lacks required experience or education, this is negative
+        """
         
+        if structured:
+            prompt += f"""
+        Respond with a single JSON object with these fields:
+        - match_score: match percentage between 0 and 100 (preliminary: {score_percentage:.1f})
+        {'- final_score: adjusted score between 0 and 1' if include_final_score else ''}
+        - key_strengths: list of 3-5 key strengths relevant to this position
+        - skills_match: analysis of required and preferred skills matches
+        - experience_match: analysis of experience relevance and duration
+        - education_match: analysis of education requirements
+        - gaps: list of identified gaps in requirements
+        - justification: comprehensive explanation of why this candidate is or isn't a good fit
+        """
+        elif include_final_score:
+            prompt += f"""
+        FORMAT THE OUTPUT EXACTLY AS FOLLOWS:
+        Match Score: {score_percentage:.1f}%
+        Final Score: [adjusted score between 0 and 1]
+        Key Strengths: [3-5 key strengths relevant to this position]
+        Skills Match: [analysis of required and preferred skills matches]
+        Experience Match: [analysis of experience relevance and duration]
+        Education Match: [analysis of education requirements]
+        Gaps: [any identified gaps in requirements]
+        Detailed Justification: [comprehensive explanation of why this candidate is or isn't a good fit]
+        """
+        else:
+            prompt += f"""
         FORMAT THE OUTPUT EXACTLY AS FOLLOWS:
         Match Score: {score_percentage:.1f}%
         Key Strengths: [3-5 key strengths relevant to this position]
@@ -137,37 +475,79 @@ class SkillMatcherAgent:
         Detailed Justification: [comprehensive explanation of why this candidate is or isn't a good fit]
         """
         
-        # Call Ollama model
-        response = ollama.chat(
-            model=self.model_name,
-            messages=[
-                {"role": "user", "content": prompt}
-            ]
-        )
+        # Drop the source indentation, which otherwise costs tokens on every line
+        return textwrap.dedent(prompt).strip()
+    
+    def _build_batch_prompt(self, assessments):
+        """
+        Build one prompt with the job description once and a compact profile per candidate
+        """
+        jd = assessments[0]
+        responsibilities = self.prompt_budget.compact('job_responsibilities', jd['job_responsibilities'])
+        
+        profiles = []
+        for index, a in enumerate(assessments, 1):
+            c = {section: self.batch_prompt_budget.compact(section, value) for section, value in a.items()}
+            profiles.append(f"""
+        CANDIDATE C{index}: {a['candidate_name']} (ID: {a['candidate_id']})
+        - Skills: {c['candidate_skills']}
+        - Experience: {c['candidate_experience']}
+        - Education: {c['candidate_education']}
+        - Certifications: {c['candidate_certifications']}
+        - Languages: {c['candidate_languages']}
+        - Summary: {c['candidate_summary']}
+        - Preliminary: required skills {a['direct_skill_matches']}/{len(a['required_skills'])}, preferred skills {a['preferred_matches']}/{len(a['preferred_skills'])}, experience {a['experience_years']}/{a['required_experience']} years, education {a['education_match']*100:.0f}%, preliminary score {a['weighted_score']:.2f}
+        """)
         
-        # Parse the response to extract match score and justification
-        result = response["message"]["content"]
+        prompt = f"""
+        Assess each of the following {len(assessments)} candidates independently against the job below.
         
-        # Extract data from the response
-        match_score = self._extract_match_score(result)
-        key_strengths = self._extract_key_strengths(result)
-        skills_match = self._extract_skills_match(result)
+        JOB DETAILS:
+        - Job Title: {jd['job_title']}
+        - Company: {jd['company_name']}
+        - Required Experience: {jd['required_experience']} years
+        - Required Education: {jd['required_education']}
+        - Required Skills: {jd['required_skills']}
+        - Preferred Skills: {jd['preferred_skills']}
+        - Job Responsibilities: {responsibilities}
+        {''.join(profiles)}
+        INSTRUCTIONS:
+        1. Use ONLY the information given for each candidate; do not compare candidates with each other.
+        2. Starting from each candidate's preliminary score (0 to 1), adjust it: exceeding the required
+           experience or meeting the education requirement is positive, lacking them is negative.
+        3. DO NOT invent or assume details not present in the provided information.
+        
+        Respond with a JSON object {{"candidates": [...]}} containing one entry per candidate, in order, with:
+        - ref: the candidate reference (C1, C2, ...)
+        - final_score: adjusted score between 0 and 1
+        - key_strengths: list of 2-4 key strengths relevant to this position
+        - gaps: list of identified gaps in requirements
+        - justification: two or three sentences on why this candidate is or isn't a good fit
+        """
         
-        # Extract experience and education match text sections, not the numeric values
-        experience_match_text = self._extract_experience_match(result)
-        education_match_text = self._extract_education_match(result)
+        return textwrap.dedent(prompt).strip()
+    
+    def _build_analysis(self, assessment, sections):
+        """
+        Turn the parsed response sections into (score, comprehensive justification)
+        """
+        a = assessment
         
-        gaps = self._extract_gaps(result)
-        justification = self._extract_justification(result)
+        key_strengths = sections['key_strengths']
+        skills_match = sections['skills_match']
+        experience_match_text = sections['experience_match']
+        education_match_text = sections['education_match']
+        gaps = sections['gaps']
+        justification = sections['justification']
         
         # Enhance matching with vector similarity for skills
         enhanced_score = self._enhance_with_embeddings(
-            required_skills, candidate_skills, weighted_score
+            a['required_skills'], a['candidate_skills'], a['weighted_score']
         )
         
         # Create comprehensive justification including all sections
         comprehensive_justification = f"""
-        ## Match Analysis for {candidate_name} (ID: {candidate_id})
+        ## Match Analysis for {a['candidate_name']} (ID: {a['candidate_id']})
 
         **Overall Match Score: {enhanced_score:.0%}**
 
@@ -178,23 +558,23 @@ class SkillMatcherAgent:
         {skills_match}
         
         #### Skill Match Details:
-        {chr(10).join(skill_match_details)}
+        {chr(10).join(a['skill_match_details'])}
 
         ### Experience Match:
         {experience_match_text}
         
         #### Experience Details:
-        - Estimated Years: {experience_years}
-        - Required Years: {required_experience}
-        - Match Rate: {experience_match*100:.1f}%
+        - Estimated Years: {a['experience_years']}
+        - Required Years: {a['required_experience']}
+        - Match Rate: {a['experience_match']*100:.1f}%
 
         ### Education Match:
         {education_match_text}
         
         #### Education Details:
-        - Candidate Education: {chr(10).join(candidate_education)}
-        - Required Education: {required_education}
-        - Match Rate: {education_match*100:.1f}%
+        - Candidate Education: {chr(10).join(a['candidate_education'])}
+        - Required Education: {a['required_education']}
+        - Match Rate: {a['education_match']*100:.1f}%
         
         ### Gaps:
         {gaps}
@@ -205,6 +585,136 @@ class SkillMatcherAgent:
         
         return enhanced_score, comprehensive_justification
     
+    def _extract_sections(self, result, include_final_score=False):
+        """Parse a free-text response into its labelled sections"""
+        return {
+            'match_score': self._extract_match_score(result),
+            'final_score': self._extract_final_score(result, None) if include_final_score else None,
+            'key_strengths': self._extract_key_strengths(result),
+            'skills_match': self._extract_skills_match(result),
+            # Experience and education match text sections, not the numeric values
+            'experience_match': self._extract_experience_match(result),
+            'education_match': self._extract_education_match(result),
+            'gaps': self._extract_gaps(result),
+            'justification': self._extract_justification(result)
+        }
+    
+    def _result_schema(self, include_final_score=False):
+        """Response schema, with final_score required for fused match-and-rank calls"""
+        if not include_final_score:
+            return MATCH_RESULT_SCHEMA
+        schema = json.loads(json.dumps(MATCH_RESULT_SCHEMA))
+        schema['properties']['final_score'] = {"type": "number", "minimum": 0, "maximum": 1}
+        schema['required'].append('final_score')
+        return schema
+    
+    def _parse_structured(self, result, include_final_score=False):
+        """
+        Parse and validate a JSON response in one pass; raises ValueError when invalid
+        """
+        try:
+            data = json.loads(result)
+        except (json.JSONDecodeError, TypeError) as e:
+            raise ValueError(f"response is not valid JSON: {str(e)}")
+        if not isinstance(data, dict):
+            raise ValueError("response is not a JSON object")
+        
+        missing = [field for field in self._result_schema(include_final_score)['required'] if field not in data]
+        if missing:
+            raise ValueError(f"missing fields: {', '.join(missing)}")
+        
+        def score(field, upper):
+            value = data[field]
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 <= value <= upper:
+                raise ValueError(f"{field} must be a number between 0 and {upper}")
+            return float(value)
+        
+        def text(field):
+            value = data[field]
+            if isinstance(value, list):
+                value = chr(10).join(f"- {str(item).strip()}" for item in value if str(item).strip())
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"{field} must be non-empty text")
+            return value.strip()
+        
+        # Lists are allowed to be empty (e.g. no gaps); render them as bullet points
+        def bullets(field, empty):
+            value = data[field]
+            if isinstance(value, str):
+                return value.strip() or empty
+            if not isinstance(value, list):
+                raise ValueError(f"{field} must be a list of strings")
+            return chr(10).join(f"- {str(item).strip()}" for item in value if str(item).strip()) or empty
+        
+        return {
+            'match_score': score('match_score', 100) / 100,
+            'final_score': score('final_score', 1) if include_final_score else None,
+            'key_strengths': bullets('key_strengths', "No key strengths identified."),
+            'skills_match': text('skills_match'),
+            'experience_match': text('experience_match'),
+            'education_match': text('education_match'),
+            'gaps': bullets('gaps', "No gaps identified."),
+            'justification': text('justification')
+        }
+    
+    def _parse_batch(self, result, expected):
+        """
+        Parse a batch response into one validated entry per candidate, in order;
+        raises ValueError when any candidate is missing or malformed
+        """
+        try:
+            data = json.loads(result)
+        except (json.JSONDecodeError, TypeError) as e:
+            raise ValueError(f"response is not valid JSON: {str(e)}")
+        if not isinstance(data, dict) or not isinstance(data.get('candidates'), list):
+            raise ValueError("response has no candidates list")
+        
+        def bullets(value, empty):
+            if isinstance(value, str):
+                return value.strip() or empty
+            if not isinstance(value, list):
+                return empty
+            return chr(10).join(f"- {str(item).strip()}" for item in value if str(item).strip()) or empty
+        
+        entries = {}
+        for entry in data['candidates']:
+            if not isinstance(entry, dict):
+                raise ValueError("candidate entry is not an object")
+            ref = str(entry.get('ref', '')).strip().upper()
+            score = entry.get('final_score')
+            if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 1:
+                raise ValueError(f"{ref or 'entry'} has no final_score between 0 and 1")
+            justification = entry.get('justification')
+            if not isinstance(justification, str) or not justification.strip():
+                raise ValueError(f"{ref or 'entry'} has no justification")
+            
+            entries[ref] = {
+                'final_score': float(score),
+                'key_strengths': bullets(entry.get('key_strengths'), "No key strengths identified."),
+                'gaps': bullets(entry.get('gaps'), "No gaps identified."),
+                'justification': justification.strip()
+            }
+        
+        missing = [f"C{index}" for index in range(1, expected + 1) if f"C{index}" not in entries]
+        if missing:
+            raise ValueError(f"missing candidates: {', '.join(missing)}")
+        return [entries[f"C{index}"] for index in range(1, expected + 1)]
+    
+    def _build_repair_prompt(self, result, error, schema):
+        """Short prompt asking the model to fix an invalid structured response"""
+        return textwrap.dedent(f"""
+        The following candidate assessment was supposed to be a JSON object matching the schema below,
+        but it failed validation: {error}
+        
+        Rewrite it as a valid JSON object that matches the schema. Keep the original content; do not add new facts.
+        
+        SCHEMA:
+        {json.dumps(schema)}
+        
+        ASSESSMENT:
+        {result}
+        """).strip()
+    
     def _extract_match_score(self, result):
         """Extract match score from result text"""
         # Try percentage format (e.g., 85%)
@@ -266,19 +776,116 @@ class SkillMatcherAgent:
             return match.group(1).strip()
         return "No detailed justification provided."
     
+    def _extract_final_score(self, result, default_score):
+        """Extract the adjusted final score from a fused match-and-rank response"""
+        match = re.search(r'Final Score:\s*(0\.\d+|1\.0|1|0)\b', result)
+        if match:
+            try:
+                return float(match.group(1))
+            except ValueError:
+                return default_score
+        
+        return default_score
+    
     def _enhance_with_embeddings(self, required_skills, candidate_skills, base_score):
-        """Enhance matching with vector similarity"""
-        # This would use the vector store to find semantic similarities
-        # between skills that might not match exactly in text
+        """Enhance matching with vector similarity
+        
+        Name and semantic matches are already counted in base_score. Required
+        skills that are related but fall short of semantic_threshold earn
+        partial credit, scaled by how close their best candidate skill is.
+        """
+        if self.semantic_threshold is None or not required_skills or not candidate_skills:
+            return base_score
         
-        # For hackathon purposes, this is simplified
-        # In a real system, we'd do proper vector similarity
+        floor = self.semantic_threshold - self.RELATED_SKILL_MARGIN
+        credit = 0.0
+        for skill in required_skills:
+            _, similarity = self._closest_skill(skill, candidate_skills)
+            if floor < similarity < self.semantic_threshold:
+                credit += self.RELATED_SKILL_CREDIT * (similarity - floor) / self.RELATED_SKILL_MARGIN
         
-        # Just return the base score for now
-        return base_score
+        # Same weighting as required skills in _assess: 70% of the 50% skills weight
+        return min(1.0, base_score + credit / len(required_skills) * 0.7 * 0.5)
+    
+    def _closest_skill(self, skill, candidate_skills):
+        """
+        Candidate skill closest to skill as (candidate skill, similarity).
+        Name matches score 1.0; otherwise similarity is the embedding cosine,
+        looked up in the skill graph when it covers every skill involved.
+        """
+        if not skill or not candidate_skills:
+            return None, 0.0
+        if any(self._skill_match(skill, candidate_skill) for candidate_skill in candidate_skills):
+            return skill, 1.0
+        if self.semantic_threshold is None:
+            return None, 0.0
+        
+        names = [candidate_skill for candidate_skill in candidate_skills if isinstance(candidate_skill, str) and candidate_skill]
+        if not names:
+            return None, 0.0
+        similarities = self._graph_similarities(skill, names)
+        if similarities is None:
+            similarities = self._skill_similarities(skill, names)
+        best = max(range(len(names)), key=similarities.__getitem__)
+        return names[best], similarities[best]
+    
+    def _graph_similarities(self, skill, candidate_skills):
+        """
+        Similarities from the skill graph, or None unless the graph has computed
+        every skill. A pair in neither skill's neighbour list scores at most the
+        weaker list's lowest similarity: below the related-skill floor it
+        scores 0.0, otherwise it is compared by embeddings.
+        """
+        if self.skill_graph is None:
+            return None
+        neighbors = self.skill_graph.neighbors(skill)
+        if neighbors is None or any(self.skill_graph.neighbors(name) is None for name in candidate_skills):
+            return None
+        
+        floor = self.semantic_threshold - self.RELATED_SKILL_MARGIN
+        similarities, unlisted = [], []
+        for name in candidate_skills:
+            similarity = neighbors.get(name.lower())
+            if similarity is None:
+                similarity = 0.0
+                if min(self.skill_graph.weakest(skill), self.skill_graph.weakest(name)) >= floor:
+                    unlisted.append(name)
+            similarities.append(similarity)
+        
+        if unlisted:
+            exact = dict(zip(unlisted, self._skill_similarities(skill, unlisted)))
+            similarities = [exact.get(name, similarity) for name, similarity in zip(candidate_skills, similarities)]
+        return similarities
+    
+    def _skill_similarities(self, skill, candidate_skills):
+        """Cosine similarity of skill to each candidate skill, memoised per pair"""
+        key = skill.lower()
+        cached = [self._similarity_cache.get((key, candidate_skill.lower())) for candidate_skill in candidate_skills]
+        if None not in cached:
+            return cached
+        
+        try:
+            # One matrix product over the candidate's skill rows
+            ranked = dict(self.vector_store.find_similar(skill, candidate_skills, top_n=len(candidate_skills)))
+        except ModelUnavailableError as e:
+            # Not memoised, so the pair is retried once embeddings are back
+            print(f"Skill embeddings unavailable, matching {skill!r} by name only: {str(e)}")
+            return [0.0] * len(candidate_skills)
+        
+        if len(self._similarity_cache) >= self.max_cached_pairs:
+            self._similarity_cache.clear()
+        similarities = []
+        for candidate_skill in candidate_skills:
+            similarity = ranked.get(candidate_skill, 0.0)
+            self._similarity_cache[(key, candidate_skill.lower())] = similarity
+            similarities.append(similarity)
+        return similarities
+    
+    def _is_semantic_match(self, similarity):
+        return self.semantic_threshold is not None and similarity >= self.semantic_threshold
     
     def _skill_match(self, required_skill, candidate_skill):
-        """Check if skills match (case-insensitive)"""
+        """Check if skills match by name (case-insensitive); see _closest_skill for semantic matches"""
         if not required_skill or not candidate_skill:
             return False
             
@@ -290,7 +897,6 @@ class SkillMatcherAgent:
         if required_skill.lower() in candidate_skill.lower() or candidate_skill.lower() in required_skill.lower():
             return True
             
-        # TODO: Add semantic matching via embeddings
         return False
         
     def _extract_experience_years(self, experience_entries):
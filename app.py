@@ -1,6 +1,7 @@
 # app.py
-from flask import Flask, render_template, request, jsonify, send_from_directory, session
+from flask import Flask, render_template, request, jsonify, send_from_directory, session, Response, stream_with_context
 from __init__ import OllamaRecruitPro
+from llm.limiter import ModelUnavailableError
 import os
 import time
 import pandas as pd
@@ -11,12 +12,32 @@ import traceback
 from PyPDF2 import PdfReader
 import json
 import sqlite3
+import atexit
+import threading
+import contextlib
 
 template_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'ui', 'templates'))
 static_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'ui', 'static'))
 app = Flask(__name__, template_folder=template_dir, static_folder=static_dir)
 app.secret_key = os.urandom(24)  # Required for session
-recruit_system = OllamaRecruitPro()
+recruit_system = OllamaRecruitPro(
+    max_workers=int(os.environ.get('MATCH_MAX_WORKERS', '4')),
+    fused_scoring=os.environ.get('MATCH_FUSED_SCORING', '0') == '1',
+    job_workers=int(os.environ.get('MATCH_JOB_WORKERS', '2')),
+    lazy_analysis=os.environ.get('MATCH_LAZY_ANALYSIS', '0') == '1',
+    structured_output=os.environ.get('MATCH_STRUCTURED_OUTPUT', '0') == '1',
+    batch_size=int(os.environ.get('MATCH_BATCH_SIZE', '1')),
+    routing_config=os.environ.get('MODEL_ROUTES', 'model_routes.json'),
+    embedding_parallelism=int(os.environ.get('EMBEDDING_PARALLELISM', '4')),
+    skill_similarity_threshold=float(os.environ.get('SKILL_SIMILARITY_THRESHOLD', '0.8')),
+    embedding_store_path=os.environ.get('EMBEDDING_STORE_PATH', 'embeddings') or None,
+    embedding_cache_entries=int(os.environ.get('EMBEDDING_CACHE_ENTRIES', '0')) or None,
+    candidate_index_quantize=os.environ.get('CANDIDATE_INDEX_QUANTIZE') or None,
+    skill_neighbors=int(os.environ.get('SKILL_NEIGHBORS', '10'))
+)
+recruit_system.jobs.start()
+# Unsaved candidate index changes are written on shutdown
+atexit.register(recruit_system.close)
 
 # Configure upload folders
 UPLOAD_FOLDER = 'uploads'
@@ -233,12 +254,76 @@ def read_file_content(file_path):
         traceback.print_exc()
         return ""
 
+def format_jd_data(jd_data):
+    """Format job description data for match responses."""
+    return {
+        'title': jd_data.get('title', 'Job Position'),
+        'company': jd_data.get('company', 'Company'),
+        'required_skills': jd_data.get('required_skills', []),
+        'preferred_skills': jd_data.get('preferred_skills', []),
+        'required_experience': jd_data.get('required_experience', 'Not specified'),
+        'required_education': jd_data.get('required_education', 'Not specified')
+    }
+
+def format_match_result(match, formatted_jd):
+    """Shape a match from recruit_system into the structure the frontend expects."""
+    return {
+        'candidate_id': match.get('candidate_id'),       # Keep database ID for reference
+        'candidate_info': match.get('candidate_info', {}),   # Keep the entire candidate_info object intact
+        'score': match.get('score', 0),                  # Raw score (0-1)
+        'score_percent': int(match.get('score', 0) * 100),  # Percentage (0-100)
+        'analysis': match.get('analysis') or '',         # Empty until generated when analysis is lazy
+        'details': match.get('details'),                 # Structured skill/experience/education breakdown
+        'match_id': match.get('match_id'),
+        'analysis_url': f"/matches/{match['match_id']}/analysis" if match.get('match_id') else None,
+        'jd_data': formatted_jd  # Include the job description data
+    }
+
+def parse_match_options(data):
+    """Read optional matching settings from request JSON or query args.
+    
+    Raises TypeError or ValueError for a value that is not a number where one is expected.
+    """
+    def optional(name, cast):
+        value = data.get(name)
+        if value is None or value == '':
+            return None
+        return cast(value)
+    
+    return {
+        'max_workers': optional('max_workers', int),
+        'fused': optional('fused', lambda v: str(v).lower() in ('1', 'true', 'yes')),
+        'bypass_cache': str(data.get('refresh', '')).lower() in ('1', 'true', 'yes'),
+        'lazy_analysis': optional('lazy_analysis', lambda v: str(v).lower() in ('1', 'true', 'yes')),
+        'shortlist_k': optional('shortlist_k', int),
+        'prefilter_floor': optional('prefilter_floor', float),
+        'batch_size': optional('batch_size', int)
+    }
+
+def sse_event(event, data):
+    """Encode one server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
 # Track processing status
+# Background matching progress is tracked per job in the jobs table (see /jobs)
 processing_status = {
     'jd_processing': False,
-    'cv_processing': False,
-    'matching_in_progress': False
+    'cv_processing': False
 }
+# Synchronous and streamed matching runs in progress in this process
+active_matches = {'count': 0}
+active_matches_lock = threading.Lock()
+
+@contextlib.contextmanager
+def matching_run():
+    """Count a /match_candidates or /match_candidates/stream run while it is in progress."""
+    with active_matches_lock:
+        active_matches['count'] += 1
+    try:
+        yield
+    finally:
+        with active_matches_lock:
+            active_matches['count'] -= 1
 
 @app.route('/')
 def index():
@@ -405,7 +490,7 @@ def upload_cv():
                 cv_data["Candidate_ID"] = candidate_id
             
             # Simple insertion into database
-            db_id = recruit_system.db.insert_candidate(cv_data)
+            db_id = recruit_system.insert_candidate(cv_data)
             
             # Store the candidate ID in the session for this upload session
             if 'uploaded_candidate_ids' not in session:
@@ -450,6 +535,62 @@ def get_candidate(candidate_id):
             'error': str(e)
         }), 500
 
+@app.route('/candidates/<int:candidate_id>', methods=['DELETE'])
+def delete_candidate(candidate_id):
+    """Delete a candidate; its profile is tombstoned in the candidate index and compacted in the background."""
+    try:
+        if not recruit_system.delete_candidate(candidate_id):
+            return jsonify({'success': False, 'error': 'Candidate not found'}), 404
+        return jsonify({'success': True, 'candidate_id': candidate_id})
+    except Exception as e:
+        print(f"Error deleting candidate: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/candidates/index', methods=['GET'])
+def candidate_index_freshness():
+    """Compare the candidate index with the candidates table; ?repair=1 re-indexes what has drifted."""
+    try:
+        repair = request.args.get('repair', '').lower() in ('1', 'true', 'yes')
+        return jsonify({'success': True, 'index': recruit_system.check_candidate_index(repair=repair)})
+    except ModelUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        print(f"Error checking candidate index: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+@app.route('/candidates/search', methods=['GET'])
+def search_candidates():
+    """Top-k candidates by profile similarity to ?q=<text> or ?jd_id=<id>, without scoring by the model."""
+    query = request.args.get('q', '')
+    if not query.strip() and not request.args.get('jd_id'):
+        return jsonify({'success': False, 'error': 'Provide q or jd_id'}), 400
+    try:
+        jd_id = int(request.args['jd_id']) if request.args.get('jd_id') else None
+        k = int(request.args.get('k', 10))
+        nprobe = int(request.args['nprobe']) if request.args.get('nprobe') else None
+    except ValueError:
+        return jsonify({'success': False, 'error': 'jd_id, k and nprobe must be integers'}), 400
+    
+    try:
+        start = time.time()
+        results = recruit_system.search_candidates(query, k=k, nprobe=nprobe, jd_id=jd_id)
+        return jsonify({
+            'success': True,
+            'results': results,
+            'indexed': len(recruit_system.candidate_index),
+            'elapsed_ms': (time.time() - start) * 1000
+        })
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 404
+    except ModelUnavailableError as e:
+        return jsonify({'success': False, 'error': str(e)}), 503
+    except Exception as e:
+        print(f"Error searching candidates: {str(e)}")
+        traceback.print_exc()
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 @app.route('/match_candidates', methods=['POST'])
 def match_candidates():
     try:
@@ -459,13 +600,14 @@ def match_candidates():
             
         jd_id = data.get('jd_id')
         candidate_ids = data.get('candidate_ids', [])
+        try:
+            match_options = parse_match_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f'Invalid matching option: {str(e)}'}), 400
         
         if not jd_id:
             return jsonify({'success': False, 'error': 'Job description ID is required'}), 400
             
-        # Set matching status
-        processing_status['matching_in_progress'] = True
-        
         print(f"Starting matching process for JD ID {jd_id} with candidates: {candidate_ids}")
         
         # Get job description data
@@ -493,7 +635,8 @@ def match_candidates():
         # Use all submitted candidate IDs (both from session and direct upload)
         try:
             # Perform matching with detailed CV analysis
-            matches = recruit_system.match_candidates(jd_id, candidate_ids)
+            with matching_run():
+                matches = recruit_system.match_candidates(jd_id, candidate_ids, **match_options)
             
             print(f"Got {len(matches)} matches from recruit_system.match_candidates")
             
@@ -505,36 +648,17 @@ def match_candidates():
                 })
             
             # Format job description data
-            formatted_jd = {
-                'title': jd_data.get('title', 'Job Position'),
-                'company': jd_data.get('company', 'Company'),
-                'required_skills': jd_data.get('required_skills', []),
-                'preferred_skills': jd_data.get('preferred_skills', []),
-                'required_experience': jd_data.get('required_experience', 'Not specified'),
-                'required_education': jd_data.get('required_education', 'Not specified')
-            }
+            formatted_jd = format_jd_data(jd_data)
             
             # Prepare response data
             match_results = []
             for i, match in enumerate(matches):
-                # Format the score to display as percentage
-                score_percent = int(match['score'] * 100)
-                
                 # Debug each match
                 print(f"Processing match {i}:")
                 print(f"  - candidate_id: {match.get('candidate_id')}")
                 print(f"  - candidate_info: {match.get('candidate_info', {}).get('name', 'Unknown')}")
                 
-                # Make sure the result structure matches what the frontend expects
-                match_result = {
-                    'candidate_id': match.get('candidate_id'),       # Keep database ID for reference
-                    'candidate_info': match.get('candidate_info', {}),   # Keep the entire candidate_info object intact
-                    'score': match.get('score', 0),                  # Raw score (0-1)
-                    'score_percent': score_percent,                  # Percentage (0-100)
-                    'analysis': match.get('analysis', ''),
-                    'jd_data': formatted_jd  # Include the job description data
-                }
-                match_results.append(match_result)
+                match_results.append(format_match_result(match, formatted_jd))
             
             # Log the match results to console for debugging
             print(f"Match results prepared for web display: {len(match_results)} candidates")
@@ -554,7 +678,6 @@ def match_candidates():
             })
         except Exception as matching_error:
             print(f"Error during candidate matching: {str(matching_error)}")
-            import traceback
             traceback.print_exc()
             
             return jsonify({
@@ -562,15 +685,178 @@ def match_candidates():
                 'error': f'Error during candidate matching: {str(matching_error)}'
             }), 500
     except Exception as e:
-        processing_status['matching_in_progress'] = False
         print(f"Error in match_candidates: {str(e)}")
         traceback.print_exc()
         return jsonify({
             'success': False,
             'error': str(e)
         }), 500
-    finally:
-        processing_status['matching_in_progress'] = False
+
+@app.route('/match_candidates/stream', methods=['GET'])
+def match_candidates_stream():
+    """Stream match results as server-sent events while candidates are scored.
+    
+    Query args: jd_id, candidate_ids (comma separated, defaults to all candidates)
+    and the same optional settings as /match_candidates. Emits 'start', 'match',
+    'progress', 'done' and 'error' events.
+    """
+    jd_id = request.args.get('jd_id', type=int)
+    if not jd_id:
+        return jsonify({'success': False, 'error': 'Job description ID is required'}), 400
+    
+    jd_data = recruit_system.db.get_job_description(jd_id)
+    if not jd_data:
+        return jsonify({'success': False, 'error': f'Job description with ID {jd_id} not found'}), 404
+    
+    try:
+        candidate_ids = [int(cid) for cid in request.args.get('candidate_ids', '').split(',') if cid.strip()]
+    except ValueError:
+        return jsonify({'success': False, 'error': 'candidate_ids must be comma-separated integers'}), 400
+    try:
+        match_options = parse_match_options(request.args)
+    except (TypeError, ValueError) as e:
+        return jsonify({'success': False, 'error': f'Invalid matching option: {str(e)}'}), 400
+    
+    formatted_jd = format_jd_data(jd_data)
+    
+    def generate():
+        try:
+            with matching_run():
+                for event in recruit_system.iter_match_candidates(jd_id, candidate_ids, **match_options):
+                    if event['type'] == 'match':
+                        yield sse_event('match', format_match_result(event['match'], formatted_jd))
+                    else:
+                        yield sse_event(event['type'], event)
+        except Exception as e:
+            print(f"Error while streaming matches: {str(e)}")
+            traceback.print_exc()
+            yield sse_event('error', {'error': str(e)})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/jobs/match', methods=['POST'])
+def submit_match_job():
+    """Queue a matching run in the background and return its job ID."""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'success': False, 'error': 'No data provided'}), 400
+        
+        jd_id = data.get('jd_id')
+        if not jd_id:
+            return jsonify({'success': False, 'error': 'Job description ID is required'}), 400
+        
+        if not recruit_system.db.get_job_description(jd_id):
+            return jsonify({'success': False, 'error': f'Job description with ID {jd_id} not found'}), 404
+        
+        try:
+            match_options = parse_match_options(data)
+        except (TypeError, ValueError) as e:
+            return jsonify({'success': False, 'error': f'Invalid matching option: {str(e)}'}), 400
+        
+        job_id = recruit_system.submit_match_job(jd_id, data.get('candidate_ids', []), **match_options)
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'status_url': f'/jobs/{job_id}'
+        }), 202
+    except Exception as e:
+        print(f"Error submitting match job: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/jobs/<int:job_id>', methods=['GET'])
+def get_job(job_id):
+    """Get a job's state, progress, timings and (once finished) its results."""
+    try:
+        job = recruit_system.jobs.get(job_id)
+        if not job:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        result = job.get('result')
+        if result and job['job_type'] == 'match':
+            jd_data = recruit_system.db.get_job_description(job['params'].get('jd_id')) or {}
+            formatted_jd = format_jd_data(jd_data)
+            result = dict(result, matches=[format_match_result(match, formatted_jd) for match in result.get('matches', [])])
+        
+        return jsonify({
+            'success': True,
+            'job': {
+                'id': job['id'],
+                'type': job['job_type'],
+                'state': job['state'],
+                'progress': {
+                    'done': job['progress_done'],
+                    'total': job['progress_total']
+                },
+                'cancel_requested': job['cancel_requested'],
+                'queued_at': job['queued_at'],
+                'started_at': job['started_at'],
+                'finished_at': job['finished_at'],
+                'error': job['error'],
+                'result': result
+            }
+        })
+    except Exception as e:
+        print(f"Error fetching job {job_id}: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a queued job, or stop a running one after its in-flight candidates."""
+    try:
+        state = recruit_system.jobs.cancel(job_id)
+        if state is None:
+            return jsonify({'success': False, 'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'job_id': job_id,
+            'state': state
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/matches/<int:match_id>/analysis', methods=['GET'])
+def get_match_analysis(match_id):
+    """Get the long-form analysis for a match, generating it on first request."""
+    try:
+        refresh = request.args.get('refresh', '').lower() in ('1', 'true', 'yes')
+        analysis = recruit_system.get_match_analysis(match_id, bypass_cache=refresh)
+        if analysis is None:
+            return jsonify({'success': False, 'error': 'Match not found'}), 404
+        
+        return jsonify({
+            'success': True,
+            'match_id': match_id,
+            'analysis': analysis
+        })
+    except ModelUnavailableError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    except Exception as e:
+        print(f"Error generating analysis for match {match_id}: {str(e)}")
+        traceback.print_exc()
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
 @app.route('/request_interviews', methods=['POST'])
 def request_interviews():
@@ -653,6 +939,9 @@ def reset_database():
         conn.commit()
         conn.close()
         
+        # Every indexed profile is gone with the table
+        recruit_system.candidate_index.clear()
+        
         return jsonify({
             'success': True,
             'message': 'Database reset successfully. Only real-time uploaded data will be shown.'
@@ -669,9 +958,23 @@ def reset_database():
 def get_status():
     """Get the current processing status."""
     try:
+        running_jobs = recruit_system.db.count_jobs('running')
+        # Maintenance jobs (index compaction, skill neighbours) are not matching
+        running_matches = recruit_system.db.count_jobs('running', job_type='match') + active_matches['count']
         return jsonify({
             'success': True,
-            'status': processing_status,
+            'status': dict(processing_status, matching_in_progress=running_matches > 0),
+            'jobs': {
+                'queued': recruit_system.db.count_jobs('queued'),
+                'running': running_jobs
+            },
+            'llm_cache': recruit_system.llm_cache.stats() if recruit_system.llm_cache else None,
+            'llm': recruit_system.llm.health(),
+            'embeddings': recruit_system.vector_store.stats(),
+            'candidate_index': {
+                'indexed': len(recruit_system.candidate_index),
+                'tombstones': recruit_system.candidate_index.tombstones()
+            },
             'session_info': {
                 'has_jd': 'current_jd_id' in session,
                 'uploaded_candidates_count': len(session.get('uploaded_candidate_ids', []))
@@ -683,6 +986,21 @@ def get_status():
             'error': str(e)
         }), 500
 
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """Model call counters and latency histograms, as Prometheus text or JSON (?format=json)."""
+    metrics = recruit_system.llm.metrics
+    if request.args.get('format') == 'json':
+        return jsonify({
+            'success': True,
+            'llm': metrics.snapshot(),
+            'llm_health': recruit_system.llm.health(),
+            'llm_cache': recruit_system.llm_cache.stats() if recruit_system.llm_cache else None,
+            'embeddings': recruit_system.vector_store.stats()
+        })
+    
+    return Response(metrics.render_prometheus(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/upload')
 def upload_page():
     return render_template('upload.html')
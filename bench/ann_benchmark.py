@@ -0,0 +1,125 @@
+# bench/ann_benchmark.py
+"""
+Recall and latency of the IVF approximate index against exact search.
+
+Builds an IVFIndex over synthetic clustered unit vectors (a stand-in for
+candidate profile embeddings), then for each nprobe reports recall@k
+against an exact matrix-product search and the mean query latency.
+
+    python bench/ann_benchmark.py --vectors 200000 --dim 384 --nlist 512 --nprobe 1 4 16 64
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from memory.ann_index import IVFIndex
+
+def synthetic_vectors(rng, count, dim, clusters, spread):
+    """Unit vectors scattered around random cluster centres"""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, count)]
+    vectors += spread * rng.standard_normal((count, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors
+
+def exact_top_k(vectors, queries, k, chunk=1024):
+    """Exact top-k ids per query by brute-force inner product"""
+    results = []
+    for start in range(0, len(queries), chunk):
+        scores = queries[start:start + chunk] @ vectors.T
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+        results.append(np.take_along_axis(top, order, axis=1))
+    return np.concatenate(results)
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_vectors(rng, args.vectors, args.dim, args.clusters, args.spread)
+    # Queries are perturbed database vectors, like a JD close to some profiles
+    queries = vectors[rng.choice(args.vectors, args.queries, replace=False)]
+    queries = queries + 0.5 * args.spread * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    start = time.perf_counter()
+    truth = exact_top_k(vectors, queries, args.k, chunk=1)
+    exact_ms = (time.perf_counter() - start) * 1000 / args.queries
+
+    index = IVFIndex(args.dim, nlist=args.nlist, train_threshold=min(args.vectors, args.nlist * 39))
+    start = time.perf_counter()
+    # Incremental adds in chunks, as ingestion would
+    for offset in range(0, args.vectors, args.add_chunk):
+        index.add(np.arange(offset, min(offset + args.add_chunk, args.vectors)), vectors[offset:offset + args.add_chunk])
+    build_seconds = time.perf_counter() - start
+
+    path = os.path.join(tempfile.mkdtemp(prefix="orp-ann-"), "index.npz")
+    start = time.perf_counter()
+    index.save(path)
+    save_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    index = IVFIndex.load(path)
+    load_seconds = time.perf_counter() - start
+
+    rows = []
+    for nprobe in args.nprobe:
+        found = []
+        start = time.perf_counter()
+        for query in queries:
+            ids, _ = index.search(query, args.k, nprobe=nprobe)
+            found.append(ids)
+        latency_ms = (time.perf_counter() - start) * 1000 / args.queries
+        recall = np.mean([len(set(ids.tolist()) & set(expected.tolist())) / args.k for ids, expected in zip(found, truth)])
+        rows.append({'nprobe': nprobe, 'recall': float(recall), 'latency_ms': latency_ms,
+                     'speedup': exact_ms / latency_ms if latency_ms else 0.0})
+
+    return {
+        'config': vars(args),
+        'cells': len(index._lists),
+        'build_seconds': build_seconds,
+        'save_seconds': save_seconds,
+        'load_seconds': load_seconds,
+        'index_mb': os.path.getsize(path) / (1024 * 1024),
+        'exact_latency_ms': exact_ms,
+        'results': rows
+    }
+
+def print_report(report):
+    config = report['config']
+    print(f"Vectors: {config['vectors']} x {config['dim']}  Cells: {report['cells']}  Queries: {config['queries']}")
+    print(f"Build: {report['build_seconds']:.2f}s  Save: {report['save_seconds']:.2f}s  "
+          f"Load: {report['load_seconds']:.2f}s  Index file: {report['index_mb']:.1f} MiB")
+    print(f"Exact search: {report['exact_latency_ms']:.2f} ms/query")
+    print()
+    print(f"{'nprobe':>7}{'recall@' + str(config['k']):>12}{'ms/query':>11}{'speedup':>10}")
+    for row in report['results']:
+        print(f"{row['nprobe']:>7}{row['recall']:>12.3f}{row['latency_ms']:>11.2f}{row['speedup']:>9.1f}x")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark IVF approximate search against exact search")
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nlist', type=int, default=256, help="Number of IVF cells")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32], help="Cells scanned per query")
+    parser.add_argument('--clusters', type=int, default=1000, help="Clusters in the synthetic data")
+    parser.add_argument('--spread', type=float, default=0.3, help="Noise around each synthetic cluster")
+    parser.add_argument('--add-chunk', type=int, default=10000, help="Vectors per incremental add")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+# bench/mock_ollama.py
+import argparse
+import hashlib
+import json
+import math
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class MockOllamaServer:
+    """
+    Stand-in Ollama HTTP server for benchmarks and offline development.
+
+    Serves /api/chat, /api/embeddings, /api/embed, /api/tags and /api/version.
+    Chat replies are templated from the prompt so every agent gets output it
+    can parse (CV JSON, labelled match sections, batch JSON, Final Score
+    lines), with scores derived from a hash of the prompt so runs are
+    repeatable. Simulated latency is
+        latency + prompt_tokens / prompt_rate + completion_tokens / token_rate
+    and embeddings are deterministic unit vectors of embedding_dim.
+    responses maps a regex to a canned reply (or a callable taking the request
+    body) and is checked before the templates.
+    """
+    def __init__(self, host="127.0.0.1", port=11435, latency=0.05, token_rate=200.0, prompt_rate=2000.0,
+                 embedding_dim=384, responses=None):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.token_rate = token_rate  # Completion tokens per second (0 disables)
+        self.prompt_rate = prompt_rate  # Prompt tokens evaluated per second (0 disables)
+        self.embedding_dim = embedding_dim
+        self.responses = [(re.compile(pattern, re.IGNORECASE), reply) for pattern, reply in (responses or {}).items()]
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Start serving in a background thread and return the base URL"""
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == '/api/version':
+                    self._send({'version': '0.0.0-mock'})
+                elif self.path == '/api/tags':
+                    self._send({'models': []})
+                else:
+                    self._send({'error': 'not found'}, status=404)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                try:
+                    body = json.loads(self.rfile.read(length) or b'{}')
+                except json.JSONDecodeError:
+                    self._send({'error': 'invalid JSON'}, status=400)
+                    return
+
+                with server._lock:
+                    server.requests += 1
+
+                if self.path == '/api/chat':
+                    self._send(server.chat(body))
+                elif self.path == '/api/embeddings':
+                    self._send(server.embeddings(body))
+                elif self.path == '/api/embed':
+                    self._send(server.embed(body))
+                else:
+                    self._send({'error': 'not found'}, status=404)
+
+            def _send(self, payload, status=200):
+                data = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        self._server = ThreadingHTTPServer((self.host, self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]  # Resolves port=0 to the bound port
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def chat(self, body):
+        """Build a templated chat reply, sleeping for the simulated generation time"""
+        start = time.time()
+        messages = body.get('messages') or [{}]
+        prompt = messages[-1].get('content', '')
+        content = self._reply(prompt, body)
+
+        prompt_tokens = self._count_tokens(' '.join(m.get('content', '') for m in messages))
+        completion_tokens = self._count_tokens(content)
+        num_predict = (body.get('options') or {}).get('num_predict')
+        if num_predict and num_predict > 0:
+            completion_tokens = min(completion_tokens, num_predict)
+        self._simulate(prompt_tokens, completion_tokens)
+
+        duration_ns = int((time.time() - start) * 1e9)
+        return {
+            'model': body.get('model', 'mock'),
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+            'message': {'role': 'assistant', 'content': content},
+            'done': True,
+            'done_reason': 'stop',
+            'total_duration': duration_ns,
+            'prompt_eval_count': prompt_tokens,
+            'eval_count': completion_tokens
+        }
+
+    def embeddings(self, body):
+        """Legacy single-prompt embeddings endpoint"""
+        self._simulate(self._count_tokens(body.get('prompt', '')), 0)
+        return {'embedding': self._vector(body.get('prompt', ''))}
+
+    def embed(self, body):
+        """Batch embeddings endpoint"""
+        inputs = body.get('input', [])
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        self._simulate(sum(self._count_tokens(text) for text in inputs), 0)
+        return {'model': body.get('model', 'mock'), 'embeddings': [self._vector(text) for text in inputs]}
+
+    def _reply(self, prompt, body):
+        for pattern, reply in self.responses:
+            if pattern.search(prompt):
+                return reply(body) if callable(reply) else reply
+
+        fmt = body.get('format')
+        score = self._score(prompt)
+
+        if isinstance(fmt, dict) and 'candidates' in fmt.get('properties', {}):
+            refs = re.findall(r'CANDIDATE (C\d+)', prompt)
+            return json.dumps({'candidates': [{
+                'ref': ref,
+                'final_score': round(self._score(prompt + ref), 2),
+                'key_strengths': ['Relevant technical skills', 'Solid delivery record'],
+                'gaps': ['Limited domain exposure'],
+                'justification': f'Mock assessment for {ref}.'
+            } for ref in refs]})
+
+        if isinstance(fmt, dict):
+            return json.dumps({
+                'match_score': round(score * 100, 1),
+                'final_score': round(score, 2),
+                'key_strengths': ['Relevant technical skills', 'Solid delivery record'],
+                'skills_match': 'Most required skills are present.',
+                'experience_match': 'Experience is broadly in line with the role.',
+                'education_match': 'Education meets the requirement.',
+                'gaps': ['Limited domain exposure'],
+                'justification': 'Mock assessment generated by the benchmark server.'
+            })
+
+        if 'Extract ONLY the following information from this CV' in prompt:
+            return json.dumps(self._cv_fields(prompt))
+
+        if 'FORMAT THE OUTPUT EXACTLY AS FOLLOWS' in prompt:
+            return (
+                f"Match Score: {score * 100:.1f}%\n"
+                + (f"Final Score: {score:.2f}\n" if 'Final Score:' in prompt else '')
+                + "Key Strengths: Relevant technical skills; solid delivery record\n"
+                "Skills Match: Most required skills are present.\n"
+                "Experience Match: Experience is broadly in line with the role.\n"
+                "Education Match: Education meets the requirement.\n"
+                "Gaps: Limited domain exposure\n"
+                "Detailed Justification: Mock assessment generated by the benchmark server."
+            )
+
+        if 'Final Score:' in prompt:
+            return f"Final Score: {score:.2f}"
+
+        return "Dear candidate,\n\nThank you for your application. This is a mock reply.\n\nBest regards,\nRecruiting Team"
+
+    @staticmethod
+    def _cv_fields(prompt):
+        """Best-effort fields for the CV parser's extraction prompt"""
+        cv_text = prompt.split('CV:', 1)[-1]
+        email = re.search(r'[\w\.-]+@[\w\.-]+', cv_text)
+        words = re.findall(r'\b[A-Z][a-z]+\b', cv_text)
+        return {
+            'Name': ' '.join(words[:2]) or 'Mock Candidate',
+            'Email': email.group(0) if email else '',
+            'Phone': '',
+            'Candidate_ID': '',
+            'Skills': sorted(set(re.findall(r'\b(Python|Java|SQL|Docker|Kubernetes|React|AWS|Go|Rust|Spark)\b', cv_text))),
+            'Experience': [],
+            'Education': [],
+            'Certifications': []
+        }
+
+    def _simulate(self, prompt_tokens, completion_tokens):
+        delay = self.latency
+        if self.prompt_rate:
+            delay += prompt_tokens / self.prompt_rate
+        if self.token_rate:
+            delay += completion_tokens / self.token_rate
+        if delay > 0:
+            time.sleep(delay)
+
+    @staticmethod
+    def _count_tokens(text):
+        return max(1, len(text) // 4) if text else 0
+
+    @staticmethod
+    def _score(text):
+        """Repeatable pseudo-score in [0.4, 0.95] derived from the prompt"""
+        digest = hashlib.sha256(text.encode('utf-8')).digest()
+        return 0.4 + 0.55 * int.from_bytes(digest[:4], 'big') / 0xFFFFFFFF
+
+    def _vector(self, text):
+        """Deterministic unit vector; texts sharing words get similar vectors"""
+        vector = [0.0] * self.embedding_dim
+        for word in re.findall(r'\w+', str(text).lower()) or ['']:
+            digest = hashlib.sha256(word.encode('utf-8')).digest()
+            for i in range(0, 16, 2):
+                index = int.from_bytes(digest[i:i + 2], 'big') % self.embedding_dim
+                vector[index] += 1.0 if digest[i] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a mock Ollama server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=11435)
+    parser.add_argument('--latency', type=float, default=0.05, help="Fixed seconds added to every request")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help="Completion token rate (0 = instant)")
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=2000.0, help="Prompt eval rate (0 = instant)")
+    parser.add_argument('--embedding-dim', type=int, default=384)
+    args = parser.parse_args()
+
+    server = MockOllamaServer(
+        host=args.host,
+        port=args.port,
+        latency=args.latency,
+        token_rate=args.tokens_per_second,
+        prompt_rate=args.prompt_tokens_per_second,
+        embedding_dim=args.embedding_dim
+    )
+    print(f"Mock Ollama listening on {server.start()} (set OLLAMA_HOST to use it)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+# bench/pipeline_benchmark.py
+"""
+End-to-end throughput benchmark for the recruiting pipeline.
+
+Drives OllamaRecruitPro.process_job_description, process_cv and
+match_candidates over a synthetic corpus against the bundled mock Ollama
+server (or a real one with --ollama-host) and reports candidates/second,
+p50/p95 latency per stage, model call metrics and peak RSS.
+
+    python bench/pipeline_benchmark.py --candidates 200 --jds 3 --workers 8
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.mock_ollama import MockOllamaServer
+
+SKILLS = [
+    "Python", "Java", "SQL", "Docker", "Kubernetes", "React", "AWS", "Go", "Rust", "Spark",
+    "Machine Learning", "Data Analysis", "Flask", "Django", "PostgreSQL", "Terraform",
+    "TypeScript", "Node.js", "Pandas", "NumPy", "Git", "Linux", "Kafka", "Airflow"
+]
+TITLES = ["Software Engineer", "Data Scientist", "Backend Developer", "ML Engineer", "DevOps Engineer"]
+COMPANIES = ["Acme Corp", "Globex", "Initech", "Umbrella Labs", "Stark Industries"]
+FIRST_NAMES = ["Alex", "Priya", "Chen", "Maria", "Omar", "Sofia", "Liam", "Aisha", "Kenji", "Elena"]
+LAST_NAMES = ["Smith", "Patel", "Wang", "Garcia", "Haddad", "Rossi", "Murphy", "Khan", "Sato", "Novak"]
+DEGREES = ["Bachelor of Science in Computer Science", "Master of Science in Data Science",
+           "Bachelor of Engineering", "PhD in Machine Learning"]
+
+def synthetic_jd(rng):
+    """Job description JSON text"""
+    skills = rng.sample(SKILLS, 8)
+    return json.dumps({
+        "title": rng.choice(TITLES),
+        "company": rng.choice(COMPANIES),
+        "required_skills": skills[:5],
+        "preferred_skills": skills[5:],
+        "required_experience": rng.randint(1, 8),
+        "required_education": rng.choice(["Bachelor", "Master", ""]),
+        "responsibilities": [f"Own {skill} services end to end" for skill in skills[:4]]
+    })
+
+def synthetic_cv(rng, index, structured=True):
+    """CV text; structured CVs are handled by direct parsing, free-form ones go to the model"""
+    name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+    skills = rng.sample(SKILLS, rng.randint(4, 12))
+    start = rng.randint(2005, 2020)
+    jobs = []
+    for _ in range(rng.randint(1, 4)):
+        end = min(2024, start + rng.randint(1, 5))
+        jobs.append((rng.choice(TITLES), rng.choice(COMPANIES), start, end))
+        start = end
+    degree = rng.choice(DEGREES)
+
+    if not structured:
+        return (
+            f"{name} is a {jobs[-1][0].lower()} with experience in {', '.join(skills)}. "
+            f"Reach them at {name.split()[0].lower()}{index}@example.com. "
+            + " ".join(f"Worked as {title} for {company} from {s} to {e}." for title, company, s, e in jobs)
+            + f" Holds a {degree}."
+        )
+
+    return "\n".join([
+        f"ID: C{10000 + index}",
+        f"Name: {name}",
+        f"Email: {name.split()[0].lower()}{index}@example.com",
+        f"Phone: 555-{rng.randint(100, 999)}-{rng.randint(1000, 9999)}",
+        "",
+        "Education",
+        f"{degree} ({start - 4}-{start})",
+        "",
+        "Work Experience",
+        *[f"{title} at {company} ({s}-{e})\nDelivered {rng.choice(skills)} projects" for title, company, s, e in jobs],
+        "",
+        "Skills",
+        *[f"{skill} - used in production" for skill in skills],
+        "",
+        "Certifications",
+        "AWS Certified Developer" if "AWS" in skills else "None"
+    ])
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+def summarize(samples):
+    return {
+        'count': len(samples),
+        'p50': percentile(samples, 0.5),
+        'p95': percentile(samples, 0.95),
+        'max': max(samples) if samples else 0.0
+    }
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MiB"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+def timed(samples, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    samples.append(time.perf_counter() - start)
+    return result
+
+def run(args):
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="orp-bench-")
+
+    server = None
+    if args.ollama_host:
+        os.environ['OLLAMA_HOSTS'] = args.ollama_host
+    else:
+        server = MockOllamaServer(
+            port=0,
+            latency=args.latency,
+            token_rate=args.tokens_per_second,
+            prompt_rate=args.prompt_tokens_per_second
+        )
+        os.environ['OLLAMA_HOSTS'] = server.start()
+
+    from __init__ import OllamaRecruitPro
+
+    system = OllamaRecruitPro(
+        max_workers=args.workers,
+        fused_scoring=args.fused,
+        llm_cache_path=os.path.join(workdir, "llm_cache.db") if args.cache else None,
+        lazy_analysis=args.lazy,
+        structured_output=args.structured,
+        batch_size=args.batch_size,
+        routing_config=args.routes,
+        db_path=os.path.join(workdir, "bench.db"),
+        embedding_store_path=os.path.join(workdir, "embeddings"),
+        candidate_index_path=os.path.join(workdir, "candidate_index.npz")
+    )
+
+    # Time each scoring task (one candidate, or one batch) inside match_candidates
+    match_samples = []
+    task_name = '_score_batch' if args.batch_size > 1 and not args.lazy else '_score_candidate'
+    score_task = getattr(system, task_name)
+    setattr(system, task_name, lambda *a, **kw: timed(match_samples, score_task, *a, **kw))
+
+    quiet = open(os.devnull, 'w') if not args.verbose else None
+    redirect = (lambda: contextlib.redirect_stdout(quiet)) if quiet else contextlib.nullcontext
+    stages = {}
+
+    jd_samples = []
+    with redirect():
+        stage_start = time.perf_counter()
+        jd_ids = [timed(jd_samples, system.process_job_description, synthetic_jd(rng)) for _ in range(args.jds)]
+        stages['process_job_description'] = dict(summarize(jd_samples), wall=time.perf_counter() - stage_start)
+
+        cv_samples = []
+        stage_start = time.perf_counter()
+        candidate_ids = []
+        for index in range(args.candidates):
+            structured = rng.random() >= args.unstructured_ratio
+            candidate_id = timed(cv_samples, system.process_cv, synthetic_cv(rng, index, structured))
+            if candidate_id:
+                candidate_ids.append(candidate_id)
+        stages['process_cv'] = dict(summarize(cv_samples), wall=time.perf_counter() - stage_start)
+
+        match_runs = []
+        stage_start = time.perf_counter()
+        matched = 0
+        for jd_id in jd_ids:
+            matches = timed(match_runs, system.match_candidates, jd_id, candidate_ids)
+            matched += len(matches)
+        match_wall = time.perf_counter() - stage_start
+        stages['match_candidates'] = dict(summarize(match_runs), wall=match_wall)
+        stages['match_task'] = dict(summarize(match_samples), wall=sum(match_samples))
+
+    scored = len(candidate_ids) * len(jd_ids)
+    report = {
+        'config': {key: value for key, value in vars(args).items()},
+        'candidates': len(candidate_ids),
+        'job_descriptions': len(jd_ids),
+        'matches_above_threshold': matched,
+        'cv_per_second': len(candidate_ids) / stages['process_cv']['wall'] if stages['process_cv']['wall'] else 0.0,
+        'candidates_per_second': scored / match_wall if match_wall else 0.0,
+        'stages': stages,
+        'llm': system.llm.metrics.snapshot()['series'],
+        'mock_requests': server.requests if server else None,
+        'peak_rss_mb': peak_rss_mb()
+    }
+
+    system.close()
+    if server:
+        server.stop()
+    return report
+
+def print_report(report):
+    print(f"Candidates: {report['candidates']}  Job descriptions: {report['job_descriptions']}  "
+          f"Matches above threshold: {report['matches_above_threshold']}")
+    print(f"CV ingestion:      {report['cv_per_second']:.2f} CVs/s")
+    print(f"Matching:          {report['candidates_per_second']:.2f} candidates/s")
+    print(f"Peak RSS:          {report['peak_rss_mb']:.1f} MiB")
+    print()
+    print(f"{'stage':<26}{'count':>7}{'p50 ms':>11}{'p95 ms':>11}{'max ms':>11}{'wall s':>9}")
+    for stage, stats in report['stages'].items():
+        print(f"{stage:<26}{stats['count']:>7}{stats['p50'] * 1000:>11.1f}{stats['p95'] * 1000:>11.1f}"
+              f"{stats['max'] * 1000:>11.1f}{stats['wall']:>9.2f}")
+    print()
+    print(f"{'agent/model/op':<42}{'calls':>7}{'hits':>6}{'avg ms':>9}{'prompt tok':>12}{'compl tok':>11}")
+    for series in report['llm']:
+        label = f"{series['agent']}/{series['model']}/{series['operation']}"
+        print(f"{label:<42}{series['calls']:>7}{series['cache_hits']:>6}{series['latency_avg'] * 1000:>9.1f}"
+              f"{series['prompt_tokens']:>12}{series['completion_tokens']:>11}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the OllamaRecruitPro pipeline end to end")
+    parser.add_argument('--candidates', type=int, default=50)
+    parser.add_argument('--jds', type=int, default=2)
+    parser.add_argument('--workers', type=int, default=4, help="Concurrent candidates in match_candidates")
+    parser.add_argument('--batch-size', type=int, default=1)
+    parser.add_argument('--fused', action='store_true')
+    parser.add_argument('--lazy', action='store_true', help="Lazy match analysis")
+    parser.add_argument('--structured', action='store_true', help="Structured JSON matcher output")
+    parser.add_argument('--cache', action='store_true', help="Enable the LLM response cache")
+    parser.add_argument('--routes', default=None, help="Model routing config file")
+    parser.add_argument('--unstructured-ratio', type=float, default=0.2,
+                        help="Fraction of free-form CVs that need the model to parse")
+    parser.add_argument('--latency', type=float, default=0.05, help="Mock server fixed latency per request (s)")
+    parser.add_argument('--tokens-per-second', type=float, default=200.0, help="Mock completion token rate")
+    parser.add_argument('--prompt-tokens-per-second', type=float, default=2000.0, help="Mock prompt eval rate")
+    parser.add_argument('--ollama-host', default=None, help="Benchmark a real Ollama instead of the mock")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="Show pipeline logging")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+# bench/quantization_benchmark.py
+"""
+Memory and recall of int8-quantized embeddings against float32.
+
+Scores synthetic clustered unit vectors (a stand-in for skill and candidate
+profile embeddings) by brute force in float32 and in int8 with per-vector
+scales, with and without an exact float re-rank of the best candidates,
+then repeats the comparison inside IVFIndex. Reports memory, recall@k
+against exact float32 search and query latency.
+
+    python bench/quantization_benchmark.py --vectors 100000 --dim 384 --rerank 50
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench.ann_benchmark import synthetic_vectors, exact_top_k
+from memory.ann_index import IVFIndex
+from memory.quantization import quantize_int8, int8_scores
+
+def recall(found, truth, k):
+    return float(np.mean([len(set(ids[:k].tolist()) & set(expected.tolist())) / k for ids, expected in zip(found, truth)]))
+
+def top_k(scores, k):
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top])]
+
+def timed_queries(queries, search):
+    start = time.perf_counter()
+    found = [search(query) for query in queries]
+    return found, (time.perf_counter() - start) * 1000 / len(queries)
+
+def run(args):
+    rng = np.random.default_rng(args.seed)
+    vectors = synthetic_vectors(rng, args.vectors, args.dim, args.clusters, args.spread)
+    queries = vectors[rng.choice(args.vectors, args.queries, replace=False)]
+    queries = queries + 0.5 * args.spread * rng.standard_normal(queries.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    truth = exact_top_k(vectors, queries, args.k)
+    k, shortlist = args.k, max(args.k, args.rerank)
+
+    codes, scales = quantize_int8(vectors)
+    rows = []
+
+    found, latency = timed_queries(queries, lambda query: top_k(vectors @ query, k))
+    rows.append({'mode': 'flat float32', 'bytes': vectors.nbytes, 'recall': recall(found, truth, k), 'latency_ms': latency})
+
+    found, latency = timed_queries(queries, lambda query: top_k(int8_scores(codes, scales, query), k))
+    rows.append({'mode': 'flat int8', 'bytes': codes.nbytes + scales.nbytes,
+                 'recall': recall(found, truth, k), 'latency_ms': latency})
+
+    def reranked(query):
+        candidates = top_k(int8_scores(codes, scales, query), shortlist)
+        return candidates[top_k(vectors[candidates] @ query, k)]
+
+    found, latency = timed_queries(queries, reranked)
+    rows.append({'mode': f'flat int8 + rerank {args.rerank}', 'bytes': codes.nbytes + scales.nbytes,
+                 'recall': recall(found, truth, k), 'latency_ms': latency})
+
+    for quantize, rerank in ((None, 0), ('int8', 0), ('int8', args.rerank)):
+        index = IVFIndex(args.dim, nlist=args.nlist, nprobe=args.nprobe, quantize=quantize, rerank=rerank,
+                         train_threshold=min(args.vectors, args.nlist * 39))
+        index.rerank_source = lambda ids: vectors[ids]
+        index.add(np.arange(args.vectors), vectors)
+        found, latency = timed_queries(queries, lambda query: index.search(query, k)[0])
+        label = f"ivf {quantize or 'float32'}" + (f" + rerank {rerank}" if rerank else '') + f" (nprobe {args.nprobe})"
+        rows.append({'mode': label, 'bytes': index.memory_bytes(), 'recall': recall(found, truth, k),
+                     'latency_ms': latency})
+
+    return {'config': vars(args), 'results': rows}
+
+def print_report(report):
+    config = report['config']
+    print(f"Vectors: {config['vectors']} x {config['dim']}  Queries: {config['queries']}  k: {config['k']}")
+    print()
+    baseline = report['results'][0]['bytes']
+    print(f"{'mode':<38}{'MiB':>9}{'saved':>8}{'recall@' + str(config['k']):>12}{'ms/query':>11}")
+    for row in report['results']:
+        saved = 1 - row['bytes'] / baseline
+        print(f"{row['mode']:<38}{row['bytes'] / (1024 * 1024):>9.1f}{saved:>8.0%}{row['recall']:>12.3f}"
+              f"{row['latency_ms']:>11.2f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark int8 embedding quantization against float32")
+    parser.add_argument('--vectors', type=int, default=100000)
+    parser.add_argument('--dim', type=int, default=384)
+    parser.add_argument('--queries', type=int, default=100)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--rerank', type=int, default=50, help="Quantized candidates re-ranked in float32")
+    parser.add_argument('--nlist', type=int, default=256, help="IVF cells")
+    parser.add_argument('--nprobe', type=int, default=16, help="IVF cells scanned per query")
+    parser.add_argument('--clusters', type=int, default=1000, help="Clusters in the synthetic data")
+    parser.add_argument('--spread', type=float, default=0.3, help="Noise around each synthetic cluster")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+    args = parser.parse_args()
+
+    report = run(args)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+# llm/client.py
+import os
+import random
+import threading
+import time
+import httpx
+import ollama
+from llm.metrics import LLMMetrics
+from llm.routing import ModelRouter
+from llm.limiter import AdaptiveLimiter, CircuitBreaker, CircuitOpenError, ModelUnavailableError
+
+DEFAULT_HOST = "http://localhost:11434"
+
+class LLMClient:
+    """
+    Shared Ollama client used by every agent.
+
+    Keeps one pooled keep-alive HTTP transport per Ollama host, applies
+    per-call timeouts, retries transient failures with jittered exponential
+    backoff, and spreads calls across hosts by least outstanding requests.
+    Responses are returned as plain dicts and go through the optional
+    LLMCache. Every call is recorded in LLMMetrics under the calling agent.
+    Requests pass an AdaptiveLimiter. Calls that still fail after retries
+    raise ModelUnavailableError, and a CircuitBreaker makes calls fail fast
+    with CircuitOpenError while the backend is down. A ModelRouter picks the
+    model, generation options and timeout for each agent task.
+    """
+    def __init__(self, hosts=None, timeout=120.0, max_retries=2, backoff_base=0.5, backoff_max=8.0,
+                 max_connections=16, cache=None, metrics=None, limiter=None, breaker=None, router=None,
+                 concurrency=None):
+        if hosts is None:
+            hosts = os.environ.get('OLLAMA_HOSTS') or os.environ.get('OLLAMA_HOST') or DEFAULT_HOST
+        if isinstance(hosts, str):
+            hosts = [host.strip() for host in hosts.split(',') if host.strip()]
+        if not hosts:
+            raise ValueError("LLMClient needs at least one Ollama host")
+
+        self.hosts = hosts
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = cache
+        self.metrics = metrics or LLMMetrics()
+        # Start at the callers' concurrency (default: the connection pool size) and adapt from there
+        self.limiter = limiter or AdaptiveLimiter(
+            initial_limit=min(concurrency or max_connections, max_connections), max_limit=max_connections
+        )
+        self.breaker = breaker or CircuitBreaker()
+        self.router = router or ModelRouter()
+
+        self._lock = threading.Lock()
+        self._outstanding = {host: 0 for host in hosts}
+        self._next_host = 0
+        # One connection pool per host, shared by the per-timeout clients below
+        self._transports = {
+            host: httpx.HTTPTransport(limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            ))
+            for host in hosts
+        }
+        self._clients = {}
+
+    def chat(self, model, messages, options=None, format=None, timeout=None, bypass_cache=False, agent=None,
+             task=None):
+        """Cached, retried, load-balanced equivalent of ollama.chat
+        
+        model is the agent's default; a route for (agent, task) may replace it
+        and supplies options and timeout unless they are passed explicitly.
+        """
+        model, options, timeout = self._route(agent, task, model, options, timeout)
+        start = time.time()
+        key = None
+        if self.cache is not None:
+            key = self.cache.make_key(model, messages, options, format)
+            if not bypass_cache:
+                cached = self.cache.get(key)
+                if cached is not None:
+                    self.metrics.record(agent, model, 'chat', time.time() - start, cache_hit=True)
+                    return cached
+
+        kwargs = {'model': model, 'messages': messages, 'options': options}
+        if format is not None:
+            kwargs['format'] = format
+        response = self._measured_call('chat', agent, task, timeout, **kwargs)
+
+        if self.cache is not None:
+            self.cache.put(key, model, response)
+        return response
+
+    def embeddings(self, model, prompt, timeout=None, agent=None, task=None):
+        """Retried, load-balanced equivalent of ollama.embeddings"""
+        model, _, timeout = self._route(agent, task, model, None, timeout)
+        return self._measured_call('embeddings', agent, task, timeout, model=model, prompt=prompt)
+
+    def embed(self, model, input, timeout=None, agent=None, task=None):
+        """Retried, load-balanced equivalent of ollama.embed: one request for a list of texts"""
+        model, _, timeout = self._route(agent, task, model, None, timeout)
+        return self._measured_call('embed', agent, task, timeout, model=model, input=list(input))
+
+    def available(self):
+        """False while the circuit breaker is rejecting model calls"""
+        return self.breaker.state != CircuitBreaker.OPEN
+
+    def health(self):
+        """Circuit state and current concurrency limit"""
+        return dict(self.limiter.state(), circuit=self.breaker.state, consecutive_failures=self.breaker.failures)
+
+    def outstanding(self):
+        """Requests currently in flight per host"""
+        with self._lock:
+            return dict(self._outstanding)
+
+    def close(self):
+        """Close pooled connections"""
+        for transport in self._transports.values():
+            transport.close()
+
+    def _route(self, agent, task, model, options, timeout):
+        """Apply the routing table; explicit options and timeout win over the route"""
+        route = self.router.resolve(agent or 'unknown', task)
+        if route.get('options'):
+            options = dict(route['options'], **(options or {}))
+        return route.get('model') or model, options, timeout or route.get('timeout')
+
+    def _measured_call(self, method, agent, task, timeout, **kwargs):
+        """_call, recording wall time, token counts and outcome in the metrics"""
+        model = kwargs.get('model')
+        start = time.time()
+        try:
+            self.breaker.before_call()
+            response = self._call(method, timeout, (agent, task, method), **kwargs)
+        except CircuitOpenError:
+            self.metrics.record(agent, model, method, time.time() - start, outcome='circuit_open')
+            raise
+        except Exception as e:
+            self.metrics.record(agent, model, method, time.time() - start, outcome=self._outcome(e))
+            if not self._is_retryable(e):
+                # The backend answered; the request itself was bad
+                self.breaker.record_success()
+                raise
+            self.breaker.record_failure()
+            if not self.available():
+                raise CircuitOpenError(f"Model backend unavailable: {str(e)}") from e
+            raise ModelUnavailableError(f"Model call failed after retries: {str(e)}") from e
+
+        self.breaker.record_success()
+        self.metrics.record(
+            agent, model, method, time.time() - start,
+            prompt_tokens=response.get('prompt_eval_count'),
+            completion_tokens=response.get('eval_count')
+        )
+        return response
+
+    def _call(self, method, timeout, limiter_key, **kwargs):
+        """Retried call on the least busy host; limiter_key groups latencies of similar calls"""
+        timeout = timeout or self.timeout
+        last_error = None
+        failed_host = None
+
+        for attempt in range(self.max_retries + 1):
+            # Wait for a concurrency slot, giving up early if the circuit opens meanwhile
+            while not self.limiter.acquire(timeout=1.0):
+                if not self.available():
+                    raise CircuitOpenError("Model backend unavailable while waiting for capacity")
+
+            host = self._acquire_host(avoid=failed_host)
+            attempt_start = time.time()
+            dropped = False
+            try:
+                client = self._client_for(host, timeout)
+                return self._to_dict(getattr(client, method)(**kwargs))
+            except Exception as e:
+                if not self._is_retryable(e):
+                    raise
+                dropped = True
+                last_error = e
+                failed_host = host
+                print(f"Ollama {method} on {host} failed (attempt {attempt + 1}/{self.max_retries + 1}): {str(e)}")
+            finally:
+                self._release_host(host)
+                self.limiter.release(time.time() - attempt_start, dropped=dropped, key=limiter_key)
+
+            if not self.available():
+                # Other calls have tripped the breaker; stop retrying against a down backend
+                break
+            if attempt < self.max_retries:
+                # Full jitter keeps retries from many workers from synchronizing
+                delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+                time.sleep(random.uniform(0, delay))
+
+        raise last_error
+
+    def _acquire_host(self, avoid=None):
+        """Pick the host with the fewest requests in flight, rotating between ties"""
+        with self._lock:
+            candidates = [host for host in self.hosts if host != avoid] or self.hosts
+            fewest = min(self._outstanding[host] for host in candidates)
+            tied = [host for host in candidates if self._outstanding[host] == fewest]
+            host = tied[self._next_host % len(tied)]
+            self._next_host += 1
+            self._outstanding[host] += 1
+            return host
+
+    def _release_host(self, host):
+        with self._lock:
+            self._outstanding[host] -= 1
+
+    def _client_for(self, host, timeout):
+        """ollama.Client for a host and timeout, reusing the host's connection pool"""
+        key = (host, timeout)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = ollama.Client(host=host, timeout=timeout, transport=self._transports[host])
+                    self._clients[key] = client
+        return client
+
+    @staticmethod
+    def _is_retryable(error):
+        """Connection problems, timeouts, overload and server errors are worth retrying"""
+        if isinstance(error, ollama.ResponseError):
+            return error.status_code in (408, 429) or error.status_code >= 500
+        return isinstance(error, (ConnectionError, TimeoutError, httpx.TransportError))
+
+    @staticmethod
+    def _outcome(error):
+        """Short outcome label for a failed call"""
+        if isinstance(error, (TimeoutError, httpx.TimeoutException)):
+            return 'timeout'
+        if isinstance(error, ollama.ResponseError):
+            return f"http_{error.status_code}"
+        return 'error'
+
+    @staticmethod
+    def _to_dict(response):
+        """Convert an ollama response (dict or pydantic model) to a plain dict"""
+        if hasattr(response, 'model_dump'):
+            return response.model_dump()
+        return dict(response)
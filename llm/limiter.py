@@ -0,0 +1,142 @@
+# llm/limiter.py
+import threading
+import time
+
+class ModelUnavailableError(Exception):
+    """Raised when the model backend could not serve a call after retries"""
+    pass
+
+class CircuitOpenError(ModelUnavailableError):
+    """Raised instead of calling the model while the circuit breaker is open"""
+    pass
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for model calls.
+
+    The limit grows by roughly one slot per limit's worth of successful calls
+    while the limiter is saturated, and is cut multiplicatively when a call
+    fails with overload/timeout or takes much longer than the smoothed
+    latency baseline of calls of the same kind. Baselines are kept per
+    release key (the client uses agent, task and method), so a 700-token
+    completion is compared with other long completions, not with embeddings.
+    Callers block in acquire() while the limit is reached.
+    """
+    def __init__(self, initial_limit=4, min_limit=1, max_limit=32, backoff_ratio=0.7,
+                 latency_tolerance=2.0, smoothing=0.05):
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.backoff_ratio = backoff_ratio
+        self.latency_tolerance = latency_tolerance  # Slowdown vs baseline treated as congestion
+        self.smoothing = smoothing
+        self.limit = float(max(min_limit, min(max_limit, initial_limit)))
+        self.in_flight = 0
+        self.baselines = {}  # Smoothed latency of healthy calls per key, in seconds
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot; returns False if timeout expires first"""
+        deadline = None if timeout is None else time.time() + timeout
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = None if deadline is None else deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    def release(self, latency, dropped=False, key=None):
+        """Free a slot and adjust the limit from the call's latency and outcome"""
+        with self._condition:
+            saturated = self.in_flight >= int(self.limit)
+            self.in_flight -= 1
+
+            baseline = self.baselines.get(key)
+            congested = dropped or (
+                baseline is not None and latency > baseline * self.latency_tolerance
+            )
+            if congested:
+                self.limit = max(self.min_limit, self.limit * self.backoff_ratio)
+            elif saturated:
+                self.limit = min(self.max_limit, self.limit + 1.0 / self.limit)
+
+            if not dropped:
+                if baseline is None:
+                    self.baselines[key] = latency
+                else:
+                    self.baselines[key] = baseline + self.smoothing * (latency - baseline)
+
+            self._condition.notify_all()
+
+    def state(self):
+        with self._condition:
+            return {
+                'limit': int(self.limit),
+                'in_flight': self.in_flight,
+                'latency_baselines': {
+                    '.'.join(str(part) for part in key) if isinstance(key, tuple) else str(key): baseline
+                    for key, baseline in self.baselines.items()
+                }
+            }
+
+class CircuitBreaker:
+    """
+    Trips after failure_threshold consecutive failed calls and rejects calls
+    for reset_timeout seconds, then lets a single probe call through
+    (half-open). A successful probe closes the circuit; a failed one
+    re-opens it.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state()
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may proceed"""
+        with self._lock:
+            state = self._state()
+            if state == self.CLOSED:
+                return
+            if state == self.HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return
+        raise CircuitOpenError(
+            f"Model backend unavailable after {self.failures} consecutive failures; retrying in up to {self.reset_timeout:.0f}s"
+        )
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                print("Model backend recovered, closing circuit")
+            self.failures = 0
+            self.opened_at = None
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            probe_failed = self._probe_in_flight
+            self._probe_in_flight = False
+            if probe_failed or (self.opened_at is None and self.failures >= self.failure_threshold):
+                print(f"Opening model circuit after {self.failures} consecutive failures")
+                self.opened_at = time.time()
+
+    def _state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.time() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
@@ -0,0 +1,121 @@
+# llm/metrics.py
+import bisect
+import threading
+
+# Latency histogram bucket upper bounds, in seconds
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+class LLMMetrics:
+    """
+    In-process counters and latency histograms for model calls.
+
+    LLMClient records every call with the calling agent, model, operation,
+    token counts, wall time, whether it was served from the cache and its
+    outcome. snapshot() returns the aggregates as a dict and
+    render_prometheus() as Prometheus text exposition format.
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def record(self, agent, model, operation, duration, outcome='ok', cache_hit=False,
+               prompt_tokens=None, completion_tokens=None):
+        """Record one model call"""
+        key = (agent or 'unknown', model, operation)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = {
+                    'calls': 0,
+                    'outcomes': {},
+                    'cache_hits': 0,
+                    'prompt_tokens': 0,
+                    'completion_tokens': 0,
+                    'latency_sum': 0.0,
+                    'latency_buckets': [0] * (len(self.buckets) + 1)
+                }
+                self._series[key] = series
+
+            series['calls'] += 1
+            series['outcomes'][outcome] = series['outcomes'].get(outcome, 0) + 1
+            if cache_hit:
+                series['cache_hits'] += 1
+            else:
+                # Cache hits cost no inference, so only live calls count towards tokens and latency
+                series['prompt_tokens'] += prompt_tokens or 0
+                series['completion_tokens'] += completion_tokens or 0
+                series['latency_sum'] += duration
+                series['latency_buckets'][bisect.bisect_left(self.buckets, duration)] += 1
+
+    def snapshot(self):
+        """Aggregated metrics per (agent, model, operation)"""
+        with self._lock:
+            series = []
+            for (agent, model, operation), values in sorted(self._series.items()):
+                live_calls = sum(values['latency_buckets'])
+                series.append({
+                    'agent': agent,
+                    'model': model,
+                    'operation': operation,
+                    'calls': values['calls'],
+                    'outcomes': dict(values['outcomes']),
+                    'cache_hits': values['cache_hits'],
+                    'prompt_tokens': values['prompt_tokens'],
+                    'completion_tokens': values['completion_tokens'],
+                    'latency_sum': values['latency_sum'],
+                    'latency_avg': values['latency_sum'] / live_calls if live_calls else 0.0,
+                    'latency_buckets': dict(zip(
+                        [str(bound) for bound in self.buckets] + ['+Inf'], values['latency_buckets']
+                    ))
+                })
+            return {'series': series}
+
+    def render_prometheus(self):
+        """Render the metrics in Prometheus text exposition format"""
+        lines = [
+            '# HELP llm_calls_total Model calls by agent, model, operation and outcome.',
+            '# TYPE llm_calls_total counter'
+        ]
+        snapshot = self.snapshot()['series']
+
+        for s in snapshot:
+            for outcome, count in sorted(s['outcomes'].items()):
+                lines.append(f'llm_calls_total{{{self._labels(s, outcome=outcome)}}} {count}')
+
+        for name, field, help_text in (
+            ('llm_cache_hits_total', 'cache_hits', 'Model calls served from the response cache.'),
+            ('llm_prompt_tokens_total', 'prompt_tokens', 'Prompt tokens evaluated by the model.'),
+            ('llm_completion_tokens_total', 'completion_tokens', 'Completion tokens generated by the model.')
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for s in snapshot:
+                lines.append(f'{name}{{{self._labels(s)}}} {s[field]}')
+
+        lines.append('# HELP llm_call_duration_seconds Wall time of model calls not served from the cache.')
+        lines.append('# TYPE llm_call_duration_seconds histogram')
+        for s in snapshot:
+            cumulative = 0
+            for bound, count in s['latency_buckets'].items():
+                cumulative += count
+                lines.append(f'llm_call_duration_seconds_bucket{{{self._labels(s, le=bound)}}} {cumulative}')
+            lines.append(f'llm_call_duration_seconds_sum{{{self._labels(s)}}} {s["latency_sum"]:.6f}')
+            lines.append(f'llm_call_duration_seconds_count{{{self._labels(s)}}} {cumulative}')
+
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """Drop all recorded metrics"""
+        with self._lock:
+            self._series.clear()
+
+    @staticmethod
+    def _labels(series, **extra):
+        labels = {'agent': series['agent'], 'model': series['model'], 'operation': series['operation']}
+        labels.update(extra)
+        # Label values escape backslashes and double quotes
+        return ','.join(
+            '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+            for key, value in labels.items()
+        )
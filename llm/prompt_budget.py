@@ -0,0 +1,90 @@
+# llm/prompt_budget.py
+import json
+import re
+
+# Rough characters-per-token ratio for English text with llama-style tokenizers
+CHARS_PER_TOKEN = 4
+
+# Per-section token budgets for the matcher prompt
+DEFAULT_SECTION_BUDGETS = {
+    'job_responsibilities': 200,
+    'candidate_skills': 150,
+    'candidate_experience': 400,
+    'candidate_education': 120,
+    'candidate_certifications': 80,
+    'candidate_languages': 30,
+    'candidate_summary': 120
+}
+
+def estimate_tokens(text):
+    """Approximate token count of a string without loading a tokenizer"""
+    if not text:
+        return 0
+    return (len(str(text)) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+class PromptBudget:
+    """
+    Deterministic per-section compaction of prompt inputs.
+
+    Lists keep their leading entries (CV sections are usually most recent
+    first), each entry is clipped to max_item_tokens at a word boundary, and
+    whatever no longer fits the section budget is summarised as a count of
+    omitted entries. The same input always produces the same output, so
+    compacted prompts stay cache-friendly.
+    """
+    def __init__(self, section_budgets=None, max_item_tokens=80):
+        self.section_budgets = dict(DEFAULT_SECTION_BUDGETS)
+        if section_budgets:
+            self.section_budgets.update(section_budgets)
+        self.max_item_tokens = max_item_tokens
+
+    def compact(self, section, value):
+        """Fit a section value (list or text) into its budget; unbudgeted sections pass through"""
+        budget = self.section_budgets.get(section)
+        if budget is None:
+            return value
+        if isinstance(value, (list, tuple)):
+            return self.fit_list(value, budget)
+        return self.fit_text(self._to_text(value), budget)
+
+    def fit_list(self, items, budget):
+        """Keep leading entries that fit the budget and summarise the rest"""
+        kept = []
+        used = 0
+        item_budget = min(self.max_item_tokens, budget)
+
+        for index, item in enumerate(items):
+            text = self.fit_text(self._to_text(item), item_budget)
+            if not text:
+                continue
+            cost = estimate_tokens(text)
+            if kept and used + cost > budget:
+                omitted = len(items) - index
+                kept.append(f"(+{omitted} more {'entry' if omitted == 1 else 'entries'} omitted)")
+                break
+            kept.append(text)
+            used += cost
+
+        return kept
+
+    def fit_text(self, text, budget):
+        """Clip text to roughly budget tokens at a word boundary"""
+        text = re.sub(r'\s+', ' ', text).strip()
+        max_chars = budget * CHARS_PER_TOKEN
+        if len(text) <= max_chars:
+            return text
+        clipped = text[:max_chars - 3].rsplit(' ', 1)[0]
+        return clipped.rstrip(' ,;:.') + '...'
+
+    @staticmethod
+    def _to_text(value):
+        """Render CV entries, which may be strings or parsed JSON objects, as one line"""
+        if value is None:
+            return ''
+        if isinstance(value, dict):
+            return '; '.join(f"{key}: {val}" for key, val in value.items() if val)
+        if isinstance(value, (list, tuple)):
+            return ', '.join(str(item) for item in value)
+        if isinstance(value, str):
+            return value
+        return json.dumps(value, default=str)
@@ -0,0 +1,68 @@
+# llm/routing.py
+import json
+import os
+
+# Built-in generation settings per agent task. Models are left to each
+# agent's default unless a route names one; config files can override any of this.
+DEFAULT_ROUTES = {
+    'skill_matcher.analysis': {'options': {'temperature': 0.2, 'num_predict': 700}},
+    'skill_matcher.batch': {'options': {'temperature': 0.2}},
+    'skill_matcher.repair': {'options': {'temperature': 0, 'num_predict': 700}},
+    'rank_score.score': {'options': {'temperature': 0, 'num_predict': 16}, 'timeout': 30.0},
+    'cv_parser.parse': {'options': {'temperature': 0}},
+    'communicator.email': {'options': {'temperature': 0.7, 'num_predict': 500}},
+    'feedback_learner.feedback': {'options': {'temperature': 0.2, 'num_predict': 400}}
+}
+
+class ModelRouter:
+    """
+    Routing table from (agent, task) to model, generation options and timeout.
+
+    Routes are looked up as "agent.task", then "agent", then "*", and merged
+    in that order of precedence, so a config can set fleet-wide defaults and
+    override single tasks. Example config:
+
+        {
+            "routes": {
+                "*": {"timeout": 120},
+                "rank_score.score": {"model": "phi3:mini", "options": {"num_predict": 16}, "timeout": 20}
+            }
+        }
+    """
+    def __init__(self, routes=None):
+        self.routes = {key: dict(value) for key, value in DEFAULT_ROUTES.items()}
+        for key, route in (routes or {}).items():
+            self.routes[key] = self._merge(self.routes.get(key, {}), route)
+
+    @classmethod
+    def load(cls, path):
+        """Build a router from a JSON config file; a missing file gives the defaults"""
+        if not path or not os.path.exists(path):
+            return cls()
+
+        with open(path, 'r', encoding='utf-8') as f:
+            config = json.load(f)
+        print(f"Loaded model routes from {path}")
+        return cls(config.get('routes', {}))
+
+    def resolve(self, agent, task=None):
+        """Merged route for an agent task: dict with optional model, options and timeout"""
+        route = {}
+        for key in ('*', agent, f"{agent}.{task}" if task else None):
+            if key and key in self.routes:
+                route = self._merge(route, self.routes[key])
+        return route
+
+    def table(self):
+        """Configured routes, for inspection"""
+        return {key: dict(value) for key, value in sorted(self.routes.items())}
+
+    @staticmethod
+    def _merge(base, override):
+        merged = dict(base)
+        for key, value in override.items():
+            if key == 'options':
+                merged['options'] = dict(base.get('options') or {}, **(value or {}))
+            else:
+                merged[key] = value
+        return merged
@@ -0,0 +1,424 @@
+# memory/ann_index.py
+import os
+import threading
+import numpy as np
+from memory.quantization import quantize_int8, dequantize_int8, int8_scores
+
+class IVFIndex:
+    """
+    Approximate nearest-neighbour index over unit vectors (inner product = cosine).
+
+    An inverted file: spherical k-means splits the space into nlist cells,
+    each vector is stored in the list of its nearest centroid, and a query
+    scans only the nprobe cells closest to it. Raising nprobe trades speed
+    for recall (nprobe = nlist is an exact search).
+
+    Vectors added before the index is trained are kept in a buffer that is
+    searched exactly; once it holds train_threshold vectors the centroids
+    are trained on it automatically. Later adds are assigned to the
+    existing cells, so the index grows incrementally without a rebuild.
+
+    With quantize='int8' the lists hold int8 codes plus one float scale per
+    vector (about a quarter of the memory) and are scored in that form. If
+    rerank > 0 and a rerank_source callable (ids -> float32 vectors) is set,
+    the best rerank results are re-scored against full-precision vectors;
+    ids the source returns an all-zero row for keep their quantized score.
+
+    Ids are unique: adding an id that is already indexed replaces it, and
+    remove() drops ids. Both only tombstone the old entry, which searches
+    skip; compact() reclaims tombstoned entries one list at a time, so it
+    can run in the background while searches continue.
+    """
+    def __init__(self, dim, nlist=256, nprobe=8, train_threshold=None, iterations=10, seed=0, quantize=None,
+                 rerank=0):
+        if quantize not in (None, 'int8'):
+            raise ValueError(f"Unsupported quantization: {quantize}")
+        self.dim = dim
+        self.nlist = nlist
+        self.nprobe = nprobe
+        # Enough points per centroid for k-means to be meaningful
+        self.train_threshold = train_threshold or nlist * 39
+        self.iterations = iterations
+        self.seed = seed
+        self.quantize = quantize
+        self.rerank = rerank
+        self.rerank_source = None  # ids -> (len(ids) x dim) float32 vectors, for re-ranking quantized results
+        self.centroids = None
+        # cell -> {'ids': int64, 'seqs': int64 entry numbers, 'vectors': float32 (or int8 codes),
+        #          'scales': float32 per code row, 'size': int}
+        self._lists = []
+        self._pending = self._new_list()
+        self._live = {}        # id -> seq of its current entry
+        self._dead = set()     # seqs of replaced or removed entries still stored in a list
+        self._dead_array = None
+        self._next_seq = 0
+        self.extra = {}        # arrays stored alongside by save(extra=...)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._live)
+
+    @property
+    def is_trained(self):
+        return self.centroids is not None
+
+    def memory_bytes(self):
+        """Bytes held by ids, vectors and scales in use, plus the centroids"""
+        with self._lock:
+            parts = self._lists + [self._pending]
+            # id + seq + vector (+ scale when quantized) per stored entry, tombstoned ones included
+            per_vector = 16 + (self.dim + 4 if self.quantize else self.dim * 4)
+            used = per_vector * sum(part['size'] for part in parts)
+            return used + (self.centroids.nbytes if self.is_trained else 0)
+
+    def max_id(self):
+        """Largest id in the index (-1 if empty)"""
+        with self._lock:
+            return max(self._live, default=-1)
+
+    def ids(self):
+        """Live ids, in no particular order"""
+        with self._lock:
+            return np.fromiter(self._live, dtype=np.int64, count=len(self._live))
+
+    def tombstones(self):
+        """Number of replaced or removed entries awaiting compact()"""
+        with self._lock:
+            return len(self._dead)
+
+    def add(self, ids, vectors):
+        """Add vectors (n x dim, L2-normalised) under integer ids, replacing any already indexed"""
+        ids = np.asarray(ids, dtype=np.int64).ravel()
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if ids.size != vectors.shape[0]:
+            raise ValueError(f"Got {ids.size} ids for {vectors.shape[0]} vectors")
+
+        with self._lock:
+            seqs = np.arange(self._next_seq, self._next_seq + ids.size, dtype=np.int64)
+            self._next_seq += ids.size
+            for id_, seq in zip(ids.tolist(), seqs.tolist()):
+                self._retire(self._live.get(id_))
+                self._live[id_] = seq
+
+            if not self.is_trained:
+                self._append(self._pending, ids, vectors, seqs=seqs)
+                if self._pending['size'] >= self.train_threshold:
+                    self._train_locked()
+                return
+
+            self._file(ids, vectors, seqs)
+
+    def remove(self, ids):
+        """Tombstone the entries for ids; returns how many were indexed"""
+        removed = 0
+        with self._lock:
+            for id_ in np.asarray(ids, dtype=np.int64).ravel().tolist():
+                seq = self._live.pop(id_, None)
+                if seq is not None:
+                    self._retire(seq)
+                    removed += 1
+        return removed
+
+    def compact(self, progress=None):
+        """
+        Drop tombstoned entries from the lists and return how many were dropped.
+        The lock is taken per list, so searches and adds interleave with it;
+        progress(done, total) is called after each list.
+        """
+        removed, position = 0, 0
+        while True:
+            with self._lock:
+                parts = self._lists + [self._pending]
+                if position >= len(parts) or not self._dead:
+                    break
+                removed += self._compact_part(parts[position])
+                total = len(parts)
+            position += 1
+            if progress is not None:
+                progress(position, total)
+        if removed:
+            print(f"Compacted IVF index: dropped {removed} tombstoned entries")
+        return removed
+
+    def train(self, vectors=None):
+        """Train centroids on vectors (default: everything added so far) and re-file existing vectors"""
+        with self._lock:
+            self._train_locked(vectors)
+
+    def search(self, query, k=10, nprobe=None):
+        """Top-k (ids, scores) for one query vector, highest score first"""
+        ids, scores = self.search_batch(np.asarray(query, dtype=np.float32).reshape(1, -1), k, nprobe)
+        return ids[0], scores[0]
+
+    def search_batch(self, queries, k=10, nprobe=None, rerank=None):
+        """Top-k for each query; returns lists of id arrays and score arrays"""
+        queries = np.asarray(queries, dtype=np.float32).reshape(-1, self.dim)
+        nprobe = nprobe or self.nprobe
+        rerank = self.rerank if rerank is None else rerank
+        rerank = rerank if self.quantize and self.rerank_source is not None else 0
+        # Keep the best max(k, rerank) by quantized score, then re-rank them exactly below
+        shortlist = max(k, rerank)
+
+        with self._lock:
+            cells = []
+            if self.is_trained:
+                # Closest cells for every query in one product
+                centroid_scores = queries @ self.centroids.T
+                probe = min(nprobe, len(self._lists))
+                cells = np.argpartition(-centroid_scores, probe - 1, axis=1)[:, :probe]
+
+            results_ids, results_scores = [], []
+            for position, query in enumerate(queries):
+                parts = [self._pending] + ([self._lists[cell] for cell in cells[position]] if len(cells) else [])
+                parts = [part for part in parts if part['size']]
+                if not parts:
+                    results_ids.append(np.empty(0, dtype=np.int64))
+                    results_scores.append(np.empty(0, dtype=np.float32))
+                    continue
+
+                candidate_ids = np.concatenate([part['ids'][:part['size']] for part in parts])
+                scores = np.concatenate([self._scores(part, query) for part in parts])
+                if self._dead:
+                    seqs = np.concatenate([part['seqs'][:part['size']] for part in parts])
+                    scores[np.isin(seqs, self._dead_seqs())] = -np.inf
+                top = self._top_k(scores, shortlist)
+                top = top[scores[top] > -np.inf]
+                results_ids.append(candidate_ids[top])
+                results_scores.append(scores[top])
+
+        if rerank:
+            # Outside the lock: the source may do I/O
+            for position, query in enumerate(queries):
+                if len(results_ids[position]):
+                    vectors = np.asarray(self.rerank_source(results_ids[position]), dtype=np.float32)
+                    # Zero rows: the source has no full-precision vector for that id
+                    exact = np.where(vectors.any(axis=1), vectors @ query, results_scores[position])
+                    top = self._top_k(exact, k)
+                    results_ids[position], results_scores[position] = results_ids[position][top], exact[top]
+        return results_ids, results_scores
+
+    def save(self, path, extra=None):
+        """
+        Write the index to path (.npz), atomically replacing any previous file.
+        extra (name -> array) is stored alongside and restored as index.extra by load().
+        """
+        with self._lock:
+            parts = self._lists + [self._pending]
+            arrays = {
+                'config': np.array([self.dim, self.nlist, self.nprobe, self.train_threshold, self.iterations, self.seed,
+                                    1 if self.quantize == 'int8' else 0, self.rerank], dtype=np.int64),
+                'centroids': self.centroids if self.is_trained else np.empty((0, self.dim), dtype=np.float32),
+                'sizes': np.array([part['size'] for part in parts], dtype=np.int64),
+                'ids': np.concatenate([part['ids'][:part['size']] for part in parts]),
+                'seqs': np.concatenate([part['seqs'][:part['size']] for part in parts]),
+                'dead': self._dead_seqs(),
+                'vectors': np.concatenate([part['vectors'][:part['size']] for part in parts]),
+                'scales': np.concatenate([part['scales'][:part['size']] for part in parts])
+            }
+        for name, value in (extra or {}).items():
+            arrays[f"extra_{name}"] = np.asarray(value)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'wb') as f:
+            np.savez(f, **arrays)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Index saved by save(); the last list in the file is the untrained buffer"""
+        with np.load(path) as data:
+            # Files written before quantization support have no quantize/rerank entries
+            config = [int(value) for value in data['config']] + [0, 0]
+            dim, nlist, nprobe, train_threshold, iterations, seed, quantized, rerank = config[:8]
+            index = cls(dim, nlist=nlist, nprobe=nprobe, train_threshold=train_threshold,
+                        iterations=iterations, seed=seed, quantize='int8' if quantized else None, rerank=rerank)
+            if data['centroids'].shape[0]:
+                index.centroids = data['centroids'].astype(np.float32)
+            offsets = np.concatenate([[0], np.cumsum(data['sizes'])])
+            ids, vectors = data['ids'], data['vectors']
+            scales = data['scales'] if 'scales' in data.files else None
+            # Files written before tombstone support number entries in file order, so of any
+            # duplicate ids they hold the one filed last is kept
+            seqs = data['seqs'] if 'seqs' in data.files else np.arange(len(ids), dtype=np.int64)
+            dead = set(data['dead'].tolist()) if 'dead' in data.files else set()
+            index.extra = {name[len('extra_'):]: data[name] for name in data.files if name.startswith('extra_')}
+            parts = []
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                part = index._new_list()
+                if index.quantize:
+                    index._append(part, ids[start:end], None, codes=vectors[start:end], scales=scales[start:end],
+                                  seqs=seqs[start:end])
+                else:
+                    index._append(part, ids[start:end], vectors[start:end], seqs=seqs[start:end])
+                parts.append(part)
+        index._lists, index._pending = parts[:-1], parts[-1]
+
+        # The newest live entry per id wins; older duplicates become tombstones
+        order = np.argsort(seqs, kind='stable')
+        for id_, seq in zip(ids[order].tolist(), seqs[order].tolist()):
+            if seq in dead:
+                continue
+            index._retire(index._live.get(id_))
+            index._live[id_] = seq
+        index._dead |= dead
+        index._next_seq = int(seqs.max()) + 1 if len(seqs) else 0
+        return index
+
+    def _train_locked(self, vectors=None):
+        parts = self._lists + [self._pending]
+        all_ids = np.concatenate([part['ids'][:part['size']] for part in parts])
+        all_seqs = np.concatenate([part['seqs'][:part['size']] for part in parts])
+        all_vectors = np.concatenate([self._floats(part) for part in parts])
+        if self._dead:
+            # Re-filing rewrites every list anyway, so tombstones are dropped here
+            live = ~np.isin(all_seqs, self._dead_seqs())
+            all_ids, all_seqs, all_vectors = all_ids[live], all_seqs[live], all_vectors[live]
+        if vectors is None:
+            vectors = all_vectors
+        if len(vectors) == 0:
+            return
+
+        self.centroids = self._kmeans(np.asarray(vectors, dtype=np.float32), min(self.nlist, len(vectors)))
+        self._lists = [self._new_list() for _ in range(self.centroids.shape[0])]
+        self._pending = self._new_list()
+        self._dead = set()
+        self._dead_array = None
+        self._file(all_ids, all_vectors, all_seqs)
+        print(f"Trained IVF index: {len(self._lists)} cells over {len(all_ids)} vectors")
+
+    def _file(self, ids, vectors, seqs):
+        """Append vectors to the lists of their nearest centroids"""
+        assignments = self._assign(vectors)
+        order = np.argsort(assignments, kind='stable')
+        cells, starts = np.unique(assignments[order], return_index=True)
+        ends = np.append(starts[1:], len(order))
+        for cell, start, end in zip(cells, starts, ends):
+            members = order[start:end]
+            self._append(self._lists[cell], ids[members], vectors[members], seqs=seqs[members])
+
+    def _retire(self, seq):
+        """Tombstone an entry (no-op for None)"""
+        if seq is not None:
+            self._dead.add(seq)
+            self._dead_array = None
+
+    def _dead_seqs(self):
+        """Tombstoned seqs as a sorted array, rebuilt only after changes"""
+        if self._dead_array is None:
+            self._dead_array = np.array(sorted(self._dead), dtype=np.int64)
+        return self._dead_array
+
+    def _compact_part(self, part):
+        """Rewrite one list without its tombstoned entries; returns how many were dropped"""
+        size = part['size']
+        dead = np.isin(part['seqs'][:size], self._dead_seqs())
+        if not dead.any():
+            return 0
+        self._dead.difference_update(part['seqs'][:size][dead].tolist())
+        self._dead_array = None
+        keep = ~dead
+        # Fresh, exactly-sized arrays also give back the list's spare capacity
+        part['ids'] = part['ids'][:size][keep]
+        part['seqs'] = part['seqs'][:size][keep]
+        part['vectors'] = part['vectors'][:size][keep]
+        if self.quantize:
+            part['scales'] = part['scales'][:size][keep]
+        part['size'] = int(keep.sum())
+        return int(dead.sum())
+
+    def _kmeans(self, vectors, k):
+        """Spherical k-means (cosine), seeded from a random sample"""
+        rng = np.random.default_rng(self.seed)
+        # A sample of ~256 points per cell is plenty for the centroids
+        if len(vectors) > k * 256:
+            vectors = vectors[rng.choice(len(vectors), k * 256, replace=False)]
+        centroids = vectors[rng.choice(len(vectors), k, replace=False)].copy()
+
+        for _ in range(self.iterations):
+            assignments = self._assign(vectors, centroids)
+            counts = np.bincount(assignments, minlength=k)
+            # Per-cell sums from one sort and a segmented reduction
+            order = np.argsort(assignments, kind='stable')
+            starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+            empty = counts == 0
+            sums = np.zeros_like(centroids)
+            if (~empty).any():
+                sums[~empty] = np.add.reduceat(vectors[order], starts[~empty])
+            if empty.any():
+                # Re-seed empty cells with random points
+                sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1.0)
+        return centroids.astype(np.float32)
+
+    def _assign(self, vectors, centroids=None, chunk=65536):
+        """Nearest centroid per vector, in chunks to bound memory"""
+        centroids = self.centroids if centroids is None else centroids
+        return np.concatenate([
+            np.argmax(vectors[start:start + chunk] @ centroids.T, axis=1)
+            for start in range(0, len(vectors), chunk)
+        ]) if len(vectors) else np.empty(0, dtype=np.int64)
+
+    def _new_list(self):
+        return {
+            'ids': np.empty(0, dtype=np.int64),
+            'seqs': np.empty(0, dtype=np.int64),
+            'vectors': np.empty((0, self.dim), dtype=np.int8 if self.quantize else np.float32),
+            'scales': np.empty(0, dtype=np.float32),
+            'size': 0
+        }
+
+    def _scores(self, part, query):
+        """Inner products of a list's vectors with query, on the stored (possibly quantized) form"""
+        size = part['size']
+        if self.quantize:
+            return int8_scores(part['vectors'][:size], part['scales'][:size], query)
+        return part['vectors'][:size] @ query
+
+    def _floats(self, part):
+        """A list's vectors as float32"""
+        size = part['size']
+        if self.quantize:
+            return dequantize_int8(part['vectors'][:size], part['scales'][:size])
+        return part['vectors'][:size]
+
+    def _append(self, part, ids, vectors, codes=None, scales=None, seqs=None):
+        """Append to an inverted list (quantizing if enabled), growing its arrays geometrically"""
+        count = len(ids)
+        if count == 0:
+            return
+        if self.quantize and codes is None:
+            codes, scales = quantize_int8(vectors)
+        stored = codes if self.quantize else vectors
+        size = part['size']
+        if size + count > part['vectors'].shape[0]:
+            capacity = max(size + count, 2 * size, 16)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_seqs = np.empty(capacity, dtype=np.int64)
+            grown_vectors = np.empty((capacity, self.dim), dtype=part['vectors'].dtype)
+            grown_scales = np.empty(capacity if self.quantize else 0, dtype=np.float32)
+            if size:
+                grown_ids[:size] = part['ids'][:size]
+                grown_seqs[:size] = part['seqs'][:size]
+                grown_vectors[:size] = part['vectors'][:size]
+                if self.quantize:
+                    grown_scales[:size] = part['scales'][:size]
+            part['ids'], part['seqs'] = grown_ids, grown_seqs
+            part['vectors'], part['scales'] = grown_vectors, grown_scales
+        part['ids'][size:size + count] = ids
+        part['seqs'][size:size + count] = seqs
+        part['vectors'][size:size + count] = stored
+        if self.quantize:
+            part['scales'][size:size + count] = scales
+        part['size'] = size + count
+
+    @staticmethod
+    def _top_k(scores, k):
+        """Indices of the k highest scores, highest first"""
+        k = min(int(k), scores.shape[0])
+        if k <= 0:
+            return np.empty(0, dtype=np.int64)
+        if k < scores.shape[0]:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(scores.shape[0])
+        return top[np.argsort(-scores[top], kind='stable')]
@@ -0,0 +1,255 @@
+# memory/candidate_index.py
+import hashlib
+import os
+import threading
+import time
+import numpy as np
+from memory.ann_index import IVFIndex
+
+class CandidateIndex:
+    """
+    Semantic index of candidate profiles, keyed by the candidates table id.
+
+    Each candidate is embedded once, through the shared VectorStore, from a
+    canonical profile text (skills, role titles, summary) and added to an
+    IVFIndex; below the index's training threshold searches are exact.
+    Adds and removals never write the file themselves: the owner calls
+    save() (to path, .npz) once needs_save() reports unsaved changes older
+    than save_interval, and on shutdown. Candidates added since the last save
+    are re-indexed from the persisted embeddings on the next sync, so no
+    model calls are repeated.
+    quantize='int8' stores profiles as int8 codes; set rerank_source
+    (ids -> float32 vectors, zero rows where none is at hand) to re-rank
+    the best rerank results exactly.
+
+    The index tracks a digest of each candidate's profile text, so
+    re-adding an updated candidate re-embeds it only if the profile
+    changed, and freshness() compares the index with the candidates table.
+    Updates and removals leave tombstones; once they exceed compact_ratio
+    of the stored entries needs_compaction() asks for a compact().
+    """
+    def __init__(self, vector_store, path=None, nlist=256, nprobe=8, save_interval=30.0, quantize=None, rerank=50,
+                 compact_ratio=0.2):
+        self.vector_store = vector_store
+        self.path = path
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.save_interval = save_interval
+        self.quantize = quantize  # Applies to a new index; a loaded one keeps its own setting
+        self.rerank = rerank
+        self.compact_ratio = compact_ratio
+        self._rerank_source = None
+        self.index = None
+        self._digests = {}  # candidate id -> digest of the indexed profile text (None if unknown)
+        self._dirty = False
+        self._last_save = time.time()
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            self.index = IVFIndex.load(path)
+            model = str(self.index.extra['model']) if 'model' in self.index.extra else None
+            if model is not None and model != vector_store.model:
+                # Profiles embedded by another model are not comparable with new queries
+                print(f"Candidate index at {path} was built with {model}, not {vector_store.model}; rebuilding it")
+                self.index = None
+        if self.index is not None:
+            # Indexes saved before profile digests were kept get re-embedded by a freshness repair
+            self._digests = dict.fromkeys(self.index.ids().tolist())
+            if 'profile_ids' in self.index.extra:
+                digests = self.index.extra['profile_digests']
+                self._digests.update(
+                    (candidate_id, digests[position].tobytes())
+                    for position, candidate_id in enumerate(self.index.extra['profile_ids'].tolist())
+                    if candidate_id in self._digests
+                )
+            print(f"Loaded candidate index with {len(self.index)} profiles from {path}")
+
+    @property
+    def rerank_source(self):
+        return self._rerank_source
+
+    @rerank_source.setter
+    def rerank_source(self, source):
+        self._rerank_source = source
+        if self.index is not None:
+            self.index.rerank_source = source
+
+    def __len__(self):
+        return len(self.index) if self.index is not None else 0
+
+    def max_id(self):
+        """Largest indexed candidate id (-1 if empty)"""
+        return self.index.max_id() if self.index is not None else -1
+
+    @staticmethod
+    def profile_text(candidate):
+        """Canonical text embedded for a candidate: skills, role titles and summary"""
+        skills = [skill for skill in candidate.get('Skills', []) if isinstance(skill, str)]
+        # The first line of an experience entry carries the title ("Engineer at Acme (2019-2022)")
+        titles = [entry.strip().split('\n')[0] for entry in candidate.get('Experience', [])
+                  if isinstance(entry, str) and entry.strip()]
+        parts = []
+        if skills:
+            parts.append(f"Skills: {', '.join(skills)}")
+        if titles:
+            parts.append(f"Roles: {'; '.join(titles)}")
+        if candidate.get('Summary'):
+            parts.append(f"Summary: {candidate['Summary']}")
+        return '\n'.join(parts)
+
+    @staticmethod
+    def job_text(jd_data):
+        """Query text for a job description, laid out like a candidate profile"""
+        skills = list(jd_data.get('required_skills', [])) + list(jd_data.get('preferred_skills', []))
+        parts = []
+        if skills:
+            parts.append(f"Skills: {', '.join(skill for skill in skills if isinstance(skill, str))}")
+        if jd_data.get('title'):
+            parts.append(f"Roles: {jd_data['title']}")
+        if jd_data.get('responsibilities'):
+            parts.append(f"Summary: {'; '.join(str(item) for item in jd_data['responsibilities'])}")
+        return '\n'.join(parts)
+
+    @staticmethod
+    def profile_digest(text):
+        return hashlib.blake2b(text.encode('utf-8'), digest_size=16).digest()
+
+    def add(self, candidate_id, candidate):
+        """Embed and index one candidate; returns False if it has no usable profile or is unchanged"""
+        return self.add_many([(candidate_id, candidate)]) == 1
+
+    def add_many(self, items):
+        """
+        Index or update (candidate_id, candidate) pairs, embedding the changed
+        profiles in one batched pass. Unchanged profiles are skipped and
+        candidates whose profile became empty are removed.
+        Returns the number (re-)indexed.
+        """
+        profiles = {}
+        for candidate_id, candidate in items:
+            if candidate_id:
+                text = self.profile_text(candidate)
+                profiles[int(candidate_id)] = (text, self.profile_digest(text))
+
+        with self._lock:
+            emptied = [candidate_id for candidate_id, (text, _) in profiles.items()
+                       if not text and candidate_id in self._digests]
+            changed = [(candidate_id, text, digest) for candidate_id, (text, digest) in profiles.items()
+                       if text and self._digests.get(candidate_id, b'') != digest]
+        if emptied:
+            self.remove(emptied)
+        if not changed:
+            return 0
+
+        embeddings = self.vector_store.get_embeddings([text for _, text, _ in changed])
+        changed = [(item, embedding) for item, embedding in zip(changed, embeddings) if embedding]
+        if not changed:
+            return 0
+        vectors = np.array([embedding for _, embedding in changed], dtype=np.float32)
+
+        with self._lock:
+            if self.index is None:
+                self.index = IVFIndex(vectors.shape[1], nlist=self.nlist, nprobe=self.nprobe,
+                                      quantize=self.quantize, rerank=self.rerank)
+                self.index.rerank_source = self._rerank_source
+            # Re-adding an id tombstones its previous entry
+            self.index.add([candidate_id for (candidate_id, _, _), _ in changed], vectors)
+            self._digests.update((candidate_id, digest) for (candidate_id, _, digest), _ in changed)
+            self._dirty = True
+        return len(changed)
+
+    def remove(self, ids):
+        """Tombstone candidates (e.g. deleted ones); returns how many were indexed"""
+        with self._lock:
+            if self.index is None:
+                return 0
+            removed = self.index.remove(ids)
+            for candidate_id in ids:
+                self._digests.pop(int(candidate_id), None)
+            self._dirty = self._dirty or removed > 0
+        return removed
+
+    def clear(self):
+        """Drop every profile, including the saved index"""
+        with self._lock:
+            self.index = None
+            self._digests = {}
+            self._dirty = False
+            if self.path and os.path.exists(self.path):
+                os.remove(self.path)
+
+    def tombstones(self):
+        return self.index.tombstones() if self.index is not None else 0
+
+    def needs_compaction(self):
+        """True once tombstones make up compact_ratio of the stored entries"""
+        tombstones = self.tombstones()
+        return tombstones > 0 and tombstones >= self.compact_ratio * (len(self) + tombstones)
+
+    def compact(self, progress=None):
+        """Reclaim tombstoned entries (searches keep running) and save; returns how many were dropped"""
+        index = self.index
+        if index is None:
+            return 0
+        removed = index.compact(progress)
+        if removed:
+            with self._lock:
+                self._dirty = True
+            self.save()
+        return removed
+
+    def freshness(self, candidates):
+        """
+        Compare the index with candidates (dicts with an id, as stored in the
+        candidates table). Returns the ids that are missing from the index,
+        indexed from an outdated profile (stale), or indexed but no longer in
+        the table (orphaned), plus counts.
+        """
+        with self._lock:
+            digests = dict(self._digests)
+        missing, stale, seen = [], [], set()
+        for candidate in candidates:
+            candidate_id = int(candidate['id'])
+            seen.add(candidate_id)
+            text = self.profile_text(candidate)
+            if candidate_id not in digests:
+                if text:
+                    missing.append(candidate_id)
+            elif not text or digests[candidate_id] != self.profile_digest(text):
+                stale.append(candidate_id)
+        orphaned = [candidate_id for candidate_id in digests if candidate_id not in seen]
+        return {
+            'candidates': len(seen),
+            'indexed': len(digests),
+            'tombstones': self.tombstones(),
+            'fresh': not (missing or stale or orphaned),
+            'missing': missing,
+            'stale': stale,
+            'orphaned': orphaned
+        }
+
+    def search(self, vector, k=10, nprobe=None):
+        """Top-k [(candidate_id, similarity)] for a unit query vector"""
+        if self.index is None or not len(self.index):
+            return []
+        ids, scores = self.index.search(np.asarray(vector, dtype=np.float32), k, nprobe)
+        return [(int(candidate_id), float(score)) for candidate_id, score in zip(ids, scores)]
+
+    def needs_save(self, force=False):
+        """True if there are unsaved changes and save_interval has passed (or force)"""
+        return bool(self.path) and self._dirty and (force or time.time() - self._last_save >= self.save_interval)
+
+    def save(self):
+        if not self.path or self.index is None:
+            return
+        # Held while writing so the digests match the saved entries
+        with self._lock:
+            self._dirty = False
+            self._last_save = time.time()
+            ids = [candidate_id for candidate_id, digest in self._digests.items() if digest is not None]
+            digests = np.frombuffer(b''.join(self._digests[candidate_id] for candidate_id in ids), dtype=np.uint8)
+            self.index.save(self.path, extra={
+                'model': np.array(self.vector_store.model),
+                'profile_ids': np.array(ids, dtype=np.int64),
+                'profile_digests': digests.reshape(len(ids), 16)
+            })
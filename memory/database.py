@@ -2,19 +2,22 @@
 import sqlite3
 import json
 import threading
+import time
 
 class Database:
-    _local = threading.local()
-    
     def __init__(self, db_path):
         self.db_path = db_path
+        # One connection per thread and per database file
+        self._local = threading.local()
+        # SQLite allows a single writer; serialize writes coming from worker threads
+        self._write_lock = threading.Lock()
         self._create_tables()
     
     @property
     def connection(self):
         """Thread-safe connection property"""
         if not hasattr(self._local, 'connection'):
-            self._local.connection = sqlite3.connect(self.db_path)
+            self._local.connection = sqlite3.connect(self.db_path, timeout=30)
             # Enable dictionary access to rows
             self._local.connection.row_factory = sqlite3.Row
         return self._local.connection
@@ -63,7 +66,8 @@ class Database:
                 jd_id INTEGER,
                 candidate_id INTEGER,
                 score REAL,
-                analysis TEXT,
+                justification TEXT,
+                details TEXT,
                 status TEXT DEFAULT 'pending',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (jd_id) REFERENCES job_descriptions (id),
@@ -82,6 +86,20 @@ class Database:
             )
         ''')
         
+        # Top-N most similar skills per skill, filled by the background 'skill_neighbors' job
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS skill_neighbors (
+                skill_id INTEGER,
+                neighbor_id INTEGER,
+                similarity REAL,
+                rank INTEGER,
+                PRIMARY KEY (skill_id, neighbor_id),
+                FOREIGN KEY (skill_id) REFERENCES skills (id),
+                FOREIGN KEY (neighbor_id) REFERENCES skills (id)
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_skill_neighbors_neighbor ON skill_neighbors (neighbor_id)')
+        
         # Create feedback table
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS feedback (
@@ -94,7 +112,32 @@ class Database:
             )
         ''')
         
+        # Create jobs table for background work (matching runs)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                job_type TEXT,
+                params TEXT,
+                state TEXT DEFAULT 'queued',
+                progress_done INTEGER DEFAULT 0,
+                progress_total INTEGER DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                cancel_requested INTEGER DEFAULT 0,
+                owner TEXT,
+                lease_expires REAL,
+                queued_at REAL,
+                started_at REAL,
+                finished_at REAL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state, id)')
+        
         self.connection.commit()
+        self._update_matches_table()
+        self._update_skills_table()
+        self._update_jobs_table()
     
     def create_tables(self):
         """Public method to create tables if they don't exist"""
@@ -331,6 +374,18 @@ class Database:
         self.connection.commit()
         return candidate_id
     
+    def delete_candidate(self, candidate_id):
+        """Delete a candidate with its matches and their feedback; returns False if it did not exist"""
+        cursor = self.connection.cursor()
+        cursor.execute('''
+        DELETE FROM feedback WHERE match_id IN (SELECT id FROM matches WHERE candidate_id = ?)
+        ''', (candidate_id,))
+        cursor.execute("DELETE FROM matches WHERE candidate_id = ?", (candidate_id,))
+        cursor.execute("DELETE FROM candidates WHERE id = ?", (candidate_id,))
+        deleted = cursor.rowcount > 0
+        self.connection.commit()
+        return deleted
+    
     def _update_candidates_table(self):
         """Add missing columns to candidates table if they don't exist"""
         cursor = self.connection.cursor()
@@ -354,18 +409,76 @@ class Database:
             
         self.connection.commit()
     
-    def insert_match(self, jd_id, candidate_id, score, justification):
-        """Insert a match into the database"""
+    def _update_matches_table(self):
+        """Add missing columns to matches table if they don't exist"""
         cursor = self.connection.cursor()
         
-        cursor.execute('''
-        INSERT INTO matches (
-            jd_id, candidate_id, score, justification
-        ) VALUES (?, ?, ?, ?)
-        ''', (jd_id, candidate_id, score, justification))
+        cursor.execute("PRAGMA table_info(matches)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # Older schemas named the analysis column 'analysis'
+        if 'justification' not in columns:
+            cursor.execute("ALTER TABLE matches ADD COLUMN justification TEXT")
         
+        if 'details' not in columns:
+            cursor.execute("ALTER TABLE matches ADD COLUMN details TEXT")
+            
+        self.connection.commit()
+    
+    def _update_skills_table(self):
+        """Add missing columns to skills table if they don't exist"""
+        cursor = self.connection.cursor()
+        
+        cursor.execute("PRAGMA table_info(skills)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # NULL until the skill's neighbours have been computed
+        if 'neighbors_at' not in columns:
+            cursor.execute("ALTER TABLE skills ADD COLUMN neighbors_at REAL")
+            
         self.connection.commit()
-        return cursor.lastrowid
+    
+    def _update_jobs_table(self):
+        """Add missing columns to jobs table if they don't exist"""
+        cursor = self.connection.cursor()
+        
+        cursor.execute("PRAGMA table_info(jobs)")
+        columns = [column[1] for column in cursor.fetchall()]
+        
+        # The worker process running a job, and when its lease lapses without a heartbeat
+        if 'owner' not in columns:
+            cursor.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+        
+        if 'lease_expires' not in columns:
+            cursor.execute("ALTER TABLE jobs ADD COLUMN lease_expires REAL")
+            
+        self.connection.commit()
+    
+    def insert_match(self, jd_id, candidate_id, score, justification, details=None):
+        """Insert a match into the database (safe to call from worker threads)
+        
+        justification may be None when the long-form analysis is generated lazily;
+        details holds the structured skill/experience/education breakdown.
+        """
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            
+            cursor.execute('''
+            INSERT INTO matches (
+                jd_id, candidate_id, score, justification, details
+            ) VALUES (?, ?, ?, ?, ?)
+            ''', (jd_id, candidate_id, score, justification, json.dumps(details) if details is not None else None))
+            
+            self.connection.commit()
+            return cursor.lastrowid
+    
+    def update_match_analysis(self, match_id, justification):
+        """Store the generated long-form analysis for a match"""
+        with self._write_lock:
+            self.connection.execute('''
+            UPDATE matches SET justification = ? WHERE id = ?
+            ''', (justification, match_id))
+            self.connection.commit()
     
     def insert_skill_if_not_exists(self, skill_name, category=None, aliases=None):
         """Insert a skill into the taxonomy if it doesn't exist"""
@@ -389,6 +502,95 @@ class Database:
         
         return result['id']
     
+    def get_skill_names(self):
+        """Names of every skill in the taxonomy"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT name FROM skills ORDER BY id')
+        return [row['name'] for row in cursor.fetchall()]
+    
+    def get_skills(self):
+        """Every skill as {id, name, pending}, where pending means its neighbours are not computed yet"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT id, name, neighbors_at FROM skills ORDER BY id')
+        return [{'id': row['id'], 'name': row['name'], 'pending': row['neighbors_at'] is None}
+                for row in cursor.fetchall()]
+    
+    def has_pending_skill_neighbors(self):
+        """Whether any skill is waiting for its neighbours to be computed"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT 1 FROM skills WHERE neighbors_at IS NULL LIMIT 1')
+        return cursor.fetchone() is not None
+    
+    def get_skill_neighbor_floors(self, top_n):
+        """skill id -> lowest stored neighbour similarity, for skills that already have top_n neighbours"""
+        cursor = self.connection.cursor()
+        cursor.execute('''
+        SELECT skill_id, MIN(similarity) AS floor FROM skill_neighbors
+        GROUP BY skill_id HAVING COUNT(*) >= ?
+        ''', (top_n,))
+        return {row['skill_id']: row['floor'] for row in cursor.fetchall()}
+    
+    def get_skill_neighbor_ids(self, skill_ids):
+        """skill id -> [(neighbour id, similarity)] for the given skills"""
+        skill_ids = [int(skill_id) for skill_id in skill_ids]
+        neighbors = {skill_id: [] for skill_id in skill_ids}
+        if not skill_ids:
+            return neighbors
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT skill_id, neighbor_id, similarity FROM skill_neighbors "
+            f"WHERE skill_id IN ({','.join('?' * len(skill_ids))}) ORDER BY skill_id, rank",
+            skill_ids
+        )
+        for row in cursor.fetchall():
+            neighbors[row['skill_id']].append((row['neighbor_id'], row['similarity']))
+        return neighbors
+    
+    def replace_skill_neighbors(self, neighbors, computed_ids=()):
+        """
+        Store skill id -> [(neighbour id, similarity)], most similar first,
+        replacing earlier lists, and mark computed_ids as computed.
+        """
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            for skill_id, skill_neighbors in neighbors.items():
+                cursor.execute('DELETE FROM skill_neighbors WHERE skill_id = ?', (skill_id,))
+                cursor.executemany('''
+                INSERT INTO skill_neighbors (skill_id, neighbor_id, similarity, rank)
+                VALUES (?, ?, ?, ?)
+                ''', [(skill_id, neighbor_id, similarity, rank)
+                      for rank, (neighbor_id, similarity) in enumerate(skill_neighbors)])
+            now = time.time()
+            cursor.executemany('UPDATE skills SET neighbors_at = ? WHERE id = ?',
+                               [(now, skill_id) for skill_id in computed_ids])
+            self.connection.commit()
+    
+    def get_skill_neighbors(self, skill_name):
+        """
+        (neighbour name -> similarity in either direction of the stored lists,
+        lowest similarity in the skill's own list or None if it is empty),
+        or None if the skill is unknown or not computed yet.
+        """
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT id, neighbors_at FROM skills WHERE name = ?', (skill_name,))
+        row = cursor.fetchone()
+        if row is None or row['neighbors_at'] is None:
+            return None
+        
+        cursor.execute('''
+        SELECT s.name, n.similarity, 1 AS own FROM skill_neighbors n JOIN skills s ON s.id = n.neighbor_id
+        WHERE n.skill_id = ?
+        UNION ALL
+        SELECT s.name, n.similarity, 0 AS own FROM skill_neighbors n JOIN skills s ON s.id = n.skill_id
+        WHERE n.neighbor_id = ?
+        ''', (row['id'], row['id']))
+        neighbors, weakest = {}, None
+        for neighbor in cursor.fetchall():
+            neighbors[neighbor['name']] = max(neighbors.get(neighbor['name'], 0.0), neighbor['similarity'])
+            if neighbor['own']:
+                weakest = neighbor['similarity'] if weakest is None else min(weakest, neighbor['similarity'])
+        return neighbors, weakest
+    
     def get_job_description(self, jd_id):
         """Get a job description by ID"""
         cursor = self.connection.cursor()
@@ -498,10 +700,13 @@ class Database:
                 
         return candidate
 
-    def get_all_candidates(self):
-        """Get all candidates"""
+    def get_all_candidates(self, min_id=None):
+        """Get all candidates (only those with id > min_id if given)"""
         cursor = self.connection.cursor()
-        cursor.execute("SELECT * FROM candidates")
+        if min_id is not None:
+            cursor.execute("SELECT * FROM candidates WHERE id > ? ORDER BY id", (min_id,))
+        else:
+            cursor.execute("SELECT * FROM candidates")
         rows = cursor.fetchall()
         
         candidates = []
@@ -551,6 +756,50 @@ class Database:
             
         return candidates
     
+    def get_candidate_summaries(self, ids):
+        """id -> {candidate_id, name, email, skills} for the given candidate ids"""
+        ids = [int(candidate_id) for candidate_id in ids]
+        if not ids:
+            return {}
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT id, candidate_id, name, email, skills FROM candidates WHERE id IN ({','.join('?' * len(ids))})",
+            ids
+        )
+        summaries = {}
+        for row in cursor.fetchall():
+            try:
+                skills = json.loads(row['skills'] or '[]')
+            except json.JSONDecodeError:
+                skills = []
+            summaries[row['id']] = {
+                'candidate_id': row['candidate_id'],
+                'name': row['name'],
+                'email': row['email'],
+                'skills': skills
+            }
+        return summaries
+    
+    def get_candidate_profiles(self, ids):
+        """id -> {Skills, Experience, Summary} for the given candidate ids"""
+        ids = [int(candidate_id) for candidate_id in ids]
+        if not ids:
+            return {}
+        cursor = self.connection.cursor()
+        cursor.execute(
+            f"SELECT id, skills, experience, summary FROM candidates WHERE id IN ({','.join('?' * len(ids))})",
+            ids
+        )
+        profiles = {}
+        for row in cursor.fetchall():
+            try:
+                skills = json.loads(row['skills'] or '[]')
+                experience = json.loads(row['experience'] or '[]')
+            except json.JSONDecodeError:
+                skills, experience = [], []
+            profiles[row['id']] = {'Skills': skills, 'Experience': experience, 'Summary': row['summary'] or ''}
+        return profiles
+    
     def get_match(self, match_id):
         """Get a match by ID"""
         cursor = self.connection.cursor()
@@ -559,7 +808,9 @@ class Database:
         row = cursor.fetchone()
         
         if row:
-            return dict(row)
+            match = dict(row)
+            match['details'] = json.loads(match['details']) if match.get('details') else None
+            return match
         
         return None
     
@@ -585,6 +836,142 @@ class Database:
         self.connection.commit()
         return cursor.lastrowid
     
+    def insert_job(self, job_type, params):
+        """Queue a background job and return its ID"""
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+            INSERT INTO jobs (job_type, params, state, queued_at)
+            VALUES (?, ?, 'queued', ?)
+            ''', (job_type, json.dumps(params or {}), time.time()))
+            
+            self.connection.commit()
+            return cursor.lastrowid
+    
+    def claim_next_job(self, owner=None, lease_seconds=60.0):
+        """
+        Atomically move the oldest queued job to running and return it, or None.
+        The owner holds it for lease_seconds unless renew_job_leases extends the lease.
+        """
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            cursor.execute("SELECT id FROM jobs WHERE state = 'queued' ORDER BY id LIMIT 1")
+            row = cursor.fetchone()
+            if not row:
+                return None
+            
+            now = time.time()
+            cursor.execute('''
+            UPDATE jobs SET state = 'running', started_at = ?, owner = ?, lease_expires = ?
+            WHERE id = ? AND state = 'queued'
+            ''', (now, owner, now + lease_seconds, row['id']))
+            self.connection.commit()
+            
+            if cursor.rowcount == 0:
+                return None
+        
+        return self.get_job(row['id'])
+    
+    def update_job_progress(self, job_id, done, total):
+        """Record progress for a running job"""
+        with self._write_lock:
+            self.connection.execute('''
+            UPDATE jobs SET progress_done = ?, progress_total = ? WHERE id = ?
+            ''', (done, total, job_id))
+            self.connection.commit()
+    
+    def finish_job(self, job_id, state, result=None, error=None, owner=None):
+        """
+        Mark a job completed, failed or cancelled and store its result.
+        With owner, only if that owner still holds the job; returns whether it was updated.
+        """
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            cursor.execute(f'''
+            UPDATE jobs SET state = ?, result = ?, error = ?, finished_at = ?, lease_expires = NULL
+            WHERE id = ?{' AND owner = ?' if owner is not None else ''}
+            ''', (state, json.dumps(result, default=str) if result is not None else None, error, time.time(), job_id)
+                  + ((owner,) if owner is not None else ()))
+            self.connection.commit()
+            return cursor.rowcount > 0
+    
+    def renew_job_leases(self, owner, lease_seconds=60.0):
+        """Extend the leases of every job an owner is running"""
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+            UPDATE jobs SET lease_expires = ? WHERE owner = ? AND state = 'running'
+            ''', (time.time() + lease_seconds, owner))
+            self.connection.commit()
+            return cursor.rowcount
+    
+    def request_job_cancel(self, job_id):
+        """Ask a job to stop; queued jobs are cancelled immediately. Returns the new state or None"""
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+            UPDATE jobs SET state = 'cancelled', cancel_requested = 1, finished_at = ?
+            WHERE id = ? AND state = 'queued'
+            ''', (time.time(), job_id))
+            cursor.execute('''
+            UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND state = 'running'
+            ''', (job_id,))
+            self.connection.commit()
+        
+        job = self.get_job(job_id)
+        return job['state'] if job else None
+    
+    def is_job_cancel_requested(self, job_id):
+        """Check whether a cancel has been requested for a job"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        return bool(row and row['cancel_requested'])
+    
+    def get_job(self, job_id):
+        """Get a job by ID with params and result decoded"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT * FROM jobs WHERE id = ?', (job_id,))
+        row = cursor.fetchone()
+        if not row:
+            return None
+        
+        job = dict(row)
+        job['params'] = json.loads(job['params']) if job['params'] else {}
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+    
+    def count_jobs(self, state, job_type=None):
+        """Count jobs in a given state, optionally of one type"""
+        cursor = self.connection.cursor()
+        if job_type is not None:
+            cursor.execute('SELECT COUNT(*) FROM jobs WHERE state = ? AND job_type = ?', (state, job_type))
+        else:
+            cursor.execute('SELECT COUNT(*) FROM jobs WHERE state = ?', (state,))
+        return cursor.fetchone()[0]
+    
+    def requeue_expired_jobs(self):
+        """
+        Put running jobs whose lease has lapsed (their process stopped
+        heartbeating) back on the queue. Jobs held by live workers are left alone.
+        """
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            now = time.time()
+            # Rows from before leases existed have no expiry and count as lapsed
+            expired = "state = 'running' AND (lease_expires IS NULL OR lease_expires < ?)"
+            cursor.execute(f'''
+            UPDATE jobs SET state = 'cancelled', finished_at = ?, owner = NULL, lease_expires = NULL
+            WHERE {expired} AND cancel_requested = 1
+            ''', (now, now))
+            cursor.execute(f'''
+            UPDATE jobs SET state = 'queued', started_at = NULL, progress_done = 0, owner = NULL, lease_expires = NULL
+            WHERE {expired}
+            ''', (now,))
+            self.connection.commit()
+            return cursor.rowcount
+    
     def __del__(self):
         if hasattr(self._local, 'connection'):
             self._local.connection.close()
@@ -0,0 +1,179 @@
+# memory/embedding_store.py
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import numpy as np
+
+class EmbeddingStore:
+    """
+    Persistent embeddings for VectorStore.
+
+    Vectors live in an append-only float32 file per (model, dimension) that
+    is memory-mapped, so loading is zero-copy. A SQLite side table maps
+    sha256(text) to the row, model and dimension. Rows are flushed to disk
+    before their index entries are committed (once per append_many batch),
+    so after a crash the index never points at a partially written vector;
+    rows past the last committed entry are simply reused.
+    """
+    def __init__(self, path="embeddings", initial_capacity=1024):
+        self.path = path  # Prefix: <path>.db plus <path>-<model>-<dim>.f32 data files
+        self.initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._files = {}  # model -> {'dim', 'file', 'matrix', 'size'}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(f"{path}.db", timeout=30, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self._create_tables()
+
+    def _create_tables(self):
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embedding_files (
+                model TEXT PRIMARY KEY,
+                dim INTEGER,
+                file TEXT
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS embeddings (
+                text_hash TEXT,
+                model TEXT,
+                dim INTEGER,
+                row INTEGER,
+                text TEXT,
+                PRIMARY KEY (text_hash, model)
+            )
+        ''')
+        self.connection.commit()
+
+    @staticmethod
+    def text_hash(text):
+        return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+    def load(self, model):
+        """
+        Map the stored vectors for a model.
+        Returns (matrix, texts) where matrix is a memory-mapped (capacity x dim)
+        array and texts[row] is the text stored in each used row (None for an
+        unreferenced row), or (None, []) if nothing is stored.
+        """
+        with self._lock:
+            state = self._open(model)
+            if state is None:
+                return None, []
+
+            # Rows no longer referenced by the index (e.g. replaced entries) stay as None gaps
+            texts = [None] * state['size']
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT row, text FROM embeddings WHERE model = ?', (model,))
+            for row, text in cursor.fetchall():
+                texts[row] = text
+            print(f"Loaded {state['size']} persisted embeddings for {model}")
+            return state['matrix'], texts
+
+    def append(self, model, text, vector):
+        """
+        Persist a vector and return (row, matrix); matrix is re-mapped when the file grows
+        """
+        rows, matrix = self.append_many(model, [text], [vector])
+        return rows[0], matrix
+
+    def append_many(self, model, texts, vectors):
+        """
+        Persist vectors (one per text) with a single flush and commit.
+        Returns (rows, matrix); matrix is re-mapped when the file grows
+        """
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(texts), -1)
+        with self._lock:
+            state = self._open(model, dim=vectors.shape[1])
+            if state['dim'] != vectors.shape[1]:
+                raise ValueError(f"Embeddings have {vectors.shape[1]} dimensions, {model} store holds {state['dim']}")
+
+            start = state['size']
+            while start + len(texts) > state['matrix'].shape[0]:
+                self._grow(state)
+
+            state['matrix'][start:start + len(texts)] = vectors
+            # Vectors must be on disk before the index entries that point at them are committed
+            state['matrix'].flush()
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO embeddings (text_hash, model, dim, row, text) VALUES (?, ?, ?, ?, ?)',
+                [(self.text_hash(text), model, state['dim'], start + offset, text) for offset, text in enumerate(texts)]
+            )
+            self.connection.commit()
+            state['size'] += len(texts)
+            return list(range(start, start + len(texts))), state['matrix']
+
+    def texts(self, model, rows):
+        """row -> text for the given rows of a model"""
+        rows = [int(row) for row in rows]
+        if not rows:
+            return {}
+        placeholders = ','.join('?' * len(rows))
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute(f'SELECT row, text FROM embeddings WHERE model = ? AND row IN ({placeholders})', (model, *rows))
+            return dict(cursor.fetchall())
+
+    def count(self, model):
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute('SELECT COUNT(*) FROM embeddings WHERE model = ?', (model,))
+            return cursor.fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            for state in self._files.values():
+                state['matrix'].flush()
+            self._files.clear()
+            self.connection.close()
+
+    def _open(self, model, dim=None):
+        """Map the data file for a model, creating it when dim is given and none exists"""
+        state = self._files.get(model)
+        if state is not None:
+            return state
+
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT dim, file FROM embedding_files WHERE model = ?', (model,))
+        row = cursor.fetchone()
+        if row is None:
+            if dim is None:
+                return None
+            slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', model)
+            file = f"{os.path.basename(self.path)}-{slug}-{dim}.f32"
+            self.connection.execute(
+                'INSERT INTO embedding_files (model, dim, file) VALUES (?, ?, ?)', (model, dim, file)
+            )
+            self.connection.commit()
+        else:
+            dim, file = row
+        # Data files sit next to the index, so the store can be moved as a directory
+        file = os.path.join(os.path.dirname(os.path.abspath(self.path)), file)
+
+        if not os.path.exists(file) or os.path.getsize(file) < self.initial_capacity * dim * 4:
+            with open(file, 'ab') as f:
+                f.truncate(max(os.path.getsize(file), self.initial_capacity * dim * 4))
+
+        capacity = os.path.getsize(file) // (dim * 4)
+        # Committed index entries define the used rows; anything after them is free space
+        cursor.execute('SELECT COALESCE(MAX(row) + 1, 0) FROM embeddings WHERE model = ?', (model,))
+        state = {
+            'dim': dim,
+            'file': file,
+            'matrix': np.memmap(file, dtype=np.float32, mode='r+', shape=(capacity, dim)),
+            'size': cursor.fetchone()[0]
+        }
+        self._files[model] = state
+        return state
+
+    def _grow(self, state):
+        """Double the data file and re-map it"""
+        state['matrix'].flush()
+        capacity = state['matrix'].shape[0] * 2
+        with open(state['file'], 'ab') as f:
+            f.truncate(capacity * state['dim'] * 4)
+        state['matrix'] = np.memmap(state['file'], dtype=np.float32, mode='r+', shape=(capacity, state['dim']))
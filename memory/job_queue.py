@@ -0,0 +1,141 @@
+# memory/job_queue.py
+import os
+import socket
+import threading
+import time
+import traceback
+import uuid
+
+class JobCancelled(Exception):
+    """Raised by a job handler when it stops because a cancel was requested"""
+    def __init__(self, partial_result=None):
+        super().__init__("Job cancelled")
+        self.partial_result = partial_result
+
+class JobQueue:
+    """
+    Background job queue persisted in the database's jobs table.
+
+    Jobs are submitted with a type and JSON-serializable params, and a pool of
+    worker threads drains the queue by calling the handler registered for each
+    type as handler(params, report_progress, is_cancelled).
+
+    Several processes can share the table. A claimed job is leased to this
+    queue's owner id for lease_seconds, and a heartbeat thread renews the
+    leases every lease_seconds / 3. Only jobs whose lease has lapsed,
+    because their process died, are put back on the queue.
+    """
+    def __init__(self, db, handlers, num_workers=2, poll_interval=1.0, progress_interval=0.5, lease_seconds=60.0):
+        self.db = db
+        self.handlers = handlers
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.progress_interval = progress_interval
+        self.lease_seconds = lease_seconds
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._wakeup = threading.Event()
+        self._stopping = threading.Event()
+        self._workers = []
+        self._heartbeat = None
+        self._start_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._start_lock:
+            if self._workers:
+                return
+            self._requeue_expired()
+            self._stopping.clear()
+            for i in range(self.num_workers):
+                worker = threading.Thread(target=self._worker_loop, name=f"job-worker-{i}", daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="job-heartbeat", daemon=True)
+            self._heartbeat.start()
+
+    def stop(self, timeout=None):
+        """Ask the workers to exit once their current job is done"""
+        self._stopping.set()
+        self._wakeup.set()
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = []
+        if self._heartbeat is not None:
+            self._heartbeat.join(timeout)
+            self._heartbeat = None
+
+    def submit(self, job_type, params):
+        """Queue a job and return its ID"""
+        if job_type not in self.handlers:
+            raise ValueError(f"Unknown job type: {job_type}")
+        job_id = self.db.insert_job(job_type, params)
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        """Get a job's current state, progress, timings and result"""
+        return self.db.get_job(job_id)
+
+    def cancel(self, job_id):
+        """Cancel a queued job, or ask a running one to stop. Returns the job state or None"""
+        return self.db.request_job_cancel(job_id)
+
+    def _worker_loop(self):
+        while not self._stopping.is_set():
+            job = self.db.claim_next_job(self.owner, self.lease_seconds)
+            if job is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+            self._run(job)
+
+    def _heartbeat_loop(self):
+        """Renew this owner's leases and pick up jobs from workers that died"""
+        while not self._stopping.wait(self.lease_seconds / 3):
+            try:
+                self.db.renew_job_leases(self.owner, self.lease_seconds)
+                if self._requeue_expired():
+                    self._wakeup.set()
+            except Exception as e:
+                print(f"Job heartbeat failed: {str(e)}")
+
+    def _requeue_expired(self):
+        recovered = self.db.requeue_expired_jobs()
+        if recovered:
+            print(f"Requeued {recovered} interrupted jobs")
+        return recovered
+
+    def _run(self, job):
+        job_id = job['id']
+        handler = self.handlers.get(job['job_type'])
+        print(f"Running job {job_id} ({job['job_type']})")
+
+        last_report = [0.0]
+
+        def report_progress(done, total, force=False):
+            now = time.time()
+            if force or done >= total or now - last_report[0] >= self.progress_interval:
+                last_report[0] = now
+                self.db.update_job_progress(job_id, done, total)
+
+        def is_cancelled():
+            return self.db.is_job_cancel_requested(job_id)
+
+        try:
+            if handler is None:
+                raise ValueError(f"Unknown job type: {job['job_type']}")
+            result = handler(job['params'], report_progress, is_cancelled)
+            self._finish(job_id, 'completed', result=result)
+        except JobCancelled as cancelled:
+            self._finish(job_id, 'cancelled', result=cancelled.partial_result)
+        except Exception as e:
+            print(f"Job {job_id} failed: {str(e)}")
+            traceback.print_exc()
+            self._finish(job_id, 'failed', error=str(e))
+
+    def _finish(self, job_id, state, result=None, error=None):
+        # A job whose lease lapsed (e.g. a long stall) may have been requeued for another worker
+        if self.db.finish_job(job_id, state, result=result, error=error, owner=self.owner):
+            print(f"Job {job_id} {state}")
+        else:
+            print(f"Job {job_id} finished as {state} after losing its lease; result discarded")
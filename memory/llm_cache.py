@@ -0,0 +1,144 @@
+# memory/llm_cache.py
+import sqlite3
+import json
+import hashlib
+import re
+import threading
+import time
+
+class LLMCache:
+    """
+    Persistent, content-addressed cache for ollama.chat responses, used by LLMClient.
+
+    Entries are keyed by (model, normalized prompt, options hash) and stored
+    in SQLite so repeated runs against the same inputs skip the model entirely.
+    """
+    def __init__(self, db_path="llm_cache.db", ttl_seconds=7 * 24 * 3600, max_entries=50000):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds  # None disables expiry
+        self.max_entries = max_entries  # None disables eviction
+        self._local = threading.local()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._create_table()
+
+    @property
+    def connection(self):
+        """Thread-safe connection property"""
+        if not hasattr(self._local, 'connection'):
+            self._local.connection = sqlite3.connect(self.db_path, timeout=30)
+        return self._local.connection
+
+    def _create_table(self):
+        """Create the cache table if it doesn't exist"""
+        cursor = self.connection.cursor()
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                created_at REAL,
+                last_used REAL
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)')
+        self.connection.commit()
+
+    @staticmethod
+    def _normalize(text):
+        """Collapse whitespace so re-indented prompts hit the same entry"""
+        return re.sub(r'\s+', ' ', str(text)).strip()
+
+    def make_key(self, model, messages, options=None, format=None):
+        """Build the content address for a chat request"""
+        normalized_messages = [
+            {"role": message.get("role", "user"), "content": self._normalize(message.get("content", ""))}
+            for message in messages
+        ]
+        payload = json.dumps({
+            "model": model,
+            "messages": normalized_messages,
+            "options": hashlib.sha256(json.dumps(options or {}, sort_keys=True).encode("utf-8")).hexdigest(),
+            "format": format
+        }, sort_keys=True)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Return the cached response for a key, or None on a miss"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT response, created_at FROM llm_cache WHERE key = ?', (key,))
+        row = cursor.fetchone()
+        now = time.time()
+
+        if row is None:
+            self._record(hit=False)
+            return None
+
+        if self.ttl_seconds is not None and now - row[1] > self.ttl_seconds:
+            # Expired entry - drop it and treat as a miss
+            with self._write_lock:
+                cursor.execute('DELETE FROM llm_cache WHERE key = ?', (key,))
+                self.connection.commit()
+            self._record(hit=False)
+            return None
+
+        with self._write_lock:
+            cursor.execute('UPDATE llm_cache SET last_used = ? WHERE key = ?', (now, key))
+            self.connection.commit()
+        self._record(hit=True)
+        return json.loads(row[0])
+
+    def put(self, key, model, response):
+        """Store a response and evict least recently used entries beyond max_entries"""
+        now = time.time()
+        with self._write_lock:
+            cursor = self.connection.cursor()
+            cursor.execute('''
+                INSERT OR REPLACE INTO llm_cache (key, model, response, created_at, last_used)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (key, model, json.dumps(response, default=str), now, now))
+
+            if self.max_entries is not None:
+                cursor.execute('SELECT COUNT(*) FROM llm_cache')
+                overflow = cursor.fetchone()[0] - self.max_entries
+                if overflow > 0:
+                    cursor.execute('''
+                        DELETE FROM llm_cache WHERE key IN (
+                            SELECT key FROM llm_cache ORDER BY last_used ASC LIMIT ?
+                        )
+                    ''', (overflow,))
+                    with self._stats_lock:
+                        self.evictions += overflow
+
+            self.connection.commit()
+
+    def stats(self):
+        """Return hit/miss counters and current size"""
+        cursor = self.connection.cursor()
+        cursor.execute('SELECT COUNT(*) FROM llm_cache')
+        entries = cursor.fetchone()[0]
+        with self._stats_lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'entries': entries
+            }
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._write_lock:
+            self.connection.execute('DELETE FROM llm_cache')
+            self.connection.commit()
+
+    def _record(self, hit):
+        with self._stats_lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
@@ -0,0 +1,28 @@
+# memory/quantization.py
+import numpy as np
+
+def quantize_int8(vectors):
+    """
+    Symmetric per-vector int8 quantization.
+    Returns (codes, scales) with vectors ~= codes * scales[:, None].
+    """
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    peaks = np.abs(vectors).max(axis=1) if vectors.size else np.empty(0, dtype=np.float32)
+    scales = np.where(peaks > 0, peaks / 127.0, 1.0).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+def dequantize_int8(codes, scales):
+    return codes.astype(np.float32) * scales[:, None]
+
+def int8_scores(codes, scales, query, chunk=1024):
+    """
+    Inner products of the quantized vectors with a float query.
+    Codes are widened to float32 one cache-sized chunk at a time so the
+    product still runs through BLAS without a full float32 copy.
+    """
+    query = np.asarray(query, dtype=np.float32)
+    scores = np.empty(len(codes), dtype=np.float32)
+    for start in range(0, len(codes), chunk):
+        scores[start:start + chunk] = codes[start:start + chunk].astype(np.float32) @ query
+    return scores * scales
@@ -0,0 +1,133 @@
+# memory/skill_graph.py
+import numpy as np
+
+class SkillGraph:
+    """
+    Precomputed skill-to-skill similarity graph over the skills table.
+
+    update() embeds every skill through the shared VectorStore and stores,
+    for each skill whose neighbours are not computed yet, its top_n most
+    similar skills in the skill_neighbors table. It runs incrementally: only
+    new skills get a full list, and existing skills' lists are merged with
+    any new skill that beats their weakest stored neighbour, so nothing is
+    recomputed from scratch. neighbors() is an indexed lookup that
+    matching can use instead of embedding skills at match time; a pair
+    missing from both skills' lists is no more similar than weakest() of
+    either, which tells callers when the lists alone are conclusive.
+    """
+    def __init__(self, db, vector_store, top_n=10, chunk_size=256, max_cached_skills=10000):
+        self.db = db
+        self.vector_store = vector_store
+        self.top_n = top_n
+        # New skills scored per matrix product
+        self.chunk_size = chunk_size
+        self.max_cached_skills = max_cached_skills
+        self._cache = {}
+
+    def neighbors(self, skill):
+        """Lowercased neighbour name -> similarity for skill, or None if it is not in the graph yet"""
+        entry = self._entry(skill)
+        return entry[0] if entry is not None else None
+
+    def weakest(self, skill):
+        """
+        Lowest similarity in skill's own neighbour list; -inf when the list is
+        empty, and +inf when the skill is not in the graph (nothing is known)
+        """
+        entry = self._entry(skill)
+        if entry is None:
+            return float('inf')
+        return entry[1] if entry[1] is not None else float('-inf')
+
+    def _entry(self, skill):
+        """Cached (neighbours, weakest) for skill, or None"""
+        if skill in self._cache:
+            return self._cache[skill]
+        stored = self.db.get_skill_neighbors(skill)
+        entry = None
+        if stored is not None:
+            neighbors = {}
+            for name, similarity in stored[0].items():
+                neighbors[name.lower()] = max(neighbors.get(name.lower(), 0.0), similarity)
+            entry = (neighbors, stored[1])
+        if len(self._cache) >= self.max_cached_skills:
+            self._cache.clear()
+        self._cache[skill] = entry
+        return entry
+
+    def update(self, progress=None, is_cancelled=None):
+        """
+        Compute neighbours for skills added since the last update and merge
+        them into existing lists. progress(done, total) is called after each
+        chunk; the update stops after a chunk once is_cancelled() is true,
+        and whatever was stored stays valid. Skills that could not be embedded
+        stay pending for the next update. Returns the number of skills computed.
+        """
+        skills = self.db.get_skills()
+        pending = np.array([skill['pending'] for skill in skills], dtype=bool)
+        if not pending.any():
+            return 0
+
+        ids = np.array([skill['id'] for skill in skills], dtype=np.int64)
+        # Unknown skills are embedded here in batches; known ones come from the store
+        vectors, ok = self.vector_store.get_embedding_matrix([skill['name'] for skill in skills])
+        floors = np.full(len(skills), -np.inf, dtype=np.float32)
+        stored_floors = self.db.get_skill_neighbor_floors(self.top_n)
+        for position, skill_id in enumerate(ids.tolist()):
+            if skill_id in stored_floors:
+                floors[position] = stored_floors[skill_id]
+        # Only computed skills with an embedding can gain new neighbours
+        mergeable = ~pending & ok
+
+        positions = np.flatnonzero(pending)
+        done, computed = 0, 0
+        for start in range(0, len(positions), self.chunk_size):
+            chunk = positions[start:start + self.chunk_size]
+            scores = vectors[chunk] @ vectors.T
+            scores[:, ~ok] = -np.inf
+            scores[np.arange(len(chunk)), chunk] = -np.inf  # A skill is not its own neighbour
+
+            neighbors = {}
+            for row, position in enumerate(chunk):
+                if ok[position]:
+                    neighbors[int(ids[position])] = self._top(ids, scores[row])
+
+            # Existing skills whose weakest neighbour a new skill beats
+            gains = (scores > floors[None, :]) & mergeable[None, :] & ok[chunk][:, None]
+            columns = np.flatnonzero(gains.any(axis=0))
+            if len(columns):
+                current = self.db.get_skill_neighbor_ids(ids[columns].tolist())
+                for column in columns:
+                    skill_id = int(ids[column])
+                    merged = dict(current[skill_id])
+                    for row in np.flatnonzero(gains[:, column]):
+                        merged[int(ids[chunk[row]])] = float(scores[row, column])
+                    ranked = sorted(merged.items(), key=lambda item: -item[1])[:self.top_n]
+                    neighbors[skill_id] = ranked
+                    if len(ranked) >= self.top_n:
+                        floors[column] = ranked[-1][1]
+
+            # Only skills with an embedding are done; the rest are retried next time
+            embedded = ids[chunk][ok[chunk]].tolist()
+            self.db.replace_skill_neighbors(neighbors, computed_ids=embedded)
+            done += len(chunk)
+            computed += len(embedded)
+            if progress is not None:
+                progress(done, len(positions))
+            if is_cancelled is not None and is_cancelled():
+                break
+
+        self._cache.clear()
+        if computed < done:
+            print(f"{done - computed} skills could not be embedded; their neighbours will be retried")
+        print(f"Computed neighbours for {computed} skills ({len(skills)} in the taxonomy)")
+        return computed
+
+    def _top(self, ids, scores):
+        """[(id, similarity)] of the top_n scores, highest first"""
+        k = min(self.top_n, int(np.isfinite(scores).sum()))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        return [(int(ids[index]), float(scores[index])) for index in top]
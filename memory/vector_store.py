@@ -1,65 +1,385 @@
 # memory/vector_store.py
-import ollama
+from llm.client import LLMClient
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import threading
 import numpy as np
 
 class VectorStore:
-    def __init__(self):
-        self.embeddings = {}
-        self.model = "distilbert"  # Using DistilBERT for embeddings
-    
+    """
+    Embedding store backed by one contiguous float32 matrix.
+
+    Each text maps, by a 16-byte digest, to a row holding its L2-normalised
+    embedding, so cosine similarity against any set of rows is a single
+    matrix product and top-k selection uses argpartition instead of a full
+    sort. With an EmbeddingStore the matrix is its memory-mapped file, so
+    embeddings survive restarts and are never requested from the model
+    twice; texts then stay on disk and only digests are held in memory.
+    Without one, max_entries / max_bytes bound the matrix and the least
+    recently used embeddings are evicted.
+    Embeddings are kept per model (the routed vector_store.embedding model),
+    so changing the route never mixes vectors from two models.
+    Missing embeddings are fetched in batches of batch_size texts per
+    request, with up to parallelism requests in flight, and each batch is
+    persisted with one flush and commit.
+    """
+    def __init__(self, llm=None, initial_capacity=1024, store=None, batch_size=32, parallelism=4,
+                 max_entries=None, max_bytes=None):
+        if (max_entries or max_bytes) and store is not None:
+            # Persisted rows are paged by the OS
+            raise ValueError("max_entries/max_bytes only apply to an in-memory VectorStore")
+
+        self.llm = llm or LLMClient()
+        # The model the client actually embeds with: a vector_store.embedding route overrides the default
+        router = getattr(self.llm, 'router', None)
+        route = router.resolve('vector_store', 'embedding') if router is not None else {}
+        self.model = route.get('model') or "distilbert"  # Using DistilBERT for embeddings
+        self.store = store
+        self.batch_size = max(1, batch_size)
+        self.parallelism = max(1, parallelism)
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._batch_endpoint = True  # Cleared if the server has no /api/embed (Ollama < 0.3)
+        self.dim = None
+        self._matrix = None
+        self._size = 0     # rows in use, including gaps and free rows
+        self._initial_capacity = initial_capacity
+        self._rows = OrderedDict()  # text digest -> row, least recently used first
+        self._keys = []    # row -> text digest (None for a gap or free row)
+        self._texts = []   # row -> text, in-memory stores only
+        self._gaps = []    # persisted rows no longer referenced by the store's index
+        self._free = []    # evicted rows waiting to be reused
+        self._lock = threading.Lock()
+        self._append_lock = threading.Lock()  # Serializes writes to the persistent store
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        if store is not None:
+            matrix, texts = store.load(self.model)
+            if matrix is not None:
+                self._matrix = matrix
+                self.dim = matrix.shape[1]
+                self._size = len(texts)
+                self._keys = [self._key(text) if text is not None else None for text in texts]
+                self._rows = OrderedDict((key, row) for row, key in enumerate(self._keys) if key is not None)
+                self._gaps = [row for row, key in enumerate(self._keys) if key is None]
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, text):
+        return self._key(text) in self._rows
+
+    def stats(self):
+        """Entry count, matrix memory, and hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._rows),
+                'capacity': self._matrix.shape[0] if self._matrix is not None else 0,
+                'limit': self._limit(),
+                'dim': self.dim,
+                'persistent': self.store is not None,
+                'matrix_bytes': int(self._matrix.nbytes) if self._matrix is not None else 0,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
     def get_embedding(self, text):
-        """Get embedding for a text string"""
-        if text in self.embeddings:
-            return self.embeddings[text]
-        
-        # In a real implementation, we'd use a proper embedding model
-        # For hackathon purposes, we'll use a simplified approach
-        
-        # Use Ollama to generate embeddings
-        # Note: This is a simplified approach - in production we'd use a dedicated embedding model
-        response = ollama.embeddings(
-            model=self.model,
-            prompt=text
-        )
-        
-        embedding = response.get('embedding', [])
-        
-        # Cache the embedding
-        self.embeddings[text] = embedding
-        
-        return embedding
-    
+        """Get the (L2-normalised) embedding for a text string"""
+        return self.get_embeddings([text])[0]
+
+    def get_embeddings(self, texts):
+        """
+        Embeddings for several texts, in input order ([] where unavailable).
+        Duplicates are embedded once and known texts are served from the store.
+        """
+        keys, vectors = self._ensure_many(texts)
+        return [vectors[key].tolist() if vectors[key] is not None else [] for key in keys]
+
+    def get_embedding_matrix(self, texts):
+        """Embeddings for texts stacked as a float32 matrix, plus a mask of the texts that have one"""
+        return self._gather(texts)
+
+    def get_stored_matrix(self, texts):
+        """
+        Like get_embedding_matrix, but only from embeddings already stored:
+        never calls the model, so texts not in the store get a zero row and
+        a False mask entry
+        """
+        keys = [self._key(text) for text in texts]
+        with self._lock:
+            rows = [self._rows.get(key) for key in keys]
+            ok = np.array([row is not None for row in rows], dtype=bool)
+            matrix = np.zeros((len(texts), self.dim or 1), dtype=np.float32)
+            if ok.any():
+                matrix[ok] = self._matrix[[row for row in rows if row is not None]]
+        return matrix, ok
+
+    def add(self, text, embedding):
+        """Store a precomputed embedding for text and return its row"""
+        with self._append_lock, self._lock:
+            return self._add_locked(text, embedding)
+
     def find_similar(self, query, candidates, top_n=5):
         """Find most similar texts to a query from a list of candidates"""
+        return self.find_similar_batch([query], candidates, top_n)[0]
+
+    def find_similar_batch(self, queries, candidates, top_n=5):
+        """
+        Rank candidates for several queries at once.
+        Returns one list of (candidate, similarity) per query, most similar first.
+        """
+        if not queries:
+            return []
         if not candidates:
+            return [[] for _ in queries]
+
+        # One pass embeds every unknown query and candidate together
+        vectors, ok = self._gather(list(queries) + list(candidates))
+        query_vectors, query_ok = vectors[:len(queries)], ok[:len(queries)]
+        candidate_vectors, candidate_ok = vectors[len(queries):], ok[len(queries):]
+
+        # (queries x dim) @ (dim x candidates): cosine similarity of unit vectors
+        scores = query_vectors @ candidate_vectors.T
+        # Texts without an embedding never match
+        scores[~query_ok, :] = 0.0
+        scores[:, ~candidate_ok] = 0.0
+
+        return [
+            [(candidates[index], float(row_scores[index])) for index in self._top_k(row_scores, top_n)]
+            for row_scores in scores
+        ]
+
+    def search(self, query, top_n=5):
+        """Most similar texts to query among everything in the store"""
+        keys, vectors = self._ensure_many([query])
+        vector = vectors[keys[0]]
+        if vector is None:
+            return []
+
+        with self._lock:
+            scores = self._matrix[:self._size] @ vector
+            # Gap and evicted rows hold no live text
+            scores[self._gaps + self._free] = -np.inf
+        rows = [index for index in self._top_k(scores, top_n) if scores[index] > -np.inf]
+        scores = [float(scores[index]) for index in rows]
+
+        texts = self._texts_for(rows)
+        return [(texts[row], float(score)) for row, score in zip(rows, scores) if texts.get(row) is not None]
+
+    def _key(self, text):
+        """Fixed-size digest of model and text, used as the lookup key instead of the full text"""
+        return hashlib.blake2b(f"{self.model}\0{text}".encode('utf-8'), digest_size=16).digest()
+
+    def _limit(self):
+        """Maximum number of rows for a bounded store, or None"""
+        limits = []
+        if self.max_entries:
+            limits.append(self.max_entries)
+        if self.max_bytes and self.dim:
+            limits.append(max(1, self.max_bytes // (self.dim * 4)))
+        return min(limits) if limits else None
+
+    def _texts_for(self, rows):
+        """row -> text for search results"""
+        if self.store is not None:
+            return self.store.texts(self.model, rows)
+        with self._lock:
+            return {row: self._texts[row] for row in rows if row < len(self._texts)}
+
+    def _ensure_many(self, texts):
+        """
+        Digests for texts and digest -> unit vector (None if unavailable),
+        fetching embeddings in concurrent batches for any not stored. Vectors
+        are copied as they are read or added, so rows that a bounded store
+        evicts later in the same call are still returned.
+        """
+        keys = [self._key(text) for text in texts]
+        vectors = {}
+        missing = {}
+        with self._lock:
+            for text, key in zip(texts, keys):
+                if key in missing:
+                    continue
+                row = self._rows.get(key)
+                if row is not None:
+                    self.hits += 1
+                    self._rows.move_to_end(key)
+                    if key not in vectors:
+                        vectors[key] = self._matrix[row].copy()
+                else:
+                    missing[key] = text
+            self.misses += len(missing)
+        if not missing:
+            return keys, vectors
+
+        missing = list(missing.values())
+        batches = [missing[i:i + self.batch_size] for i in range(0, len(missing), self.batch_size)]
+        if len(batches) == 1 or self.parallelism == 1:
+            results = [self._fetch(batch) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.parallelism, len(batches))) as executor:
+                results = list(executor.map(self._fetch, batches))
+
+        for batch, embeddings in zip(batches, results):
+            vectors.update(self._add_batch(batch, embeddings))
+        # Texts whose batch came back short
+        for text in missing:
+            vectors.setdefault(self._key(text), None)
+        return keys, vectors
+
+    def _fetch(self, batch):
+        """Embeddings for a batch of texts, one request where the server supports it"""
+        if self._batch_endpoint:
+            try:
+                response = self.llm.embed(model=self.model, input=batch, agent='vector_store', task='embedding')
+                return response.get('embeddings') or [[] for _ in batch]
+            except Exception as e:
+                if getattr(e, 'status_code', None) != 404:
+                    raise
+                print("Ollama has no batch embedding endpoint; falling back to one request per text")
+                self._batch_endpoint = False
+
+        return [
+            self.llm.embeddings(model=self.model, prompt=text, agent='vector_store', task='embedding').get('embedding', [])
+            for text in batch
+        ]
+
+    def _add_batch(self, texts, embeddings):
+        """
+        Store a fetched batch and return digest -> unit vector (None where the
+        model returned nothing). A persistent store writes the batch with one
+        flush and commit, outside the lock so lookups are not blocked meanwhile.
+        """
+        added = {}
+        fresh = []
+        for text, embedding in zip(texts, embeddings):
+            vector = self._unit(embedding)
+            added[self._key(text)] = vector
+            if vector is not None:
+                fresh.append((text, vector))
+
+        if self.store is None:
+            with self._lock:
+                for text, vector in fresh:
+                    self._add_locked(text, vector)
+            return added
+
+        # Appends are serialized among themselves, so no text is written twice
+        with self._append_lock:
+            with self._lock:
+                # Another call may have stored some of these meanwhile
+                fresh = [(text, vector) for text, vector in fresh if self._key(text) not in self._rows]
+            if fresh:
+                rows, matrix = self.store.append_many(self.model, [text for text, _ in fresh],
+                                                      [vector for _, vector in fresh])
+                with self._lock:
+                    self._register_locked([text for text, _ in fresh], rows, matrix)
+        return added
+
+    def _register_locked(self, texts, rows, matrix):
+        """Track rows the store appended for texts (in order, under _append_lock); matrix is its current mapping"""
+        self._matrix = matrix
+        self.dim = matrix.shape[1]
+        for text, row in zip(texts, rows):
+            key = self._key(text)
+            self._rows[key] = row
+            self._keys.append(key)
+            self._size = row + 1
+
+    @staticmethod
+    def _unit(embedding):
+        """L2-normalised float32 vector, or None for an empty embedding"""
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        if vector.size == 0:
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _add_locked(self, text, embedding):
+        key = self._key(text)
+        row = self._rows.get(key)
+        if row is not None:
+            return row
+
+        vector = self._unit(embedding)
+        if vector is None:
+            return None
+
+        if self.store is not None:
+            # The store appends to its mapped file and hands back the (possibly re-mapped) matrix
+            row, matrix = self.store.append(self.model, text, vector)
+            self._register_locked([text], [row], matrix)
+            return row
+
+        if self.dim is None:
+            self.dim = vector.size
+            limit = self._limit()
+            capacity = min(self._initial_capacity, limit) if limit else self._initial_capacity
+            self._matrix = np.zeros((capacity, self.dim), dtype=np.float32)
+        elif vector.size != self.dim:
+            raise ValueError(f"Embedding for {text!r} has {vector.size} dimensions, store holds {self.dim}")
+
+        limit = self._limit()
+        if limit and len(self._rows) >= limit:
+            # Evict the least recently used entry and reuse its row
+            _, evicted_row = self._rows.popitem(last=False)
+            self._keys[evicted_row] = None
+            self._texts[evicted_row] = None
+            self._free.append(evicted_row)
+            self.evictions += 1
+
+        if self._free:
+            row = self._free.pop()
+        else:
+            if self._size == self._matrix.shape[0]:
+                # Grow geometrically so appends stay amortised O(dim), never past the limit
+                capacity = self._matrix.shape[0] * 2
+                if limit:
+                    capacity = min(capacity, limit)
+                grown = np.zeros((capacity, self.dim), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            row = self._size
+            self._size += 1
+            self._keys.append(None)
+            self._texts.append(None)
+
+        self._matrix[row] = vector
+        self._rows[key] = row
+        self._keys[row] = key
+        self._texts[row] = text
+        return row
+
+    def _gather(self, texts):
+        """Stack the vectors for texts; returns (matrix, mask of texts that have embeddings)"""
+        keys, vectors = self._ensure_many(texts)
+        ok = np.array([vectors[key] is not None for key in keys], dtype=bool)
+        if not ok.any():
+            return np.zeros((len(texts), self.dim or 1), dtype=np.float32), ok
+
+        dim = next(vectors[key] for key in keys if vectors[key] is not None).shape[0]
+        matrix = np.zeros((len(texts), dim), dtype=np.float32)
+        for position, key in enumerate(keys):
+            if vectors[key] is not None:
+                matrix[position] = vectors[key]
+        return matrix, ok
+
+    @staticmethod
+    def _top_k(scores, k):
+        """Indices of the k highest scores, highest first (ties keep input order)"""
+        n = scores.shape[0]
+        k = min(int(k), n)
+        if k <= 0:
             return []
-        
-        query_embedding = self.get_embedding(query)
-        
-        similarities = []
-        for candidate in candidates:
-            candidate_embedding = self.get_embedding(candidate)
-            similarity = self._cosine_similarity(query_embedding, candidate_embedding)
-            similarities.append((candidate, similarity))
-        
-        # Sort by similarity (descending)
-        similarities.sort(key=lambda x: x[1], reverse=True)
-        
-        # Return top N
-        return similarities[:top_n]
-    
-    def _cosine_similarity(self, a, b):
-        """Calculate cosine similarity between two vectors"""
-        # Convert to numpy arrays for easier calculation
-        a = np.array(a)
-        b = np.array(b)
-        
-        # Calculate cosine similarity
-        dot_product = np.dot(a, b)
-        norm_a = np.linalg.norm(a)
-        norm_b = np.linalg.norm(b)
-        
-        if norm_a == 0 or norm_b == 0:
-            return 0
-        
-        return dot_product / (norm_a * norm_b)
+        if k < n:
+            candidates = np.argpartition(-scores, k - 1)[:k]
+            candidates.sort()
+        else:
+            candidates = np.arange(n)
+        return candidates[np.argsort(-scores[candidates], kind='stable')].tolist()
@@ -0,0 +1,107 @@
+# tests/test_ann_index.py
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.ann_index import IVFIndex
+
+def clustered_vectors(count, dim=32, clusters=20, seed=0):
+    """Unit vectors scattered around random cluster centres"""
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((clusters, dim))
+    vectors = centres[rng.integers(0, clusters, count)] + 0.3 * rng.standard_normal((count, dim))
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors.astype(np.float32)
+
+def exact_top_k(vectors, query, k):
+    return set(np.argsort(-(vectors @ query), kind='stable')[:k].tolist())
+
+class IVFIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = clustered_vectors(2000)
+        self.queries = clustered_vectors(50, seed=1)
+        self.index = IVFIndex(32, nlist=16, nprobe=4, train_threshold=1000)
+        self.index.add(np.arange(len(self.vectors)), self.vectors)
+
+    def recall(self, index, k=10, nprobe=None):
+        found = 0
+        for query in self.queries:
+            ids, _ = index.search(query, k, nprobe)
+            found += len(set(ids.tolist()) & exact_top_k(self.vectors, query, k))
+        return found / (k * len(self.queries))
+
+    def test_trains_once_threshold_is_reached(self):
+        self.assertTrue(self.index.is_trained)
+        self.assertEqual(len(self.index), 2000)
+
+    def test_untrained_buffer_is_searched_exactly(self):
+        index = IVFIndex(32, nlist=16, train_threshold=10000)
+        index.add(np.arange(500), self.vectors[:500])
+        self.assertFalse(index.is_trained)
+        for query in self.queries[:10]:
+            ids, _ = index.search(query, 10)
+            self.assertEqual(set(ids.tolist()), exact_top_k(self.vectors[:500], query, 10))
+
+    def test_recall_against_exact_search(self):
+        self.assertEqual(self.recall(self.index, nprobe=16), 1.0)
+        self.assertGreaterEqual(self.recall(self.index, nprobe=4), 0.8)
+
+    def test_scores_are_sorted_inner_products(self):
+        ids, scores = self.index.search(self.queries[0], 10, nprobe=16)
+        self.assertTrue(np.all(np.diff(scores) <= 0))
+        np.testing.assert_allclose(scores, self.vectors[ids] @ self.queries[0], rtol=1e-5)
+
+    def test_save_load_round_trip(self):
+        self.index.add([5], self.vectors[6:7])  # Replaced entry leaves a tombstone
+        self.index.remove([7])
+        path = os.path.join(tempfile.mkdtemp(), "index.npz")
+        self.index.save(path, extra={'model': np.array("distilbert")})
+
+        loaded = IVFIndex.load(path)
+        self.assertEqual(len(loaded), len(self.index))
+        self.assertEqual(loaded.tombstones(), self.index.tombstones())
+        self.assertEqual(str(loaded.extra['model']), "distilbert")
+        np.testing.assert_array_equal(loaded.centroids, self.index.centroids)
+        for query in self.queries:
+            expected_ids, expected_scores = self.index.search(query, 10)
+            ids, scores = loaded.search(query, 10)
+            np.testing.assert_array_equal(ids, expected_ids)
+            np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+    def test_quantized_save_load_round_trip(self):
+        index = IVFIndex(32, nlist=16, nprobe=4, train_threshold=1000, quantize='int8')
+        index.add(np.arange(len(self.vectors)), self.vectors)
+        path = os.path.join(tempfile.mkdtemp(), "index.npz")
+        index.save(path)
+
+        loaded = IVFIndex.load(path)
+        self.assertEqual(loaded.quantize, 'int8')
+        self.assertGreaterEqual(self.recall(loaded, nprobe=16), 0.9)
+        ids, scores = loaded.search(self.queries[0], 10)
+        expected_ids, expected_scores = index.search(self.queries[0], 10)
+        np.testing.assert_array_equal(ids, expected_ids)
+        np.testing.assert_allclose(scores, expected_scores, rtol=1e-6)
+
+    def test_upsert_remove_and_compact(self):
+        self.index.add([3], self.vectors[4:5])
+        self.index.remove([4])
+        self.assertEqual(len(self.index), 1999)
+        self.assertEqual(self.index.tombstones(), 2)
+
+        ids, scores = self.index.search(self.vectors[4], 2, nprobe=16)
+        self.assertEqual(ids[0], 3)
+        self.assertAlmostEqual(float(scores[0]), 1.0, places=5)
+        self.assertNotIn(4, ids.tolist())
+
+        self.assertEqual(self.index.compact(), 2)
+        self.assertEqual(self.index.tombstones(), 0)
+        ids, _ = self.index.search(self.vectors[4], 2, nprobe=16)
+        self.assertEqual(ids[0], 3)
+        self.assertNotIn(4, ids.tolist())
+
+if __name__ == "__main__":
+    unittest.main()
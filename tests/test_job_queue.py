@@ -0,0 +1,135 @@
+# tests/test_job_queue.py
+import os
+import sys
+import tempfile
+import threading
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.database import Database
+from memory.job_queue import JobQueue, JobCancelled
+
+def wait_for(predicate, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.02)
+    return False
+
+class JobQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(os.path.join(tempfile.mkdtemp(), "jobs.db"))
+        self.runs = []
+        self.started = threading.Event()
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.stop(timeout=5)
+
+    def queue(self, **kwargs):
+        queue = JobQueue(self.db, {'echo': self.echo, 'wait': self.wait_for_cancel},
+                         poll_interval=0.05, **kwargs)
+        self.queues.append(queue)
+        return queue
+
+    def echo(self, params, report_progress, is_cancelled):
+        self.runs.append(params)
+        return {'echo': params.get('value')}
+
+    def wait_for_cancel(self, params, report_progress, is_cancelled):
+        done = 0
+        while not is_cancelled():
+            done += 1
+            report_progress(done, 1000)
+            # Signalled after the first step, so a cancelled run always has partial work
+            self.started.set()
+            time.sleep(0.01)
+        raise JobCancelled({'done': done})
+
+    def state(self, job_id):
+        return self.db.get_job(job_id)['state']
+
+    def test_runs_submitted_jobs(self):
+        queue = self.queue()
+        queue.start()
+        job_id = queue.submit('echo', {'value': 1})
+        self.assertTrue(wait_for(lambda: self.state(job_id) == 'completed'))
+        self.assertEqual(queue.get(job_id)['result'], {'echo': 1})
+        self.assertIsNone(queue.get(job_id)['lease_expires'])
+
+    def test_expired_lease_is_requeued_and_run(self):
+        job_id = self.db.insert_job('echo', {'value': 2})
+        # A worker in a process that died: its lease lapses without renewal
+        self.db.claim_next_job('dead-worker', lease_seconds=0.05)
+        time.sleep(0.1)
+
+        queue = self.queue()
+        queue.start()
+        self.assertTrue(wait_for(lambda: self.state(job_id) == 'completed'))
+        self.assertEqual(self.runs, [{'value': 2}])
+        self.assertEqual(queue.get(job_id)['owner'], queue.owner)
+
+    def test_live_lease_is_left_alone(self):
+        job_id = self.db.insert_job('echo', {'value': 3})
+        self.db.claim_next_job('live-worker', lease_seconds=60)
+
+        queue = self.queue(lease_seconds=0.3)
+        queue.start()
+        # Several heartbeats pass without taking the job over
+        time.sleep(0.5)
+        self.assertEqual(self.state(job_id), 'running')
+        self.assertEqual(self.runs, [])
+
+        # The owner can still finish it; another owner cannot
+        self.assertFalse(self.db.finish_job(job_id, 'completed', owner=queue.owner))
+        self.assertTrue(self.db.finish_job(job_id, 'completed', owner='live-worker'))
+
+    def test_heartbeat_renews_running_leases(self):
+        queue = self.queue(lease_seconds=0.3)
+        queue.start()
+        job_id = queue.submit('wait', {})
+        self.assertTrue(self.started.wait(5))
+        first = queue.get(job_id)['lease_expires']
+        self.assertTrue(wait_for(lambda: queue.get(job_id)['lease_expires'] > first))
+        # Still running under this owner, never requeued
+        time.sleep(0.4)
+        self.assertEqual(self.state(job_id), 'running')
+        queue.cancel(job_id)
+        self.assertTrue(wait_for(lambda: self.state(job_id) == 'cancelled'))
+
+    def test_cancel_queued_job(self):
+        queue = self.queue()
+        job_id = queue.submit('echo', {'value': 4})
+        self.assertEqual(queue.cancel(job_id), 'cancelled')
+        queue.start()
+        time.sleep(0.2)
+        self.assertEqual(self.state(job_id), 'cancelled')
+        self.assertEqual(self.runs, [])
+
+    def test_cancel_running_job_keeps_partial_result(self):
+        queue = self.queue()
+        queue.start()
+        job_id = queue.submit('wait', {})
+        self.assertTrue(self.started.wait(5))
+        self.assertEqual(queue.cancel(job_id), 'running')
+        self.assertTrue(wait_for(lambda: self.state(job_id) == 'cancelled'))
+        self.assertGreater(queue.get(job_id)['result']['done'], 0)
+
+    def test_expired_job_with_cancel_requested_is_cancelled(self):
+        job_id = self.db.insert_job('echo', {'value': 5})
+        self.db.claim_next_job('dead-worker', lease_seconds=0.05)
+        self.db.request_job_cancel(job_id)
+        time.sleep(0.1)
+
+        queue = self.queue()
+        queue.start()
+        time.sleep(0.2)
+        self.assertEqual(self.state(job_id), 'cancelled')
+        self.assertEqual(self.runs, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# tests/test_limiter.py
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.limiter import AdaptiveLimiter, CircuitBreaker, CircuitOpenError
+
+class AdaptiveLimiterTest(unittest.TestCase):
+    def fill(self, limiter):
+        """Take every free slot so the next release counts as saturated"""
+        while limiter.acquire(timeout=0):
+            pass
+
+    def test_grows_additively_only_while_saturated(self):
+        limiter = AdaptiveLimiter(initial_limit=2, max_limit=8)
+        limiter.acquire()
+        limiter.release(1.0)
+        self.assertEqual(limiter.limit, 2.0)
+
+        self.fill(limiter)
+        limiter.release(1.0)
+        self.assertAlmostEqual(limiter.limit, 2.5)
+
+    def test_drop_cuts_multiplicatively_down_to_min(self):
+        limiter = AdaptiveLimiter(initial_limit=8, min_limit=2, backoff_ratio=0.5)
+        for expected in (4.0, 2.0, 2.0):
+            limiter.acquire()
+            limiter.release(1.0, dropped=True)
+            self.assertEqual(limiter.limit, expected)
+        # Failed calls do not feed the latency baseline
+        self.assertEqual(limiter.baselines, {})
+
+    def test_slowdown_against_the_same_key_is_congestion(self):
+        limiter = AdaptiveLimiter(initial_limit=8, backoff_ratio=0.5, latency_tolerance=2.0)
+        limiter.acquire()
+        limiter.release(1.0, key='score')
+        limiter.acquire()
+        limiter.release(3.0, key='score')
+        self.assertEqual(limiter.limit, 4.0)
+
+    def test_long_calls_are_not_compared_with_short_ones(self):
+        limiter = AdaptiveLimiter(initial_limit=8, latency_tolerance=2.0)
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(0.05, key='embed')
+        for _ in range(5):
+            limiter.acquire()
+            limiter.release(4.0, key='analysis')
+        self.assertEqual(limiter.limit, 8.0)
+        self.assertEqual(limiter.state()['latency_baselines'], {'embed': 0.05, 'analysis': 4.0})
+
+    def test_acquire_times_out_at_the_limit(self):
+        limiter = AdaptiveLimiter(initial_limit=1)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0.01))
+        limiter.release(1.0)
+        self.assertTrue(limiter.acquire(timeout=0))
+
+class CircuitBreakerTest(unittest.TestCase):
+    def expire(self, breaker):
+        """Pretend reset_timeout has passed since the circuit opened"""
+        breaker.opened_at -= breaker.reset_timeout
+
+    def test_closed_open_half_open_closed(self):
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30.0)
+        for _ in range(2):
+            breaker.before_call()
+            breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        self.expire(breaker)
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.before_call()
+        # Only one probe at a time
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+        self.assertEqual(breaker.failures, 0)
+        breaker.before_call()
+
+    def test_failed_probe_reopens(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30.0)
+        breaker.record_failure()
+        self.expire(breaker)
+        breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_success_resets_consecutive_failures(self):
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+if __name__ == "__main__":
+    unittest.main()
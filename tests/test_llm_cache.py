@@ -0,0 +1,84 @@
+# tests/test_llm_cache.py
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.llm_cache import LLMCache
+
+class Clock:
+    """Stand-in for time.time that only moves when told to"""
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class LLMCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch('memory.llm_cache.time.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.path = os.path.join(tempfile.mkdtemp(), "llm_cache.db")
+
+    def messages(self, content):
+        return [{'role': 'user', 'content': content}]
+
+    def test_key_ignores_whitespace_but_not_content(self):
+        cache = LLMCache(self.path)
+        key = cache.make_key("mistral", self.messages("Score  this\n\tcandidate "))
+        self.assertEqual(key, cache.make_key("mistral", self.messages("Score this candidate")))
+        self.assertNotEqual(key, cache.make_key("mistral", self.messages("Score that candidate")))
+
+    def test_key_depends_on_model_options_and_format(self):
+        cache = LLMCache(self.path)
+        key = cache.make_key("mistral", self.messages("hi"), {'temperature': 0, 'num_predict': 16})
+        # Option order does not matter, values do
+        self.assertEqual(key, cache.make_key("mistral", self.messages("hi"), {'num_predict': 16, 'temperature': 0}))
+        self.assertNotEqual(key, cache.make_key("mistral", self.messages("hi"), {'temperature': 0.2, 'num_predict': 16}))
+        self.assertNotEqual(key, cache.make_key("llama2", self.messages("hi"), {'temperature': 0, 'num_predict': 16}))
+        self.assertNotEqual(
+            key, cache.make_key("mistral", self.messages("hi"), {'temperature': 0, 'num_predict': 16}, format='json')
+        )
+
+    def test_round_trip_and_persistence(self):
+        cache = LLMCache(self.path)
+        key = cache.make_key("mistral", self.messages("hi"))
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "mistral", {'message': {'content': 'hello'}})
+        self.assertEqual(cache.get(key), {'message': {'content': 'hello'}})
+        self.assertEqual(LLMCache(self.path).get(key), {'message': {'content': 'hello'}})
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['entries']), (1, 1, 1))
+
+    def test_entries_expire_after_ttl(self):
+        cache = LLMCache(self.path, ttl_seconds=60)
+        cache.put("key", "mistral", {'message': {'content': 'hello'}})
+        self.clock.now += 60
+        self.assertIsNotNone(cache.get("key"))
+        self.clock.now += 1
+        self.assertIsNone(cache.get("key"))
+        self.assertEqual(cache.stats()['entries'], 0)
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = LLMCache(self.path, max_entries=2)
+        cache.put("a", "mistral", {'value': 'a'})
+        self.clock.now += 1
+        cache.put("b", "mistral", {'value': 'b'})
+        self.clock.now += 1
+        # Reading a makes b the least recently used
+        cache.get("a")
+        self.clock.now += 1
+        cache.put("c", "mistral", {'value': 'c'})
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), {'value': 'a'})
+        self.assertEqual(cache.get("c"), {'value': 'c'})
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+# tests/test_quantization.py
+import os
+import sys
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.quantization import quantize_int8, dequantize_int8, int8_scores
+from memory.ann_index import IVFIndex
+from memory.vector_store import VectorStore
+
+def unit_vectors(count, dim=64, seed=0):
+    vectors = np.random.default_rng(seed).standard_normal((count, dim))
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+class QuantizationTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = unit_vectors(500)
+
+    def test_round_trip_error_is_within_half_a_step(self):
+        codes, scales = quantize_int8(self.vectors)
+        self.assertEqual(codes.dtype, np.int8)
+        self.assertEqual(scales.shape, (500,))
+        error = np.abs(dequantize_int8(codes, scales) - self.vectors)
+        self.assertTrue(np.all(error <= scales[:, None] / 2 + 1e-7))
+        # The largest component of each vector maps to +/-127
+        self.assertTrue(np.all(np.abs(codes).max(axis=1) == 127))
+
+    def test_zero_vector(self):
+        codes, scales = quantize_int8(np.zeros((1, 8), dtype=np.float32))
+        self.assertFalse(codes.any())
+        self.assertTrue(np.isfinite(scales).all())
+        np.testing.assert_array_equal(dequantize_int8(codes, scales), np.zeros((1, 8)))
+
+    def test_int8_scores_agree_with_float_scores(self):
+        codes, scales = quantize_int8(self.vectors)
+        for query in unit_vectors(20, seed=1):
+            exact = self.vectors @ query
+            approximate = int8_scores(codes, scales, query, chunk=64)
+            self.assertLess(np.abs(approximate - exact).max(), 0.01)
+            top = set(np.argsort(-exact)[:10].tolist())
+            self.assertGreaterEqual(len(top & set(np.argsort(-approximate)[:10].tolist())), 8)
+
+class RerankTest(unittest.TestCase):
+    def setUp(self):
+        self.vectors = unit_vectors(300)
+        self.index = IVFIndex(64, nlist=4, train_threshold=10000, quantize='int8', rerank=20)
+        self.index.add(np.arange(300), self.vectors)
+        self.query = self.vectors[7]
+
+    def test_rerank_uses_exact_scores(self):
+        self.index.rerank_source = lambda ids: self.vectors[ids]
+        ids, scores = self.index.search(self.query, 5)
+        np.testing.assert_allclose(scores, self.vectors[ids] @ self.query, rtol=1e-6)
+
+    def test_ids_without_a_vector_keep_their_quantized_score(self):
+        self.index.rerank_source = lambda ids: np.zeros((len(ids), 64), dtype=np.float32)
+        ids, scores = self.index.search(self.query, 5)
+        self.assertEqual(ids[0], 7)
+        expected_ids, expected_scores = self.index.search_batch(self.query[None, :], 5, rerank=0)
+        np.testing.assert_array_equal(ids, expected_ids[0])
+        np.testing.assert_allclose(scores, expected_scores[0])
+
+class StoredMatrixTest(unittest.TestCase):
+    def test_stored_matrix_never_calls_the_model(self):
+        class NoModel:
+            def embed(self, **kwargs):
+                raise AssertionError("model called")
+
+        store = VectorStore(NoModel())
+        store.add("python", [3.0, 4.0])
+        matrix, ok = store.get_stored_matrix(["python", "rust"])
+        np.testing.assert_array_equal(ok, [True, False])
+        np.testing.assert_allclose(matrix, [[0.6, 0.8], [0.0, 0.0]])
+
+if __name__ == "__main__":
+    unittest.main()
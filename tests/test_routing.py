@@ -0,0 +1,74 @@
+# tests/test_routing.py
+import json
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm.client import LLMClient
+from llm.routing import ModelRouter, DEFAULT_ROUTES
+
+ROUTES = {
+    '*': {'timeout': 120, 'options': {'temperature': 0.5, 'num_ctx': 4096}},
+    'rank_score': {'model': "phi3:mini", 'options': {'temperature': 0.1}},
+    'rank_score.score': {'timeout': 20, 'options': {'num_predict': 8}}
+}
+
+class ModelRouterTest(unittest.TestCase):
+    def test_task_overrides_agent_overrides_wildcard(self):
+        route = ModelRouter(ROUTES).resolve('rank_score', 'score')
+        self.assertEqual(route['model'], "phi3:mini")
+        self.assertEqual(route['timeout'], 20)
+        # Options are merged key by key rather than replaced; the built-in
+        # rank_score.score temperature is task level, so it beats the agent's
+        self.assertEqual(route['options'], {'temperature': 0, 'num_ctx': 4096, 'num_predict': 8})
+
+    def test_missing_levels_fall_back(self):
+        router = ModelRouter(ROUTES)
+        self.assertEqual(router.resolve('rank_score')['timeout'], 120)
+        self.assertEqual(router.resolve('rank_score', 'other')['options']['temperature'], 0.1)
+        route = router.resolve('communicator', 'unrouted')
+        self.assertNotIn('model', route)
+        self.assertEqual(route['options'], {'temperature': 0.5, 'num_ctx': 4096})
+
+    def test_config_merges_into_default_routes(self):
+        router = ModelRouter({'communicator.email': {'model': "llama3", 'options': {'num_predict': 200}}})
+        route = router.resolve('communicator', 'email')
+        self.assertEqual(route['model'], "llama3")
+        self.assertEqual(route['options'], {'temperature': 0.7, 'num_predict': 200})
+        # The shared defaults are not modified
+        self.assertEqual(DEFAULT_ROUTES['communicator.email']['options']['num_predict'], 500)
+        self.assertEqual(ModelRouter().resolve('communicator', 'email')['options']['num_predict'], 500)
+
+    def test_load_reads_routes_from_config(self):
+        path = os.path.join(tempfile.mkdtemp(), "routes.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'routes': ROUTES}, f)
+        self.assertEqual(ModelRouter.load(path).resolve('rank_score', 'score')['timeout'], 20)
+        self.assertEqual(ModelRouter.load(path + ".missing").table(), ModelRouter().table())
+
+class ClientRouteTest(unittest.TestCase):
+    def setUp(self):
+        self.client = LLMClient(hosts="http://localhost:11434", router=ModelRouter(ROUTES))
+        self.addCleanup(self.client.close)
+
+    def test_route_fills_in_model_options_and_timeout(self):
+        model, options, timeout = self.client._route('rank_score', 'score', "mistral", None, None)
+        self.assertEqual(model, "phi3:mini")
+        self.assertEqual(options, {'temperature': 0, 'num_ctx': 4096, 'num_predict': 8})
+        self.assertEqual(timeout, 20)
+
+    def test_explicit_options_and_timeout_win(self):
+        _, options, timeout = self.client._route('rank_score', 'score', "mistral", {'temperature': 0.9}, 5)
+        self.assertEqual(options['temperature'], 0.9)
+        self.assertEqual(options['num_predict'], 8)
+        self.assertEqual(timeout, 5)
+
+    def test_agent_default_model_kept_without_a_route_model(self):
+        model, _, _ = self.client._route('communicator', 'email', "mistral", None, None)
+        self.assertEqual(model, "mistral")
+
+if __name__ == "__main__":
+    unittest.main()
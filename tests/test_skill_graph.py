@@ -0,0 +1,57 @@
+# tests/test_skill_graph.py
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.database import Database
+from memory.skill_graph import SkillGraph
+
+class FakeVectorStore:
+    """Deterministic unit vectors per text; texts in failing get no embedding"""
+    def __init__(self):
+        self.failing = set()
+
+    def get_embedding_matrix(self, texts):
+        matrix = np.zeros((len(texts), 8), dtype=np.float32)
+        ok = np.array([text not in self.failing for text in texts], dtype=bool)
+        for position, text in enumerate(texts):
+            if ok[position]:
+                vector = np.random.default_rng(sum(text.encode('utf-8'))).standard_normal(8)
+                matrix[position] = vector / np.linalg.norm(vector)
+        return matrix, ok
+
+class SkillGraphTest(unittest.TestCase):
+    def setUp(self):
+        self.db = Database(os.path.join(tempfile.mkdtemp(), "skills.db"))
+        self.vector_store = FakeVectorStore()
+        self.graph = SkillGraph(self.db, self.vector_store, top_n=3)
+        for skill in ("Python", "Java", "SQL", "Docker", "Go"):
+            self.db.insert_skill_if_not_exists(skill)
+
+    def test_update_computes_pending_skills(self):
+        self.assertTrue(self.db.has_pending_skill_neighbors())
+        self.assertEqual(self.graph.update(), 5)
+        self.assertFalse(self.db.has_pending_skill_neighbors())
+        self.assertEqual(len(self.graph.neighbors("Python")), 3)
+
+    def test_skills_that_fail_to_embed_stay_pending(self):
+        self.vector_store.failing = {"Docker"}
+        self.assertEqual(self.graph.update(), 4)
+        self.assertIsNone(self.graph.neighbors("Docker"))
+        self.assertNotIn("docker", self.graph.neighbors("Python"))
+        self.assertTrue(self.db.has_pending_skill_neighbors())
+
+        # Retried once the embedding is available, and merged into the others' lists
+        self.vector_store.failing = set()
+        self.assertEqual(self.graph.update(), 1)
+        self.assertFalse(self.db.has_pending_skill_neighbors())
+        self.assertEqual(len(self.graph.neighbors("Docker")), 3)
+        listed = [skill for skill in ("Python", "Java", "SQL", "Go") if "docker" in self.graph.neighbors(skill)]
+        self.assertTrue(listed)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,145 @@
+# tests/test_skill_matcher.py
+import json
+import os
+import re
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.skill_matcher import SkillMatcherAgent
+
+JD = {
+    'title': "Backend Developer",
+    'company': "Acme Corp",
+    'required_skills': ["Python", "SQL"],
+    'preferred_skills': ["Docker"],
+    'required_experience': 2,
+    'required_education': "Bachelor",
+    'responsibilities': ["Build services"]
+}
+
+def candidate(number):
+    return {
+        'Name': f"Candidate {number}",
+        'Candidate_ID': f"C{100 + number}",
+        'Skills': ["Python", "SQL"],
+        'Experience': ["Developer at Initech (2018-2022)"],
+        'Education': ["Bachelor of Science in Computer Science"]
+    }
+
+VALID_RESULT = {
+    'match_score': 80,
+    'key_strengths': ["Python", "SQL"],
+    'skills_match': "All required skills.",
+    'experience_match': "Four years.",
+    'education_match': "Bachelor degree.",
+    'gaps': [],
+    'justification': "Strong fit."
+}
+
+class ScriptedLLM:
+    """Chat client answering from a list of replies (or a callable per prompt), recording each task"""
+    def __init__(self, replies):
+        self.replies = list(replies) if isinstance(replies, list) else replies
+        self.tasks = []
+
+    def chat(self, model, messages, task=None, **kwargs):
+        self.tasks.append(task)
+        prompt = messages[-1]['content']
+        reply = self.replies(prompt, task) if callable(self.replies) else self.replies.pop(0)
+        return {'message': {'content': reply}, 'prompt_eval_count': None}
+
+def matcher(llm, structured_output=False):
+    return SkillMatcherAgent("test-model", None, llm, structured_output=structured_output, semantic_threshold=None)
+
+class StructuredOutputTest(unittest.TestCase):
+    def test_valid_response_needs_one_call(self):
+        llm = ScriptedLLM([json.dumps(VALID_RESULT)])
+        score, analysis = matcher(llm, structured_output=True).match(JD, candidate(1))
+        self.assertEqual(llm.tasks, ['analysis'])
+        self.assertIn("Strong fit.", analysis)
+
+    def test_invalid_response_is_repaired(self):
+        invalid = dict(VALID_RESULT, match_score=250)
+        llm = ScriptedLLM([json.dumps(invalid), json.dumps(VALID_RESULT)])
+        agent = matcher(llm, structured_output=True)
+        sections = agent._request_sections(agent._assess(JD, candidate(1)), include_final_score=False)
+        self.assertEqual(llm.tasks, ['analysis', 'repair'])
+        self.assertEqual(sections['match_score'], 0.8)
+        self.assertEqual(sections['justification'], "Strong fit.")
+
+    def test_repair_prompt_carries_error_and_output_only(self):
+        agent = matcher(ScriptedLLM([]), structured_output=True)
+        prompt = agent._build_repair_prompt('{"match_score": 250}', "match_score must be a number between 0 and 100",
+                                            agent._result_schema())
+        self.assertIn("match_score must be a number between 0 and 100", prompt)
+        self.assertIn('{"match_score": 250}', prompt)
+        self.assertNotIn("Candidate 1", prompt)
+
+    def test_unrepairable_response_falls_back_to_text_extraction(self):
+        llm = ScriptedLLM(["not json", "Match Score: 70%\nJustification: Decent fit."])
+        agent = matcher(llm, structured_output=True)
+        sections = agent._request_sections(agent._assess(JD, candidate(1)), include_final_score=False)
+        self.assertEqual(llm.tasks, ['analysis', 'repair'])
+        self.assertEqual(sections['match_score'], 0.7)
+
+    def test_parse_structured_validation(self):
+        agent = matcher(ScriptedLLM([]))
+        with self.assertRaisesRegex(ValueError, "missing fields: gaps"):
+            agent._parse_structured(json.dumps({key: value for key, value in VALID_RESULT.items() if key != 'gaps'}))
+        with self.assertRaisesRegex(ValueError, "final_score"):
+            agent._parse_structured(json.dumps(dict(VALID_RESULT, final_score=1.5)), include_final_score=True)
+        with self.assertRaisesRegex(ValueError, "not valid JSON"):
+            agent._parse_structured("{")
+
+        sections = agent._parse_structured(json.dumps(dict(VALID_RESULT, final_score=0.9)), include_final_score=True)
+        self.assertEqual(sections['final_score'], 0.9)
+        self.assertEqual(sections['key_strengths'], "- Python\n- SQL")
+        self.assertEqual(sections['gaps'], "No gaps identified.")
+
+def batch_entry(ref, score):
+    return {'ref': ref, 'final_score': score, 'key_strengths': ["Python"], 'gaps': [], 'justification': "Fits."}
+
+class BatchScoringTest(unittest.TestCase):
+    def test_parse_batch_orders_entries_by_ref(self):
+        agent = matcher(ScriptedLLM([]))
+        result = json.dumps({'candidates': [batch_entry("c2", 0.4), batch_entry("C1", 0.9)]})
+        entries = agent._parse_batch(result, 2)
+        self.assertEqual([entry['final_score'] for entry in entries], [0.9, 0.4])
+        self.assertEqual(entries[0]['key_strengths'], "- Python")
+        self.assertEqual(entries[0]['gaps'], "No gaps identified.")
+
+    def test_parse_batch_rejects_incomplete_output(self):
+        agent = matcher(ScriptedLLM([]))
+        cases = [
+            ("not valid JSON", "{", 2),
+            ("no candidates list", json.dumps({'results': []}), 2),
+            ("missing candidates: C2", json.dumps({'candidates': [batch_entry("C1", 0.9)]}), 2),
+            ("final_score", json.dumps({'candidates': [batch_entry("C1", 1.5), batch_entry("C2", 0.5)]}), 2),
+            ("justification", json.dumps({'candidates': [dict(batch_entry("C1", 0.5), justification=" ")]}), 1)
+        ]
+        for message, result, count in cases:
+            with self.assertRaisesRegex(ValueError, message):
+                agent._parse_batch(result, count)
+
+    def test_failed_batches_are_split_down_to_single_calls(self):
+        def reply(prompt, task):
+            if task != 'batch':
+                # A single candidate is scored with the regular fused prompt
+                return "Match Score: 60%\nFinal Score: 0.6\nJustification: Alone."
+            refs = re.findall(r'CANDIDATE (C\d+): Candidate (\d+)', prompt)
+            if len(refs) > 2:
+                return "The model rambled instead of returning JSON"
+            return json.dumps({'candidates': [batch_entry(ref, int(number) / 10) for ref, number in refs]})
+
+        llm = ScriptedLLM(reply)
+        results = matcher(llm).match_batch(JD, [candidate(number) for number in range(1, 6)])
+
+        # 5 fails -> 2 + 3; 3 fails -> 1 + 2; the lone candidate gets a single call
+        self.assertEqual(llm.tasks, ['batch', 'batch', 'batch', 'analysis', 'batch'])
+        self.assertEqual([final for _, final, _ in results], [0.1, 0.2, 0.6, 0.4, 0.5])
+        self.assertTrue(all(0 <= match <= 1 for match, _, _ in results))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,102 @@
+# tests/test_vector_store.py
+import os
+import sys
+import tempfile
+import unittest
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from memory.vector_store import VectorStore
+from memory.embedding_store import EmbeddingStore
+from llm.routing import ModelRouter
+
+class FakeEmbeddingClient:
+    """Deterministic embeddings per text (dim per model), counting requests"""
+    def __init__(self, router=None, dims=None):
+        self.router = router
+        self.dims = dims or {}
+        self.requests = 0
+
+    def embed(self, model, input, **kwargs):
+        self.requests += 1
+        return {'embeddings': [self._vector(text, self.dims.get(model, 16)) for text in input]}
+
+    @staticmethod
+    def _vector(text, dim=16):
+        rng = np.random.default_rng(sum(text.encode('utf-8')) * 7919 + len(text))
+        return rng.standard_normal(dim).tolist()
+
+class BoundedVectorStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.llm = FakeEmbeddingClient()
+        self.store = VectorStore(self.llm, max_entries=10, batch_size=8, parallelism=1)
+        self.texts = [f"t{i}" for i in range(25)]
+
+    def test_batch_larger_than_bound_returns_every_vector(self):
+        embeddings = self.store.get_embeddings(self.texts)
+        self.assertEqual(len(embeddings), 25)
+        self.assertTrue(all(len(embedding) == 16 for embedding in embeddings))
+        for text, embedding in zip(self.texts, embeddings):
+            expected = np.asarray(FakeEmbeddingClient._vector(text), dtype=np.float32)
+            np.testing.assert_allclose(embedding, expected / np.linalg.norm(expected), rtol=1e-5)
+        # The bound still holds afterwards
+        self.assertEqual(len(self.store), 10)
+        self.assertEqual(self.store.evictions, 15)
+
+    def test_find_similar_with_more_candidates_than_bound(self):
+        results = self.store.find_similar("t0", self.texts[:15], top_n=3)
+        self.assertEqual(results[0][0], "t0")
+        self.assertAlmostEqual(results[0][1], 1.0, places=5)
+        self.assertTrue(all(score != 0.0 for _, score in results))
+
+class RoutedModelTest(unittest.TestCase):
+    def test_persistent_store_is_keyed_by_routed_model(self):
+        path = os.path.join(tempfile.mkdtemp(), "embeddings")
+        dims = {'distilbert': 16, 'nomic-embed-text': 24}
+
+        first = VectorStore(FakeEmbeddingClient(ModelRouter(), dims), store=EmbeddingStore(path))
+        self.assertEqual(first.model, 'distilbert')
+        self.assertEqual(len(first.get_embedding("python")), 16)
+
+        # Warm restart after routing embeddings to a model with another dimension
+        router = ModelRouter({'vector_store.embedding': {'model': 'nomic-embed-text'}})
+        llm = FakeEmbeddingClient(router, dims)
+        second = VectorStore(llm, store=EmbeddingStore(path))
+        self.assertEqual(second.model, 'nomic-embed-text')
+        self.assertNotIn("python", second)
+        self.assertEqual(len(second.get_embedding("python")), 24)
+        self.assertEqual(llm.requests, 1)
+
+class CountingEmbeddingStore(EmbeddingStore):
+    """EmbeddingStore counting SQLite commits"""
+    def __init__(self, path):
+        super().__init__(path)
+        self.commits = 0
+
+    def append_many(self, model, texts, vectors):
+        rows, matrix = super().append_many(model, texts, vectors)
+        self.commits += 1
+        return rows, matrix
+
+class PersistentBatchTest(unittest.TestCase):
+    def test_one_commit_per_fetched_batch(self):
+        path = os.path.join(tempfile.mkdtemp(), "embeddings")
+        store = CountingEmbeddingStore(path)
+        vector_store = VectorStore(FakeEmbeddingClient(), store=store, batch_size=32, parallelism=1)
+        texts = [f"t{i}" for i in range(40)]
+        embeddings = vector_store.get_embeddings(texts + texts[:5])
+
+        self.assertEqual(store.commits, 2)
+        self.assertEqual(store.count('distilbert'), 40)
+        self.assertEqual(store.texts('distilbert', [0, 39]), {0: "t0", 39: "t39"})
+
+        # Every row is readable after a restart, without asking the model again
+        llm = FakeEmbeddingClient()
+        reloaded = VectorStore(llm, store=EmbeddingStore(path))
+        self.assertEqual(len(reloaded), 40)
+        np.testing.assert_allclose(reloaded.get_embeddings(texts), embeddings[:40], rtol=1e-6)
+        self.assertEqual(llm.requests, 0)
+
+if __name__ == "__main__":
+    unittest.main()